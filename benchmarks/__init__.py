@@ -0,0 +1,11 @@
+"""
+Benchmarks of DomainXml and payara5-setup on synthetic domain.xml files
+
+Run from the top of the repository:
+
+    python3 -m benchmarks run --scale medium --output report.json
+    python3 -m benchmarks run --scale medium --baseline report.json
+    python3 -m benchmarks generate --scale large --domain-xml /tmp/domain.xml --config-dir /tmp/config
+
+See python3 -m benchmarks --help
+"""
@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from benchmarks import generator
+from benchmarks.suite import Suite, compare, format_report
+from xmltools import backend
+
+
+def _run(args) -> int:
+    if args.backend:
+        backend.set_default(args.backend)
+    report = Suite(generator.parse_scale(args.scale), args.repeat).run()
+    format_report(report)
+    if args.output:
+        with open(args.output, "w") as io:
+            json.dump(report, io, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as io:
+            return _compare(report, json.load(io), args.threshold)
+    return 0
+
+
+def _compare(report: dict, baseline: dict, threshold: float) -> int:
+    regressions = compare(report, baseline, threshold)
+    for (name, before, now) in regressions:
+        print("Regression: %s %g -> %g (%+.0f%%)" % (name, before, now, (now / before - 1) * 100))
+    if regressions:
+        return 1
+    print("No regressions (threshold %.0f%%)" % (threshold * 100))
+    return 0
+
+
+def _generate(args) -> int:
+    scale = generator.parse_scale(args.scale)
+    if args.domain_xml:
+        with open(args.domain_xml, "wb") as io:
+            io.write(generator.domain_xml(scale))
+    if args.config_dir:
+        generator.config_dir(args.config_dir, scale)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks",
+                                     description="Benchmark DomainXml and payara5-setup on generated domain.xml files")
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("run", help="run the benchmarks (default)")
+    run.add_argument("--scale", default="small",
+                     help="tiny, small, medium or large, with overrides ie. medium,cres=50000 (default: %(default)s)")
+    run.add_argument("--repeat", type=int, default=3, help="measurements per timing, best is kept (default: %(default)s)")
+    run.add_argument("--backend", choices=["etree", "lxml"], help="xml backend (default: lxml if installed)")
+    run.add_argument("--output", help="write the report (json) here")
+    run.add_argument("--baseline", help="compare with this report, exit 1 on regressions")
+    run.add_argument("--threshold", type=float, default=0.25,
+                     help="allowed relative slowdown before it is a regression (default: %(default)s)")
+    check = commands.add_parser("compare", help="compare two reports")
+    check.add_argument("report")
+    check.add_argument("baseline")
+    check.add_argument("--threshold", type=float, default=0.25)
+    generate = commands.add_parser("generate", help="write a synthetic domain.xml and/or config directory")
+    generate.add_argument("--scale", default="medium")
+    generate.add_argument("--domain-xml", help="where to write domain.xml")
+    generate.add_argument("--config-dir", help="where to write config files")
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in ("run", "compare", "generate", "-h", "--help"):
+        argv = ["run"] + argv
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        sys.exit(_generate(args))
+    if args.command == "compare":
+        with open(args.report, "r") as a, open(args.baseline, "r") as b:
+            sys.exit(_compare(json.load(a), json.load(b), args.threshold))
+    sys.exit(_run(args))
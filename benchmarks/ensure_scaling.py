@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Per-resource cost of DomainXml resource creation as the number of resources grows
+
+Run from the top of the repository:
+
+    python3 benchmarks/ensure_scaling.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from xmltools.payara_domain_xml import DomainXml
+
+DOMAIN_XML = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                          "xmltools", "tests", "domain_orig.xml")
+
+
+def run(count: int, batch: int = 1000) -> list:
+    """
+    Create count custom resources, timing every batch
+
+    :param count: number of resources
+    :param batch: resources per measurement
+    :return: list of (resources-so-far, microseconds-per-resource)
+    """
+    domain_xml = DomainXml(DOMAIN_XML)
+    result = []
+    for start in range(0, count, batch):
+        before = time.perf_counter()
+        for i in range(start, start + batch):
+            domain_xml.custom_resource_primitive("java.lang.String", "jndi/res-%d" % i, str(i))
+        elapsed = time.perf_counter() - before
+        result.append((start + batch, elapsed * 1e6 / batch))
+    return result
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for (total, micros) in run(count):
+        print("%8d resources: %8.1f us/resource" % (total, micros))
@@ -0,0 +1,164 @@
+import os
+from collections import namedtuple
+from io import BytesIO
+from xml.etree import ElementTree as ET
+
+DOMAIN_XML = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                          "xmltools", "tests", "domain_orig.xml")
+
+# Number of each kind of resource in a generated domain.xml / config directory
+Scale = namedtuple('Scale', ['apps', 'jdbc', 'cres', 'jms', 'jvm'])
+
+SCALES = {
+    'tiny': Scale(apps=2, jdbc=2, cres=10, jms=2, jvm=5),
+    'small': Scale(apps=10, jdbc=10, cres=100, jms=10, jvm=20),
+    'medium': Scale(apps=100, jdbc=100, cres=2000, jms=100, jvm=100),
+    'large': Scale(apps=1000, jdbc=500, cres=20000, jms=1000, jvm=500)
+}
+
+
+def parse_scale(text: str) -> Scale:
+    """
+    Parse a scale
+
+    :param text: name of a scale (tiny, small, medium, large), optionally followed by
+                 overrides, ie. 'medium,cres=50000' or 'apps=10,jdbc=5'
+    :return: scale
+    """
+    values = SCALES['tiny']._asdict()
+    values = {k: 0 for k in values}
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if '=' in part:
+            (key, value) = part.split("=", 1)
+            if key not in values:
+                raise ValueError("Unknown resource kind: %s expected one of %s" % (key, ", ".join(values)))
+            values[key] = int(value)
+        elif part in SCALES:
+            values.update(SCALES[part]._asdict())
+        else:
+            raise ValueError("Unknown scale: %s expected one of %s" % (part, ", ".join(SCALES)))
+    return Scale(**values)
+
+
+def app_name(i: int) -> str:
+    return "app-%d" % i
+
+
+def jdbc_name(i: int) -> str:
+    return "jdbc/db-%d" % i
+
+
+def cres_name(i: int) -> str:
+    return "jndi/res-%d" % i
+
+
+def jms_name(i: int) -> str:
+    return "jms/queue-%d" % i
+
+
+def jvm_option(i: int) -> str:
+    return "-Dbenchmark.option.%d=%d" % (i, i)
+
+
+def domain_xml(scale: Scale, base: str = DOMAIN_XML) -> bytes:
+    """
+    Make a domain.xml, that looks like payara5-setup has configured the resources of scale
+
+    :param scale: number of resources
+    :param base: domain.xml to add resources to
+    :return: document
+    """
+    root = ET.parse(base).getroot()
+    resources = root.find("resources")
+    server = root.find('servers/server[@name="server"]')
+    applications = root.find("applications")
+    if applications is None:
+        applications = ET.Element("applications")
+        root.insert(list(root).index(resources), applications)
+    for i in range(scale.apps):
+        name = app_name(i)
+        app = ET.SubElement(applications, "application", {
+            "name": name, "location": "file:///opt/apps/%s.war" % name, "context-root": "/" + name,
+            "object-type": "user"})
+        ET.SubElement(app, "property", {"name": "implicitCdiEnabled", "value": "true"})
+        module = ET.SubElement(app, "module", {"name": name})
+        for sniffer in ("cdi", "ejb", "security", "web", "jpa", "webservices"):
+            ET.SubElement(module, "engine", {"sniffer": sniffer})
+        ET.SubElement(server, "application-ref", {"ref": name, "virtual-servers": "server"})
+    for i in range(scale.jdbc):
+        name = jdbc_name(i)
+        pool = ET.SubElement(resources, "jdbc-connection-pool", {
+            "name": name + "/pool", "res-type": "javax.sql.DataSource",
+            "datasource-classname": "org.postgresql.ds.PGSimpleDataSource"})
+        for (key, value) in (("User", "user"), ("Password", "pass"), ("ServerName", "db-%d" % i),
+                             ("PortNumber", "5432"), ("DatabaseName", "db")):
+            ET.SubElement(pool, "property", {"name": key, "value": value})
+        ET.SubElement(resources, "jdbc-resource", {"jndi-name": name, "pool-name": name + "/pool"})
+        ET.SubElement(server, "resource-ref", {"ref": name})
+    for i in range(scale.cres):
+        name = cres_name(i)
+        res = ET.SubElement(resources, "custom-resource", {
+            "jndi-name": name, "res-type": "java.lang.String",
+            "factory-class": "org.glassfish.resources.custom.factory.PrimitivesAndStringFactory"})
+        ET.SubElement(res, "property", {"name": "value", "value": str(i)})
+        ET.SubElement(server, "resource-ref", {"ref": name})
+    for i in range(scale.jms):
+        name = jms_name(i)
+        res = ET.SubElement(resources, "admin-object-resource", {
+            "jndi-name": name, "res-type": "javax.jms.Queue", "res-adapter": "jmsra"})
+        ET.SubElement(res, "property", {"name": "Name", "value": name.replace("/", "_")})
+        ET.SubElement(server, "resource-ref", {"ref": name})
+    java_config = root.find('configs/config[@name="server-config"]/java-config')
+    for i in range(scale.jvm):
+        ET.SubElement(java_config, "jvm-options").text = jvm_option(i)
+    out = BytesIO()
+    ET.ElementTree(root).write(out, encoding="UTF-8", xml_declaration=True)
+    return out.getvalue()
+
+
+def config_dir(directory: str, scale: Scale) -> list:
+    """
+    Write payara5-setup config files (re)defining the resources of scale
+
+    :param directory: where to write them
+    :param scale: number of resources
+    :return: list of config files in processing order
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = []
+
+    def write(name: str, lines: list) -> None:
+        location = os.path.join(directory, name)
+        with open(location, "w") as io:
+            io.write("\n".join(lines) + "\n")
+        files.append(location)
+
+    for i in range(scale.apps):
+        name = app_name(i)
+        open(os.path.join(directory, name + ".war"), "wb").close()
+        write("10-app-%05d.app" % i, [
+            "location = %s.war" % name,
+            "context-root = /%s" % name,
+            "name = %s" % name])
+    if scale.jdbc:
+        lines = []
+        for i in range(scale.jdbc):
+            lines.extend(["[%s]" % jdbc_name(i), '"user:pass@db-%d:5432/db"' % i, "max-pool-size = 32", ""])
+        write("20-jdbc.jdbc", lines)
+    if scale.cres:
+        lines = ["[string]"]
+        lines.extend(['"%s" = "%d"' % (cres_name(i), i) for i in range(scale.cres)])
+        write("30-cres.cres", lines)
+    if scale.jms:
+        lines = []
+        for i in range(scale.jms):
+            lines.extend(["[Queue]", 'name = "%s"' % jms_name(i), ""])
+        write("40-jms.jms", lines)
+    if scale.jvm:
+        lines = ["[remove]", '"-Dbenchmark.option.*"', "[add]"]
+        lines.extend(['"%s"' % jvm_option(i) for i in range(scale.jvm)])
+        write("50-jvm.jvm", lines)
+    return files
@@ -0,0 +1,282 @@
+import contextlib
+import datetime
+import importlib.util
+import io
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import generator
+from benchmarks.generator import Scale
+from xmltools import backend
+from xmltools.payara_config import PayaraConfig
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.plan import Host
+
+PAYARA5_SETUP = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "payara5-setup")
+
+# Format of the report
+VERSION = 1
+
+# Properties of a pool with a realistic number of them
+_PROPERTIES = {"Property%d" % i: "value-%d" % i for i in range(20)}
+
+
+def _operations(scale: Scale) -> list:
+    """
+    The timed DomainXml operations, each creating new resources and updating existing ones
+
+    :param scale: size of the document
+    :return: list of (name, number of calls, function(domain_xml, i))
+    """
+    calls = max(10, min(1000, scale.cres // 10))
+    return [
+        ("custom_resource_primitive", calls,
+         lambda d, i: d.custom_resource_primitive("java.lang.String", generator.cres_name(i * 2), str(i))),
+        ("custom_resources_primitive (batch of %d)" % calls, 1,
+         lambda d, i: d.custom_resources_primitive(("java.lang.String", generator.cres_name(j * 3), str(j))
+                                                   for j in range(calls))),
+        ("custom_resource_props", calls,
+         lambda d, i: d.custom_resource_props("jndi/props-%d" % i, {"a": "1", "b": "2"})),
+        ("jdbc_resource", calls,
+         lambda d, i: d.jdbc_resource(generator.jdbc_name(i * 2), {"max-pool-size": "32"},
+                                      {"User": "user", "ServerName": "db"})),
+        ("jms_factory_resource", calls,
+         lambda d, i: d.jms_factory_resource("jms/factory-%d" % i, {"transaction-support": "XATransaction"},
+                                             {"AddressList": "localhost:7676"})),
+        ("jms_destination_resource", calls,
+         lambda d, i: d.jms_destination_resource(generator.jms_name(i * 2), {"res-type": "javax.jms.Queue"},
+                                                 {"Name": "queue_%d" % i})),
+        ("app", max(1, calls // 10),
+         lambda d, i: d.app(generator.app_name(i * 2), "/opt/apps/app-%d.war" % i)),
+        ("osgi", max(1, calls // 10),
+         lambda d, i: d.osgi("osgi-%d" % i, "/opt/apps/bundle-%d.jar" % i)),
+        ("jdbc_resource (%d properties)" % len(_PROPERTIES), calls,
+         lambda d, i: d.jdbc_resource("jdbc/props-%d" % i, {"max-pool-size": "32"}, _PROPERTIES, False)),
+        ("system_property", calls,
+         lambda d, i: d.system_property("benchmark.property.%d" % i, str(i))),
+        ("props_at", calls,
+         lambda d, i: d.props_at('configs/config[@name="server-config"]/admin-service', {"p%d" % i: str(i)})),
+        ("attrs_at", calls,
+         lambda d, i: d.attrs_at('configs/config[@name="server-config"]/java-config', {"a%d" % i: str(i)})),
+        ("ensure_at", calls,
+         lambda d, i: d.ensure_at('configs/config[@name="server-config"]', {".": "ensured-%d" % (i % 10)})),
+        ("jvm_options", max(1, calls // 10),
+         lambda d, i: d.jvm_options(False, {generator.jvm_option(i)}, {"-Dbenchmark.option.%d=*" % (i * 2)}))
+    ]
+
+
+class Suite(object):
+    """
+    Times DomainXml operations, save(), full payara5-setup runs, its cold start
+    and peak memory on a generated domain.xml
+    """
+
+    def __init__(self, scale: Scale, repeat: int = 3, payara5_setup: str = PAYARA5_SETUP):
+        """
+        :param scale: size of the generated domain.xml and config directory
+        :param repeat: number of times each measurement is taken (the best is reported)
+        :param payara5_setup: location of the payara5-setup script
+        """
+        self._scale = scale
+        self._repeat = repeat
+        self._payara5_setup = payara5_setup
+
+    def run(self) -> dict:
+        """
+        Run the benchmarks
+
+        :return: report
+        """
+        work = tempfile.mkdtemp(prefix="payara5-setup-benchmark.")
+        try:
+            location = os.path.join(work, "domain.xml")
+            with open(location, "wb") as out:
+                out.write(generator.domain_xml(self._scale))
+            samples = {}
+            for _ in range(self._repeat):
+                for (name, calls, seconds) in self._time_domain_xml(location, os.path.join(work, "saved.xml")):
+                    samples.setdefault(name, (calls, []))[1].append(seconds)
+                for (name, seconds) in self._time_preserving(location, os.path.join(work, "saved.xml")):
+                    samples.setdefault(name, (1, []))[1].append(seconds)
+                for (name, seconds) in self._time_cold_start():
+                    samples.setdefault(name, (1, []))[1].append(seconds)
+            skipped = {}
+            try:
+                for (name, seconds) in self._time_payara_config(work):
+                    samples.setdefault(name, (1, []))[1].append(seconds)
+            except ImportError as e:
+                skipped['payara5-setup'] = str(e)
+            return {
+                'version': VERSION,
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'backend': backend.default().name,
+                'scale': self._scale._asdict(),
+                'size': os.path.getsize(location),
+                'timings': {name: {
+                    'calls': calls,
+                    'seconds': min(values),
+                    'median': statistics.median(values),
+                    'per_call': min(values) / calls
+                } for (name, (calls, values)) in samples.items()},
+                'memory': {'peak': self._peak_memory(location, os.path.join(work, "saved.xml"))},
+                'skipped': skipped
+            }
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    def _time_domain_xml(self, location: str, saved: str) -> list:
+        result = []
+        before = time.perf_counter()
+        domain_xml = DomainXml(location)
+        result.append(("load", 1, time.perf_counter() - before))
+        for (name, calls, operation) in _operations(self._scale):
+            before = time.perf_counter()
+            for i in range(calls):
+                operation(domain_xml, i)
+            result.append((name, calls, time.perf_counter() - before))
+        before = time.perf_counter()
+        domain_xml.save(saved)
+        result.append(("save", 1, time.perf_counter() - before))
+        return result
+
+    def _time_preserving(self, location: str, saved: str) -> list:
+        """
+        Time load and save of a domain.xml preserving the source (and loading it lazily), with one resource changed
+
+        :param location: domain.xml
+        :param saved: where to save it
+        :return: list of (name, seconds)
+        """
+        before = time.perf_counter()
+        domain_xml = DomainXml(location, preserve=True)
+        result = [("load (preserve)", time.perf_counter() - before)]
+        domain_xml.custom_resource_primitive("java.lang.String", generator.cres_name(0), "changed")
+        before = time.perf_counter()
+        domain_xml.save(saved)
+        result.append(("save (preserve)", time.perf_counter() - before))
+        before = time.perf_counter()
+        domain_xml = DomainXml(location, lazy=True)
+        result.append(("load (lazy)", time.perf_counter() - before))
+        domain_xml.custom_resource_primitive("java.lang.String", generator.cres_name(0), "changed")
+        before = time.perf_counter()
+        domain_xml.save(saved)
+        result.append(("save (lazy)", time.perf_counter() - before))
+        return result
+
+    def _peak_memory(self, location: str, saved: str) -> int:
+        tracemalloc.start()
+        try:
+            self._time_domain_xml(location, saved)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def _time_payara_config(self, work: str) -> list:
+        """
+        Time complete runs of payara5-setup (sequential and --plan) on a generated config directory
+
+        :param work: scratch directory
+        :return: list of (name, seconds)
+        :raises ImportError: if payara5-setup's dependencies are missing
+        """
+        if importlib.util.find_spec("expanding") is None:
+            raise ImportError("No module named 'expanding'")
+        files = generator.config_dir(os.path.join(work, "config"), self._scale)
+        content = generator.domain_xml(self._scale)
+        result = []
+        for (name, planning) in (("payara5-setup", False), ("payara5-setup --plan", True)):
+            for _ in range(self._repeat):
+                instance_dir = os.path.join(work, "payara5")
+                domain_dir = PayaraConfig.domain_dir(instance_dir)
+                os.makedirs(os.path.join(domain_dir, "config"), exist_ok=True)
+                with open(PayaraConfig.domain_xml_of(domain_dir), "wb") as out:
+                    out.write(content)
+                before = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cfg = PayaraConfig(instance_dir, planning=planning, host=Host())
+                    cfg.process_all(files)
+                    cfg.done()
+                result.append((name, time.perf_counter() - before))
+        return result
+
+    def _time_cold_start(self) -> list:
+        """
+        Time starting payara5-setup in a new interpreter: the import of its module
+        (as reported by -X importtime) and running the script until it has parsed
+        its arguments (--help)
+
+        :return: list of (name, seconds)
+        """
+        result = []
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        environ = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (root, os.environ.get('PYTHONPATH')))))
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import xmltools.payara_config"],
+                                   env=environ, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   universal_newlines=True, check=True)
+        for line in completed.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == "xmltools.payara_config":
+                result.append(("import xmltools.payara_config", int(fields[1]) / 1e6))
+        before = time.perf_counter()
+        subprocess.run([sys.executable, self._payara5_setup, "--help"], env=environ,
+                       stdout=subprocess.DEVNULL, check=True)
+        result.append(("payara5-setup --help", time.perf_counter() - before))
+        return result
+
+
+def compare(report: dict, baseline: dict, threshold: float = 0.25, noise: float = 0.001) -> list:
+    """
+    Find regressions relative to a baseline report
+
+    :param report: current report
+    :param baseline: stored report
+    :param threshold: allowed relative slowdown (or memory growth)
+    :param noise: timings where both are below this many seconds are ignored
+    :return: list of (name, baseline value, current value) that regressed
+    :raises ValueError: if the reports are not comparable
+    """
+    if report.get('version') != baseline.get('version'):
+        raise ValueError("Report versions differ: %s != %s" % (report.get('version'), baseline.get('version')))
+    if report['scale'] != baseline['scale']:
+        raise ValueError("Reports are of different scales: %s != %s" % (report['scale'], baseline['scale']))
+    regressions = []
+    for (name, timing) in sorted(report['timings'].items()):
+        before = baseline['timings'].get(name)
+        if before is None:
+            continue
+        if max(timing['seconds'], before['seconds']) < noise:
+            continue
+        if timing['seconds'] > before['seconds'] * (1 + threshold):
+            regressions.append((name, before['seconds'], timing['seconds']))
+    peak = report['memory']['peak']
+    before = baseline['memory']['peak']
+    if peak > before * (1 + threshold):
+        regressions.append(("peak memory", before, peak))
+    return regressions
+
+
+def format_report(report: dict, out=sys.stdout) -> None:
+    """
+    Print a report as a table
+
+    :param report: report
+    :param out: where to print
+    :return: None
+    """
+    print("Scale: %s, domain.xml: %d bytes, backend: %s, python %s" % (
+        ", ".join("%s=%d" % kv for kv in report['scale'].items()), report['size'], report['backend'],
+        report['python']), file=out)
+    for (name, timing) in report['timings'].items():
+        print("  %-42s %6d call(s) %10.3f ms %10.1f us/call" % (
+            name, timing['calls'], timing['seconds'] * 1e3, timing['per_call'] * 1e6), file=out)
+    print("  %-42s %24.1f MB" % ("peak memory", report['memory']['peak'] / 1024 / 1024), file=out)
+    for (name, reason) in report['skipped'].items():
+        print("  %-42s skipped: %s" % (name, reason), file=out)
@@ -10,6 +10,9 @@ setup(
             'packages': find_packages(exclude=['tests', 'README.md'])
         }
     },
+    extras_require={
+        'lxml': ['lxml']
+    },
     scripts=['payara5-setup', 'payara-log-setup', 'payara-logback-setup', 'payara-admin-password'],
     url='https://github.com/kosmisk-dk/payara5-setup',
     license='gpl3',
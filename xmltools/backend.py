@@ -0,0 +1,151 @@
+import os
+from functools import lru_cache
+from xml.etree import ElementTree as ET
+
+
+class ElementTreeBackend(object):
+    """
+    xml.etree.ElementTree, parents are tracked by the manipulator
+    """
+    name = "etree"
+    # Elements know their parent (no parent map needed), the backend has parent(node)
+    native_parents = False
+
+    def fromstring(self, content):
+        return ET.fromstring(content)
+
+    def subelement(self, parent, tag: str, attrib: dict):
+        return ET.SubElement(parent, tag, attrib=attrib)
+
+    def write(self, root, io) -> None:
+        ET.ElementTree(root).write(io, encoding="UTF-8", xml_declaration=True)
+
+    def findall(self, context, xpath: str, namespaces: dict) -> list:
+        return context.findall(xpath, namespaces=namespaces)
+
+    def owns(self, node) -> bool:
+        return isinstance(node, ET.Element)
+
+
+class LxmlBackend(ElementTreeBackend):
+    """
+    lxml.etree, with native parents and full XPath 1.0 for expressions the
+    manipulator doesn't evaluate itself
+    """
+    name = "lxml"
+    native_parents = True
+
+    def __init__(self):
+        from lxml import etree
+        self._etree = etree
+        self._parser = etree.XMLParser(encoding="UTF-8", remove_blank_text=False)
+
+    def fromstring(self, content):
+        if isinstance(content, str):
+            content = content.encode("UTF-8")
+        return self._etree.fromstring(content, self._parser)
+
+    def subelement(self, parent, tag: str, attrib: dict):
+        return self._etree.SubElement(parent, tag, attrib=attrib)
+
+    def write(self, root, io) -> None:
+        self._etree.ElementTree(root).write(io, encoding="UTF-8", xml_declaration=True)
+
+    def findall(self, context, xpath: str, namespaces: dict) -> list:
+        if '{' in xpath:
+            # Clark notation is ElementPath only
+            return context.findall(xpath, namespaces=namespaces)
+        namespaces = tuple(sorted((k, v) for k, v in namespaces.items() if k))
+        return [node for node in self._xpath(xpath, namespaces)(context) if isinstance(node, self._etree._Element)]
+
+    @lru_cache(maxsize=512)
+    def _xpath(self, xpath: str, namespaces: tuple):
+        return self._etree.XPath(xpath, namespaces=dict(namespaces))
+
+    def parent(self, node):
+        return node.getparent()
+
+    def owns(self, node) -> bool:
+        return isinstance(node, self._etree._Element)
+
+
+_BACKENDS = {
+    "etree": ElementTreeBackend,
+    "lxml": LxmlBackend
+}
+_instances = {}
+_default = None
+
+
+def get(name: str = None) -> ElementTreeBackend:
+    """
+    Get a backend
+
+    :param name: 'etree', 'lxml' or None for the default; lxml when it is
+                 installed, unless XMLTOOLS_BACKEND says otherwise
+    :return: backend
+    :raises ImportError: if lxml is asked for, and not installed
+    """
+    if name is None:
+        return default()
+    if name not in _instances:
+        if name not in _BACKENDS:
+            raise ValueError("Unknown xml backend: " + name)
+        _instances[name] = _BACKENDS[name]()
+    return _instances[name]
+
+
+def default() -> ElementTreeBackend:
+    global _default
+    if _default is None:
+        name = os.environ.get("XMLTOOLS_BACKEND")
+        if name:
+            _default = get(name)
+        else:
+            try:
+                _default = get("lxml")
+            except ImportError:
+                _default = get("etree")
+    return _default
+
+
+def set_default(name: str) -> ElementTreeBackend:
+    """
+    Select the default backend
+
+    :param name: 'etree' or 'lxml'
+    :return: the previous default
+    """
+    global _default
+    previous = default()
+    _default = get(name)
+    return previous
+
+
+def of(node) -> ElementTreeBackend:
+    """
+    The backend owning an element
+
+    :param node: element
+    :return: backend
+    """
+    for backend in [default()] + [get(name) for name in _BACKENDS if name in _instances]:
+        if backend.owns(node):
+            return backend
+    return get("etree")
+
+
+def available() -> list:
+    """
+    Names of the backends that can be used
+
+    :return: list of names
+    """
+    names = []
+    for name in _BACKENDS:
+        try:
+            get(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
@@ -0,0 +1,149 @@
+import json
+import os
+import sys
+
+from xmltools.bundle import Bundle
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.plan import Host, Plan
+
+
+class _DomainOnly(Host):
+    """
+    Host of a variant: only domain.xml is rendered, jars, scripts and text are left out
+    """
+
+    def install(self, src: str, lib: str) -> None:
+        pass
+
+    def run(self, src: str) -> None:
+        pass
+
+    def echo(self, text: str) -> None:
+        pass
+
+
+def variants(io) -> list:
+    """
+    Read variable sets, one json object per line (blank lines are skipped)
+
+    :param io: text file object
+    :return: list of (line number, dict of name to value)
+    :raises ValueError: if a line isn't an object of strings
+    """
+    result = []
+    for (n, line) in enumerate(io, 1):
+        if not line.strip():
+            continue
+        try:
+            variables = json.loads(line)
+        except ValueError as e:
+            raise ValueError("Line %d: %s" % (n, e))
+        if not isinstance(variables, dict) or not all(isinstance(v, str) for v in variables.values()):
+            raise ValueError("Line %d: expected an object of strings" % n)
+        result.append((n, variables))
+    return result
+
+
+class Batch(object):
+    """
+    Renders many variants of a domain.xml from one parsed document and one compiled bundle
+
+    Nothing is parsed per variant: every variant is rendered in a forked
+    process, that changes its copy-on-write image of the base document, saves
+    it and exits. Where fork isn't available the base is parsed again for each
+    variant. The operations of all files are applied coalesced (as --plan).
+    """
+
+    def __init__(self, location: str, bundle: Bundle, preserve: bool = False, lazy: bool = False,
+                 environ: dict = None):
+        """
+        :param location: the base domain.xml
+        :param bundle: the config files
+        :param preserve: copy unmodified parts of domain.xml verbatim
+        :param lazy: parse the sections of domain.xml when a variant uses them (implies preserve)
+        :param environ: environment the variable sets are added to (default: os.environ)
+        """
+        with open(location, "rb") as io:
+            self._content = io.read()
+        self._location = location
+        self._bundle = bundle
+        self._preserve = preserve
+        self._lazy = lazy
+        self._environ = os.environ if environ is None else environ
+        self._base = DomainXml(location, preserve=preserve, content=self._content, lazy=lazy)
+
+    def render(self, variables: dict, output: str, domain_xml: DomainXml = None) -> None:
+        """
+        Render one variant (in this process, changing the base unless domain_xml is given)
+
+        :param variables: environment variables of the variant
+        :param output: where to write domain.xml
+        :param domain_xml: document to change (default: the base)
+        :return: None
+        :raises KeyError: if a variable has no value
+        """
+        if domain_xml is None:
+            domain_xml = self._base
+        plan = Plan()
+        for (src, operations) in self._bundle.plans(dict(self._environ, **variables)):
+            plan.extend(operations.resolved())
+        plan.apply(domain_xml, _DomainOnly(), coalesce=True)
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        domain_xml.save(output)
+
+    def run(self, variants: list, jobs: int = 1) -> dict:
+        """
+        Render variants, in parallel
+
+        :param variants: list of (output, variables)
+        :param jobs: number of variants rendered at the same time
+        :return: output to error message, of the variants that failed
+        """
+        if not hasattr(os, 'fork'):
+            return self._run_parsing(variants)
+        failed = {}
+        running = {}
+        pending = list(reversed(variants))
+        while pending or running:
+            while pending and len(running) < max(1, jobs):
+                (output, variables) = pending.pop()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    os._exit(self._child(variables, output))
+                running[pid] = output
+            (pid, status) = os.wait()
+            output = running.pop(pid, None)
+            if output is not None and status != 0:
+                failed[output] = ("killed by signal %d" % os.WTERMSIG(status) if os.WIFSIGNALED(status) else
+                                  "exit status %d" % os.WEXITSTATUS(status))
+        return failed
+
+    def _child(self, variables: dict, output: str) -> int:
+        # In the forked process: render, and report
+        try:
+            self.render(variables, output)
+            print("Rendered:", output)
+            code = 0
+        except BaseException as e:
+            print("%s: %s" % (output, e), file=sys.stderr)
+            code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        return code
+
+    def _run_parsing(self, variants: list) -> dict:
+        failed = {}
+        for (output, variables) in variants:
+            try:
+                domain_xml = DomainXml(self._location, preserve=self._preserve, content=self._content,
+                                       lazy=self._lazy)
+                self.render(variables, output, domain_xml)
+                print("Rendered:", output)
+            except Exception as e:
+                print("%s: %s" % (output, e), file=sys.stderr)
+                failed[output] = str(e)
+        return failed
@@ -0,0 +1,224 @@
+import json
+import os
+import re
+from contextlib import contextmanager
+from typing import Callable
+
+from xmltools.files import AtomicFile
+from xmltools.plan import OPERATIONS, UNEXPANDED, Plan
+
+# Format of bundle files
+VERSION = 1
+
+# ${NAME} or ${NAME|default}
+_REFERENCE = re.compile(r'\$\{([^}|]+)(?:\|([^}]*))?\}')
+# What a variable expands to while compiling, replaced by its value when applied
+_MARKER = re.compile('\ue000([^\ue001]*)\ue001')
+
+
+def references(content: str):
+    """
+    Environment variables referred to in a config file
+
+    :param content: the file
+    :return: iterator of (name, default), default is None if there is none
+    """
+    for m in _REFERENCE.finditer(content):
+        yield (m.group(1), m.group(2))
+
+
+def expand(content: str, environ: dict = None) -> str:
+    """
+    Substitute environment variables, as the tokenizer does
+
+    :param content: text with ${NAME} or ${NAME|default}
+    :param environ: environment (default: os.environ)
+    :return: the text with the values
+    :raises KeyError: if a variable without default isn't set
+    """
+    if environ is None:
+        environ = os.environ
+
+    def value(m):
+        if m.group(1) in environ:
+            return environ[m.group(1)]
+        if m.group(2) is None:
+            raise KeyError("Environment variable not set: " + m.group(1))
+        return m.group(2)
+
+    return _REFERENCE.sub(value, content)
+
+
+def _marker(name: str) -> str:
+    return UNEXPANDED + name + '\ue001'
+
+
+@contextmanager
+def environment(values: dict):
+    """
+    Set environment variables (None unsets one), for what is parsed meanwhile
+
+    :param values: variable to value
+    """
+    saved = {name: os.environ.get(name) for name in values}
+    try:
+        for (name, value) in values.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        yield
+    finally:
+        for (name, value) in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def markers(names):
+    """
+    Set environment variables to markers, left in place of their values by what is parsed meanwhile
+
+    :param names: variables
+    :return: context manager
+    """
+    return environment({name: _marker(name) for name in names})
+
+
+class Bundle(object):
+    """
+    Config files compiled into plans, where environment variables are not yet expanded
+
+    The config files are tokenized and validated once (ie. when a docker image is
+    built). When a container starts, the variables are substituted and the
+    operations applied, without reading the config files.
+
+    While compiling every variable the files refer to is set to a marker, so the
+    tokenizer expands ${NAME|default} to the marker. The default of each variable
+    is taken from the files, it must be the same everywhere a variable is used.
+    What can't be done with a marker (splitting a jdbc connection string, joining
+    a path given by a variable, checking that a war exists) is left to Operation.resolved(), when the bundle is applied.
+    """
+
+    def __init__(self, files: list, variables: dict):
+        """
+        :param files: list of (config file, list of operations)
+        :param variables: name to default (None if the variable has to be set)
+        """
+        self.files = files
+        self.variables = variables
+
+    @staticmethod
+    def compile(sources: list, parse: Callable[[str], Plan], verbatim: tuple = ('.txt', '.sh')) -> 'Bundle':
+        """
+        Compile config files
+
+        :param sources: config files in processing order
+        :param parse: function giving the operations of a config file
+        :param verbatim: suffixes of files that aren't tokenized (not scanned for variables)
+        :return: bundle
+        :raises ValueError: if a variable has different defaults
+        """
+        variables = {}
+        used = {}
+        for src in sources:
+            if src.endswith(verbatim):
+                continue
+            with open(src, "r", errors="replace") as io:
+                content = io.read()
+            for (name, default) in references(content):
+                if name in variables and variables[name] != default:
+                    raise ValueError("Variable %s has different defaults in %s and %s" %
+                                     (name, used[name], os.path.basename(src)))
+                variables[name] = default
+                used[name] = os.path.basename(src)
+        with markers(variables):
+            files = [(src, list(parse(src))) for src in sources]
+        return Bundle(files, variables)
+
+    def missing(self, environ: dict = None) -> list:
+        """
+        Variables that have neither a value nor a default
+
+        :param environ: environment (default: os.environ)
+        :return: sorted list of names
+        """
+        if environ is None:
+            environ = os.environ
+        return sorted(name for (name, default) in self.variables.items() if default is None and name not in environ)
+
+    def plans(self, environ: dict = None) -> list:
+        """
+        The operations of each config file, with variables substituted
+
+        The plans are not resolved (see Plan.resolved()), an operation that is
+        invalid with the values fails with its file, when the file is processed.
+
+        :param environ: environment (default: os.environ)
+        :return: list of (config file, Plan)
+        :raises KeyError: if a variable has no value
+        """
+        if environ is None:
+            environ = os.environ
+        missing = self.missing(environ)
+        if missing:
+            raise KeyError("Unset variable(s): " + ", ".join(missing))
+        values = {name: environ.get(name, default) for (name, default) in self.variables.items()}
+
+        def expand(value):
+            if isinstance(value, str):
+                return _MARKER.sub(lambda m: values[m.group(1)], value)
+            if isinstance(value, dict):
+                return {expand(k): expand(v) for (k, v) in value.items()}
+            if isinstance(value, (list, tuple)):
+                return tuple(expand(v) for v in value)
+            return value
+
+        result = []
+        for (src, operations) in self.files:
+            plan = Plan()
+            plan.extend(type(operation)(*[expand(field) for field in operation]) for operation in operations)
+            result.append((src, plan))
+        return result
+
+    def save(self, location: str) -> None:
+        """
+        Write the bundle (atomically) as json
+
+        :param location: file to write
+        :return: None
+        """
+        content = {
+            'version': VERSION,
+            'variables': self.variables,
+            'files': [{
+                'src': src,
+                'operations': [[type(operation).__name__] + list(operation) for operation in operations]
+            } for (src, operations) in self.files]
+        }
+        with AtomicFile(location) as io:
+            io.write(json.dumps(content, indent=1).encode("UTF-8"))
+
+    @staticmethod
+    def load(location: str) -> 'Bundle':
+        """
+        Read a bundle
+
+        :param location: file written by save()
+        :return: bundle
+        :raises ValueError: if the file isn't a bundle of this version
+        """
+        with open(location, "rb") as io:
+            content = json.loads(io.read().decode("UTF-8"))
+        if content.get('version') != VERSION:
+            raise ValueError("Unsupported bundle version: %s (expected %s)" % (content.get('version'), VERSION))
+        files = []
+        for entry in content['files']:
+            operations = []
+            for (name, *fields) in entry['operations']:
+                if name not in OPERATIONS:
+                    raise ValueError("Unknown operation in bundle: " + name)
+                operations.append(OPERATIONS[name](*[tuple(f) if isinstance(f, list) else f for f in fields]))
+            files.append((entry['src'], operations))
+        return Bundle(files, content['variables'])
@@ -0,0 +1,116 @@
+import difflib
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+from xmltools.bundle import environment, markers, references
+from xmltools.plan import UNEXPANDED, App, InstallJar, Osgi, Plan
+
+# Keys that look like an attribute of domain.xml (properties are usually CamelCase)
+_ATTRIBUTE_LIKE = re.compile(r'^[a-z]+(?:-[a-z]+)+$')
+
+
+class CheckReport(object):
+    """
+    Problems found in config files
+
+    errors and warnings are lists of (config file, message), in file order.
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+
+    def __bool__(self):
+        return not self.errors
+
+    def lines(self) -> list:
+        return ["%s: error: %s" % (os.path.basename(src), message) for (src, message) in self.errors] + \
+               ["%s: warning: %s" % (os.path.basename(src), message) for (src, message) in self.warnings]
+
+
+def check_file(src: str, parse: Callable[[str], Plan], known: dict, environ: dict = None,
+               verbatim: tuple = ('.txt', '.sh')) -> tuple:
+    """
+    Validate one config file, without touching domain.xml or the host
+
+     * the file has to parse (syntax, sections, required keys)
+     * jars, wars and osgi bundles it refers to have to exist
+     * environment variables without a default have to be set
+     * keys of resources, that aren't known attributes but look like one, are reported as warnings
+
+    :param src: config file
+    :param parse: function giving the operations of a config file
+    :param known: operation class to known attribute names (other keys become properties)
+    :param environ: environment (default: os.environ)
+    :param verbatim: suffixes of files that aren't tokenized
+    :return: (errors, warnings) lists of messages
+    """
+    if environ is None:
+        environ = os.environ
+    errors = []
+    warnings = []
+    values = {}
+    unset = []
+    if not src.endswith(verbatim):
+        with open(src, "r", errors="replace") as io:
+            content = io.read()
+        variables = list(references(content))
+        values = {name: environ.get(name) for (name, _) in variables}
+        unset = sorted({name for (name, default) in variables if default is None and name not in environ})
+        if unset:
+            errors.append("environment variable(s) without default not set: " + ", ".join(unset))
+    try:
+        # The file is parsed with the variables of environ, unset variables are parsed as markers (as when
+        # compiling a bundle), to find the other problems
+        with environment(values), markers(unset):
+            plan = parse(src)
+    except Exception as e:
+        errors.append(str(e))
+        return errors, warnings
+    for operation in plan:
+        if isinstance(operation, (App, Osgi)):
+            if UNEXPANDED not in operation.path and not os.path.isfile(operation.path):
+                errors.append("missing file: " + operation.path)
+        elif isinstance(operation, InstallJar):
+            if UNEXPANDED not in operation.src and not os.path.isfile(operation.src):
+                errors.append("missing file: " + operation.src)
+        elif type(operation) in known:
+            attributes = known[type(operation)]
+            for key in operation.props:
+                if key != key.lower():
+                    continue
+                close = difflib.get_close_matches(key, attributes, 1)
+                if close:
+                    warnings.append("unknown attribute %s of %s (did you mean %s?), it is set as a property" %
+                                    (key, operation.name, close[0]))
+                elif _ATTRIBUTE_LIKE.match(key):
+                    warnings.append("unknown attribute %s of %s, it is set as a property" % (key, operation.name))
+    return errors, warnings
+
+
+def check(files: list, parse: Callable[[str], Plan], known: dict, jobs: int = 1, environ: dict = None) -> CheckReport:
+    """
+    Validate config files, in parallel
+
+    :param files: config files
+    :param parse: function giving the operations of a config file (picklable, when jobs > 1)
+    :param known: operation class to known attribute names
+    :param jobs: number of worker processes
+    :param environ: environment (default: os.environ)
+    :return: everything found
+    """
+    report = CheckReport()
+    if jobs <= 1 or len(files) <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        results = [check_file(src, parse, known, environ) for src in files]
+    else:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(min(jobs, len(files)), mp_context=context) as pool:
+            results = list(pool.map(check_file, files, [parse] * len(files), [known] * len(files),
+                                    [environ] * len(files), chunksize=max(1, len(files) // (4 * jobs))))
+    for (src, (errors, warnings)) in zip(files, results):
+        report.errors.extend((src, message) for message in errors)
+        report.warnings.extend((src, message) for message in warnings)
+    return report
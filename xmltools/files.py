@@ -0,0 +1,90 @@
+import filecmp
+import os
+import tempfile
+
+# Read once, setting it (the only way to read it) changes it for every thread of the process
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class AtomicFile(object):
+    """
+    Write a file through a temporary file in the same directory, renamed into place on success
+
+    Used as a context manager, that gives a binary file object:
+
+        with AtomicFile("domain.xml", fsync=True) as io:
+            io.write(content)
+
+    If the block raises, the temporary file is removed and the target is untouched.
+    A symlink is written through (the file it points to is replaced), and the
+    new file gets the mode, owner and group of the file it replaces.
+    """
+
+    def __init__(self, location: str, fsync: bool = False, skip_unchanged: bool = False):
+        """
+        :param location: file to write
+        :param fsync: flush file (and directory) to disk before returning
+        :param skip_unchanged: leave the target alone, if the content is unchanged
+        """
+        self._location = os.path.realpath(location)
+        self._fsync = fsync
+        self._skip_unchanged = skip_unchanged
+        self._io = None
+        self.written = False
+
+    def __enter__(self):
+        directory = os.path.dirname(os.path.abspath(self._location))
+        self._io = tempfile.NamedTemporaryFile(dir=directory, prefix="." + os.path.basename(self._location) + ".",
+                                               suffix=".tmp", delete=False)
+        return self._io
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        tmp = self._io.name
+        try:
+            if exc_type is None:
+                self._io.flush()
+                if self._fsync:
+                    os.fsync(self._io.fileno())
+            self._io.close()
+            if exc_type is not None:
+                return False
+            if self._skip_unchanged and os.path.isfile(self._location) and \
+                    filecmp.cmp(tmp, self._location, shallow=False):
+                return False
+            self._copy_attributes(tmp)
+            os.replace(tmp, self._location)
+            tmp = None
+            self.written = True
+            if self._fsync:
+                self._fsync_directory()
+            return False
+        finally:
+            if tmp is not None and os.path.lexists(tmp):
+                os.unlink(tmp)
+
+    def _copy_attributes(self, tmp: str) -> None:
+        try:
+            st = os.stat(self._location)
+        except OSError:
+            os.chmod(tmp, 0o666 & ~_UMASK)
+            return
+        own = os.stat(tmp)
+        if (own.st_uid, own.st_gid) != (st.st_uid, st.st_gid):
+            try:
+                os.chown(tmp, st.st_uid, st.st_gid)
+            except OSError:
+                # Only root can give a file away, the group is kept if we are a member
+                try:
+                    os.chown(tmp, -1, st.st_gid)
+                except OSError:
+                    pass
+        # After chown, which clears setuid/setgid
+        os.chmod(tmp, st.st_mode & 0o7777)
+
+    def _fsync_directory(self) -> None:
+        fd = os.open(os.path.dirname(os.path.abspath(self._location)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
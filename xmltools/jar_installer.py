@@ -0,0 +1,150 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from xmltools.plan import Host
+
+
+class JarInstaller(Host):
+    """
+    Host that installs jars on a thread pool
+
+    Installs are gathered until wait() (or a script is run), the last install of
+    a destination wins. Installs gathered since a mark() can be dropped. A
+    destination that already has the same size and content is left alone.
+    Otherwise the jar is hardlinked when source and destination are on the same
+    filesystem, or copied by the kernel (copy_file_range/sendfile).
+    """
+
+    def __init__(self, workers: int = None, link: bool = True):
+        """
+        :param workers: size of the thread pool (default: ThreadPoolExecutor's)
+        :param link: hardlink when possible
+        """
+        self._workers = workers
+        self._link = link
+        self._pending = OrderedDict()
+        # (destination, source it replaced or None) of each pending install, in order
+        self._queued = []
+        self._waits = 0
+        self._lock = threading.Lock()
+        self.copied = 0
+        self.linked = 0
+        self.skipped = 0
+
+    def install(self, src: str, lib: str) -> None:
+        dest = os.path.join(lib, os.path.basename(src))
+        replaced = self._pending.pop(dest, None)
+        self._pending[dest] = src
+        self._queued.append((dest, replaced))
+
+    def run(self, src: str) -> None:
+        self.wait()
+        super().run(src)
+
+    def mark(self) -> tuple:
+        return (self._waits, len(self._queued))
+
+    def drop(self, mark: tuple) -> None:
+        (waits, at) = mark
+        if waits != self._waits:
+            # Installed since, only what came after that is pending
+            at = 0
+        for (dest, replaced) in reversed(self._queued[at:]):
+            del self._pending[dest]
+            if replaced is not None:
+                self._pending[dest] = replaced
+        del self._queued[at:]
+
+    def wait(self) -> None:
+        """
+        Install everything that is pending
+
+        :return: None
+        """
+        if not self._pending:
+            return
+        # Imported here, as it takes logging with it (payara5-setup usually installs no jars)
+        from concurrent.futures import ThreadPoolExecutor
+        pending = list(self._pending.items())
+        self._pending.clear()
+        self._queued.clear()
+        self._waits += 1
+        with ThreadPoolExecutor(self._workers) as pool:
+            for _ in pool.map(lambda dest_src: self._install(dest_src[1], dest_src[0]), pending):
+                pass
+        print("Installed %d jar(s):" % len(pending), self.report())
+
+    def report(self) -> str:
+        return "%d bytes copied, %d bytes linked, %d bytes skipped" % (self.copied, self.linked, self.skipped)
+
+    def _install(self, src: str, dest: str) -> None:
+        size = os.path.getsize(src)
+        if self._same(src, dest, size):
+            self._count('skipped', size)
+            return
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = "%s.%d.tmp" % (dest, threading.get_ident())
+        try:
+            if self._link and self._hardlink(src, tmp):
+                kind = 'linked'
+            else:
+                self._copy(src, tmp)
+                shutil.copystat(src, tmp)
+                kind = 'copied'
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        self._count(kind, size)
+
+    def _count(self, kind: str, size: int) -> None:
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + size)
+
+    @staticmethod
+    def _same(src: str, dest: str, size: int) -> bool:
+        try:
+            if os.path.getsize(dest) != size:
+                return False
+            if os.path.samefile(src, dest):
+                return True
+        except OSError:
+            return False
+        return JarInstaller._digest(src) == JarInstaller._digest(dest)
+
+    @staticmethod
+    def _digest(path: str) -> bytes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as io:
+            for chunk in iter(lambda: io.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.digest()
+
+    @staticmethod
+    def _hardlink(src: str, dest: str) -> bool:
+        try:
+            if os.stat(src).st_dev != os.stat(os.path.dirname(dest)).st_dev:
+                return False
+            os.link(src, dest)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _copy(src: str, dest: str) -> None:
+        if not hasattr(os, "copy_file_range"):
+            shutil.copyfile(src, dest)
+            return
+        with open(src, "rb") as i, open(dest, "wb") as o:
+            try:
+                while os.copy_file_range(i.fileno(), o.fileno(), 1024 * 1024 * 1024) > 0:
+                    pass
+            except OSError:
+                i.seek(0)
+                o.seek(0)
+                o.truncate()
+                shutil.copyfileobj(i, o, 1024 * 1024)
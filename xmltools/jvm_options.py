@@ -0,0 +1,123 @@
+import fnmatch
+import re
+from typing import Callable, Iterable
+
+# [jdk-version-range] prefix and option, split into the parts identifying it
+_OPTION = re.compile(r'(\[[^\]]*\])?(?:(-D[^=]+)|-XX:[+-]?([^=]+)|(-Xm[xsn]|-Xss)(?=\d))?')
+
+
+def option_key(option: str) -> str:
+    """
+    Identity of a jvm option, options with the same identity override each other
+
+     * -Xmx, -Xms, -Xmn, -Xss: the flag (-Xmx2G is -Xmx)
+     * -Dname=value: -Dname
+     * -XX:+Name, -XX:-Name, -XX:Name=value: -XX:Name
+     * anything else: the option itself
+
+    A [jdk-version-range] prefix is part of the identity.
+
+    :param option: jvm option, as in domain.xml
+    :return: key
+    """
+    m = _OPTION.match(option)
+    (prefix, define, xx, size) = m.groups()
+    if define is not None:
+        return (prefix or "") + define
+    if xx is not None:
+        return (prefix or "") + "-XX:" + xx
+    if size is not None:
+        return (prefix or "") + size
+    return option
+
+
+def matcher(patterns: Iterable[str]) -> Callable[[str], bool]:
+    """
+    Compile shell patterns (as fnmatch.fnmatchcase) into one function
+
+    :param patterns: patterns
+    :return: function telling if an option matches any of the patterns
+    """
+    patterns = list(patterns)
+    if not patterns:
+        return lambda option: False
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns)).match
+
+
+class JvmOptionsReport(object):
+    """
+    What setting jvm options did, beyond what was asked for
+
+     * overrides: (old, new) where an added option replaced an existing one with the same key
+     * conflicts: (key, options) where one call added several options with the same key,
+       the last of them is used
+    """
+
+    def __init__(self):
+        self.overrides = []
+        self.conflicts = []
+
+    def __bool__(self):
+        return bool(self.overrides or self.conflicts)
+
+    def lines(self) -> list:
+        return ["JVM option %s overridden by %s" % override for override in self.overrides] + \
+               ["JVM options conflict: %s (using %s)" % (", ".join(options), options[-1])
+                for (key, options) in self.conflicts]
+
+
+class JvmOptionChanges(object):
+    """
+    Changes to the jvm options, keyed by option identity (see option_key())
+
+    Removes are done by one compiled matcher, an added option replaces an
+    existing option with the same key where it is, or is appended.
+    """
+
+    def __init__(self, adds: Iterable[str], removes: Iterable[str]):
+        """
+        :param adds: options to set, in order
+        :param removes: shell patterns of options to remove
+        """
+        self.report = JvmOptionsReport()
+        self.remove = matcher(removes)
+        self.pending = {}
+        for add in adds:
+            key = option_key(add)
+            previous = self.pending.get(key)
+            if previous is not None and previous != add:
+                conflict = next((options for (k, options) in self.report.conflicts if k == key), None)
+                if conflict is None:
+                    self.report.conflicts.append((key, [previous, add]))
+                else:
+                    conflict.append(add)
+            # Keep the position of the first, the value of the last
+            self.pending[key] = add
+        self._replaced = set()
+
+    def update(self, option: str) -> str:
+        """
+        What to do with an existing option, in document order
+
+        :param option: existing option
+        :return: the option to keep in its place (None if it should be removed)
+        """
+        if self.remove(option):
+            return None
+        key = option_key(option)
+        if key in self._replaced:
+            # Duplicate of an option that has been replaced
+            return None
+        add = self.pending.pop(key, None)
+        if add is None:
+            return option
+        self._replaced.add(key)
+        if add != option:
+            self.report.overrides.append((option, add))
+        return add
+
+    def remaining(self) -> list:
+        """
+        :return: options not replacing existing ones, to be appended
+        """
+        return list(self.pending.values())
@@ -0,0 +1,153 @@
+import argparse
+import os
+from typing import Callable, Iterable, Iterator
+
+from xmltools.files import AtomicFile
+from xmltools.manipulation import XmlManipulator
+from xmltools.splice import Unsupported
+
+# Level names of java.util.logging and logback by first letter
+JUL_LEVELS = {
+    'E': 'ERROR',
+    'W': 'WARNING',
+    'I': 'INFO',
+    'D': 'DEBUG',
+    'T': 'ALL'
+}
+LOGBACK_LEVELS = {
+    'E': 'ERROR',
+    'W': 'WARNING',
+    'I': 'INFO',
+    'D': 'DEBUG',
+    'T': 'TRACE'
+}
+
+
+class LogLevels(object):
+    """
+    Log levels from the environment
+
+    LOG=level sets the root level, LOG__a_b_c=level the level of logger a.b.c.
+    Levels can be abbreviated to their first letter (E, W, I, D or T).
+    """
+
+    def __init__(self, level_map: dict, environ: dict = None):
+        """
+        :param level_map: first letter to level name
+        :param environ: environment (default: os.environ)
+        """
+        if environ is None:
+            environ = os.environ
+        self._level_map = level_map
+        self.root = self._level(environ.get("LOG"))
+        self.loggers = {}
+        for (env, value) in environ.items():
+            if not env.startswith("LOG__"):
+                continue
+            value = self._level(value)
+            if value is not None:
+                self.loggers[env[5:].replace('_', '.')] = value
+
+    def _level(self, value: str) -> str:
+        if not value:
+            return None
+        value = value.upper()
+        return self._level_map.get(value[0], value)
+
+    def apply_logback(self, xml: XmlManipulator) -> None:
+        """
+        Set the levels in a logback.xml
+
+        Existing loggers are found through the child index of the root (built in
+        one pass), missing ones are appended.
+
+        :param xml: the logback configuration
+        :return: None
+        """
+        if self.root is not None:
+            xml.ensure('root').attr("level", self.root)
+        for (name, value) in sorted(self.loggers.items(), reverse=True):
+            xml.ensure('logger', {'name': name}).attr("level", value)
+
+    def apply_properties(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Set the levels in a logging.properties
+
+        Lines setting the level of a logger are replaced, levels that aren't in the
+        file are added at the end.
+
+        :param lines: content of the file
+        :return: content with levels set
+        """
+        levels = {name + ".level": value for (name, value) in self.loggers.items()}
+        for line in lines:
+            at = line.find('.level=')
+            if at >= 0:
+                key = line[0:at + 6]
+                if key in levels:
+                    line = "%s=%s\n" % (key, levels.pop(key))
+            yield line
+        if levels:
+            yield "\n"
+            for key in sorted(levels):
+                yield "%s=%s\n" % (key, levels[key])
+
+
+def merge_logback(levels: LogLevels, src: str, dest: str) -> None:
+    """
+    Set the levels in a logback.xml, formatting and comments are kept
+
+    :param levels: levels to set
+    :param src: file to read
+    :param dest: file to (atomically) write
+    :return: None
+    """
+    with open(src, "rb") as io:
+        content = io.read()
+    try:
+        xml = XmlManipulator(content, preserve=True)
+    except Unsupported:
+        xml = XmlManipulator(content)
+    levels.apply_logback(xml)
+    with AtomicFile(dest) as io:
+        xml.write(io)
+
+
+def merge_properties(levels: LogLevels, src: str, dest: str) -> None:
+    """
+    Set the levels in a logging.properties, streaming it line by line
+
+    :param levels: levels to set
+    :param src: file to read
+    :param dest: file to (atomically) write
+    :return: None
+    """
+    with open(src, "r", encoding="ISO-8859-1") as i, AtomicFile(dest) as o:
+        for line in levels.apply_properties(i):
+            o.write(line.encode("ISO-8859-1"))
+
+
+def main(prog: str, default: str, merge: Callable[[str, str], None], argv: list = None) -> int:
+    """
+    Command line of the log setup tools
+
+    :param prog: name of the tool
+    :param default: file to process when none are given
+    :param merge: function(src, dest)
+    :param argv: arguments (default: sys.argv[1:])
+    :return: exit code
+    """
+    parser = argparse.ArgumentParser(prog=prog, usage="%(prog)s [ file [ output ] ] | -i file...",
+                                     description="Set log levels from LOG=level and LOG__logger_name=level")
+    parser.add_argument("files", metavar="file", nargs="*", default=[default])
+    parser.add_argument("-i", "--in-place", action="store_true", help="rewrite every file given")
+    args = parser.parse_args(argv)
+    if args.in_place:
+        pairs = [(src, src) for src in args.files]
+    elif len(args.files) <= 2:
+        pairs = [(args.files[0], args.files[-1])]
+    else:
+        parser.error("use --in-place to process more than one file")
+    for (src, dest) in pairs:
+        merge(src, dest)
+    return 0
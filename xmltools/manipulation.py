@@ -1,74 +1,618 @@
+from collections import OrderedDict
 from io import BytesIO
-from typing import TypeVar, Callable
-from xml.etree import ElementTree as ET
-from xml.etree.ElementTree import Element, SubElement, Comment
+from typing import TypeVar, Callable, Iterable
+from xml.etree.ElementTree import Element
 
-from xml.sax.saxutils import quoteattr
+
+from xmltools import backend as xml_backend
+from xmltools.splice import SourceMap, Unsupported, quoteattr
+from xmltools.templates import Fragment
+from xmltools.xpath import Step, plan
+
+
+class _Tree(object):
+    """
+    Bookkeeping shared by every manipulator and point working on one document
+
+    The parent map is maintained incrementally, so the cost of a mutation is
+    proportional to the number of nodes inserted or removed, not to the size
+    of the document. Backends whose elements know their parent (lxml) don't
+    need it.
+
+    Children can be looked up by (tag, identifying attribute, value). The index
+    is built per parent on first lookup, and kept up to date by the mutations
+    that go through the manipulator.
+
+    Results of xpath steps are memoized per context node. Every mutation bumps a
+    generation counter and stamps the nodes whose children (or own attributes)
+    changed, a memoized step is valid as long as its context node hasn't been
+    stamped after it was computed.
+
+    Nodes whose attributes, text or list of children changed are collected in
+    dirty, so a document parsed with a source map can be written by copying
+    the bytes of everything else.
+
+    Between checkpoint() and commit() the mutations are journaled: the first
+    time a node is about to change, its attributes, text, tail and list of
+    children are saved. rollback() puts those back, and repairs the parent
+    map, indexes and memo of the saved nodes only, so it costs as much as the
+    changes since the checkpoint. Nodes inserted since the checkpoint are
+    recorded (with None) and never saved. Dirty nodes of the checkpoint are
+    collected apart from the ones before it, and merged on commit().
+    """
+
+    # Attributes identifying a child among its siblings
+    KEYS = ("jndi-name", "name", "ref")
+    # Number of memoized xpath steps
+    MEMO_SIZE = 1024
+
+    def __init__(self, root: Element, backend: xml_backend.ElementTreeBackend):
+        self.root = root
+        self.backend = backend
+        self.native = backend.native_parents
+        self.parent = {}
+        self.index = {}
+        self.generation = 0
+        self.touched = {}
+        self.memo = OrderedDict()
+        self.evaluations = 0
+        # Full walks building the parent map, and child indexes built
+        self.builds = 0
+        self.index_builds = 0
+        self.dirty = set()
+        # SourceMap of the document, if it should be spliced when written
+        self.source = None
+        # Children of the root whose content hasn't been parsed yet (see SourceMap.parse_lazy)
+        self.lazy = set()
+        self.loads = 0
+        # Node to (attrib, text, tail, children) before the checkpoint, None while there is none
+        self.journal = None
+        self.clean = None
+        self.rollbacks = 0
+        self.attached(None, root)
+
+    def reached(self, node: Element) -> Element:
+        """
+        Parse the content of a lazily loaded node, before it is used
+
+        :param node: node found by a lookup
+        :return: node
+        """
+        if node in self.lazy:
+            self.lazy.discard(node)
+            self.source.load(node)
+            self.loads += 1
+            if not self.native:
+                for p in node.iter():
+                    for c in p:
+                        self.parent[c] = p
+        return node
+
+    def load_all(self) -> None:
+        """
+        Parse everything that has been loaded lazily (before the document is traversed by other means)
+
+        :return: None
+        """
+        for node in list(self.lazy):
+            self.reached(node)
+
+    def touch(self, node: Element) -> None:
+        """
+        Invalidate memoized steps evaluated from node
+
+        :param node: node whose children or attributes changed
+        :return: None
+        """
+        if node is not None:
+            self.generation += 1
+            self.touched[node] = self.generation
+
+    def checkpoint(self) -> None:
+        """
+        Start journaling mutations, so they can be undone by rollback()
+
+        :return: None
+        :raises ValueError: if there already is a checkpoint
+        """
+        if self.journal is not None:
+            raise ValueError("Checkpoints can't be nested")
+        self.journal = {}
+        # The dirty nodes before the checkpoint
+        self.clean = self.dirty
+        self.dirty = set()
+
+    def commit(self) -> None:
+        """
+        Keep the mutations since the checkpoint, and stop journaling
+
+        :return: None
+        """
+        if self.journal is None:
+            return
+        self.clean |= self.dirty
+        self.dirty = self.clean
+        self.journal = None
+        self.clean = None
+
+    def rollback(self) -> None:
+        """
+        Undo the mutations since the checkpoint, and stop journaling
+
+        :return: None
+        :raises ValueError: if there is no checkpoint
+        """
+        if self.journal is None:
+            raise ValueError("No checkpoint to roll back to")
+        saved = [(node, state) for (node, state) in self.journal.items() if state is not None]
+        self.journal = None
+        self.dirty = self.clean
+        self.clean = None
+        self.rollbacks += 1
+        removed = []
+        restored = []
+        for (node, (attrib, text, tail, children)) in saved:
+            current = list(node)
+            if current != children:
+                before = set(children)
+                after = set(current)
+                removed.extend(c for c in current if c not in before)
+                restored.extend((node, c) for c in children if c not in after)
+                node[:] = children
+            if node.attrib != attrib:
+                node.attrib.clear()
+                node.attrib.update(attrib)
+            node.text = text
+            node.tail = tail
+        for node in removed:
+            for n in node.iter():
+                if not self.native:
+                    self.parent.pop(n, None)
+                self.index.pop(n, None)
+        if not self.native:
+            for (parent, node) in restored:
+                self.parent[node] = parent
+                for p in node.iter():
+                    for c in p:
+                        self.parent[c] = p
+        for (node, _) in saved:
+            parent = self.parent_of(node)
+            self.index.pop(node, None)
+            self.index.pop(parent, None)
+            self.touch(node)
+            self.touch(parent)
+        self.changed()
+
+    def save(self, node: Element) -> None:
+        """
+        Journal the state of node, before it is changed (if there is a checkpoint)
+
+        :param node: node whose attributes, text, tail or children are about to change
+        :return: None
+        """
+        journal = self.journal
+        if journal is None or node in journal:
+            return
+        if node in self.lazy:
+            self.reached(node)
+        journal[node] = (dict(node.attrib), node.text, node.tail, list(node))
+
+    def _created(self, nodes: Iterable) -> None:
+        # Inserted since the checkpoint, there is nothing to restore
+        journal = self.journal
+        for node in nodes:
+            for n in node.iter():
+                journal.setdefault(n, None)
+
+    def parent_of(self, node: Element) -> Element:
+        """
+        Parent of an attached node
+
+        :param node: node
+        :return: parent or None for the root and detached nodes
+        """
+        if self.native:
+            return self.backend.parent(node)
+        return self.parent.get(node)
+
+    def attached(self, parent: Element, node: Element) -> None:
+        """
+        Register node, and everything below it, as a child of parent
+
+        :param parent: new parent of node (None for the document root)
+        :param node: inserted node
+        :return: None
+        """
+        if parent is not None:
+            self.touch(parent)
+            self.dirty.add(parent)
+            if parent in self.index:
+                self._index_add(self.index[parent], node)
+            if self.journal is not None:
+                self._created((node,))
+        if self.native:
+            return
+        if parent is not None:
+            self.parent[node] = parent
+        else:
+            self.builds += 1
+        for p in node.iter():
+            for c in p:
+                self.parent[c] = p
+
+    def attached_all(self, parent: Element, nodes: list) -> None:
+        """
+        Register nodes, and everything below them, as children of parent
+
+        As attached() for each node, with the bookkeeping of parent done once
+
+        :param parent: new parent of nodes
+        :param nodes: inserted nodes
+        :return: None
+        """
+        self.touch(parent)
+        self.dirty.add(parent)
+        index = self.index.get(parent)
+        if index is not None:
+            for node in nodes:
+                self._index_add(index, node)
+        if self.journal is not None:
+            self._created(nodes)
+        if self.native:
+            return
+        for node in nodes:
+            self.parent[node] = parent
+            if len(node):
+                for p in node.iter():
+                    for c in p:
+                        self.parent[c] = p
+
+    def detached(self, node: Element, parent: Element) -> None:
+        """
+        Forget node, and everything below it
+
+        :param node: removed node
+        :param parent: the parent it was removed from (lxml forgets it on removal)
+        :return: None
+        """
+        self.touch(parent)
+        self.dirty.add(parent)
+        if parent in self.index:
+            self._index_remove(self.index[parent], node)
+        for n in node.iter():
+            self.parent.pop(n, None)
+            self.index.pop(n, None)
+
+    def set_attr(self, node: Element, key: str, value: str) -> None:
+        self.save(node)
+        self.touch(node)
+        self.dirty.add(node)
+        self.touch(self.parent_of(node))
+        if key in self.KEYS:
+            self._reindex(node, key, value)
+        node.set(key, value)
+
+    def pop_attr(self, node: Element, key: str) -> None:
+        self.save(node)
+        self.touch(node)
+        self.dirty.add(node)
+        self.touch(self.parent_of(node))
+        if key in self.KEYS:
+            self._reindex(node, key, None)
+        node.attrib.pop(key, None)
+
+    def cleared(self, node: Element, attrib: dict, children: list) -> None:
+        """
+        Account for an Element.clear()
+
+        :param node: the cleared node
+        :param attrib: attributes it had
+        :param children: children it had
+        :return: None
+        """
+        parent = self.parent_of(node)
+        self.touch(node)
+        self.touch(parent)
+        # The tail of node (part of parent's content) is cleared too
+        self.dirty.add(node)
+        if parent is not None:
+            self.dirty.add(parent)
+        index = self.index.get(parent)
+        if index is not None:
+            for key in self.KEYS:
+                if key in attrib:
+                    index[(node.tag, key, attrib[key])].remove(node)
+        for child in children:
+            self.detached(child, node)
+        self.index.pop(node, None)
+
+    def set_text(self, node: Element, text: str) -> None:
+        self.save(node)
+        node.text = text
+        self.dirty.add(node)
+
+    def lookup(self, parent: Element, tag: str, key: str, value: str) -> list:
+        """
+        Children of parent with tag having key=value
+
+        :param parent: node to search
+        :param tag: tag of child
+        :param key: one of KEYS
+        :param value: attribute value
+        :return: list of matching children, not necessarily in document order
+        """
+        index = self.index.get(parent)
+        if index is None:
+            self.index_builds += 1
+            index = {}
+            for child in parent:
+                self._index_add(index, child)
+            self.index[parent] = index
+        return index.get((tag, key, value), [])
+
+    def step(self, node: Element, step: Step) -> list:
+        """
+        Evaluate a location step, memoized
+
+        :param node: context node
+        :param step: step to take
+        :return: list of matching nodes in document order
+        """
+        key = (node, step)
+        entry = self.memo.get(key)
+        if entry is not None and entry[0] >= self.touched.get(node, 0):
+            self.memo.move_to_end(key)
+            return entry[1]
+        result = self._step(node, step)
+        self.memo[key] = (self.generation, result)
+        if len(self.memo) > self.MEMO_SIZE:
+            self.memo.popitem(last=False)
+        return result
+
+    def _step(self, node: Element, step: Step) -> list:
+        if step.tag == '.':
+            candidates = [node]
+        else:
+            candidates = None
+            if step.tag != '*':
+                for (attr, value) in step.predicates:
+                    if attr in self.KEYS and value is not None:
+                        candidates = self.lookup(node, step.tag, attr, value)
+                        if len(candidates) > 1:
+                            order = list(node)
+                            candidates = sorted(candidates, key=order.index)
+                        break
+            if candidates is None:
+                # Comments and processing instructions don't have a str tag
+                candidates = [c for c in node if c.tag == step.tag or step.tag == '*' and isinstance(c.tag, str)]
+        result = [c for c in candidates
+                  if all(c.get(attr) is not None if value is None else c.get(attr) == value
+                         for (attr, value) in step.predicates)]
+        if self.lazy:
+            for c in result:
+                self.reached(c)
+        return result
+
+    def _reindex(self, node: Element, key: str, value: str) -> None:
+        index = self.index.get(self.parent_of(node))
+        if index is None:
+            return
+        old = node.get(key)
+        if old is not None:
+            index[(node.tag, key, old)].remove(node)
+        if value is not None:
+            index.setdefault((node.tag, key, value), []).append(node)
+
+    @classmethod
+    def _index_add(cls, index: dict, node: Element) -> None:
+        for key in cls.KEYS:
+            value = node.get(key)
+            if value is not None:
+                index.setdefault((node.tag, key, value), []).append(node)
+
+    @classmethod
+    def _index_remove(cls, index: dict, node: Element) -> None:
+        for key in cls.KEYS:
+            value = node.get(key)
+            if value is not None:
+                index[(node.tag, key, value)].remove(node)
+
+    def changed(self) -> None:
+        if XmlManipulator.debug:
+            self.verify()
+
+    def verify(self) -> None:
+        """
+        Compare the incrementally maintained parent map to a full rebuild
+
+        :return: None
+        :raises AssertionError: if they differ
+        """
+        expected = {c: p for p in self.root.iter() for c in p}
+        if self.native:
+            stale = [n.tag for n in expected if self.backend.parent(n) is not expected[n]]
+            if stale:
+                raise AssertionError("Native parents out of sync: %s" % stale)
+        elif expected != self.parent:
+            stale = [n.tag for n in self.parent if self.parent[n] is not expected.get(n)]
+            missing = [n.tag for n in expected if n not in self.parent]
+            raise AssertionError("Parent map out of sync, stale: %s, missing: %s" % (stale, missing))
+        for parent, index in self.index.items():
+            expected = {}
+            for child in parent:
+                self._index_add(expected, child)
+            actual = {k: v for k, v in index.items() if v}
+            if {k: set(v) for k, v in expected.items()} != {k: set(v) for k, v in actual.items()}:
+                raise AssertionError("Child index of %s out of sync" % parent.tag)
 
 
 class XmlManipulator(object):
 
-    def __init__(self, content:TypeVar('xml', str, Element), namespaces: dict = dict()):
-        if type(content) is str:
-            self._root = ET.fromstring(content)
+    # Verify the parent map after every mutation (slow, for tests & debugging)
+    debug = False
+
+    def __init__(self, content: TypeVar('xml', str, bytes, Element), namespaces: dict = dict(),
+                 backend: str = None, preserve: bool = False, lazy: bool = False):
+        """
+        :param content: xml document (str or bytes) or a parsed element
+        :param namespaces: prefix to uri map
+        :param backend: 'etree' or 'lxml', default is lxml when it is installed
+                        (see xmltools.backend)
+        :param preserve: remember where elements came from in content (bytes), and write
+                         unmodified parts of the document as they were (ElementTree only)
+        :param lazy: as preserve, but the children of the root are parsed when they are
+                     first found by a lookup, the rest is written as raw bytes
+        """
+        source = None
+        lazy_nodes = set()
+        if preserve or lazy:
+            if not isinstance(content, bytes):
+                raise ValueError("Preserving the source needs the document as bytes")
+            if backend not in (None, "etree"):
+                raise ValueError("Preserving the source is not supported by the %s backend" % backend)
+            impl = xml_backend.get("etree")
+            try:
+                if not lazy:
+                    raise Unsupported("Not lazy")
+                (self._root, source, lazy_nodes) = SourceMap.parse_lazy(content)
+            except Unsupported:
+                (self._root, source) = SourceMap.parse(content)
+        elif isinstance(content, (str, bytes)):
+            impl = xml_backend.get(backend)
+            self._root = impl.fromstring(content)
         else:
+            impl = xml_backend.get(backend) if backend is not None else xml_backend.of(content)
             self._root = content
         self._namespaces = namespaces
-        self._build_parent_map()
+        self._tree = _Tree(self._root, impl)
+        self._tree.source = source
+        self._tree.lazy = lazy_nodes
+
+    @classmethod
+    def _at(cls, node: Element, namespaces: dict, tree: _Tree) -> TypeVar('XmlManipulator'):
+        xml = cls.__new__(cls)
+        xml._root = node
+        xml._namespaces = namespaces
+        xml._tree = tree
+        return xml
 
     def ns(self, tag, namespace):
         if namespace is None:
             return tag
         return "{" + self._namespaces[namespace] + "}" + tag
 
-    def _build_parent_map(self):
-        self._parent = {c: p for p in self._root.iter() for c in p}
-
     def to_xml(self) -> str:
         out = BytesIO()
-        ET.ElementTree(self._root).write(out, encoding="UTF-8", xml_declaration=True)
+        self.write(out)
         return out.getvalue().decode("UTF-8")
 
+    def write(self, io) -> None:
+        """
+        Serialize (UTF-8 with xml declaration) to a binary file object, without building it in memory
+
+        If the document was parsed preserving the source, unmodified parts are copied
+        from it (in its original encoding)
+
+        :param io: binary file object
+        :return: None
+        """
+        source = self._tree.source
+        if source is not None and self._root is self._tree.root:
+            dirty = self._tree.dirty if self._tree.clean is None else self._tree.clean | self._tree.dirty
+            try:
+                source.write(self._root, io, dirty, self._tree.parent_of)
+                return
+            except Unsupported:
+                pass
+        self._tree.load_all()
+        self._tree.backend.write(self._root, io)
+
+    def checkpoint(self) -> None:
+        """
+        Remember the state of the document, changes from now on can be undone with rollback()
+
+        Nothing is copied, nodes are saved when they are first changed (see _Tree).
+        The checkpoint covers the whole document, not only this root.
+
+        :return: None
+        :raises ValueError: if there already is a checkpoint
+        """
+        self._tree.checkpoint()
+
+    def commit(self) -> None:
+        """
+        Forget the checkpoint, keeping the changes
+
+        :return: None
+        """
+        self._tree.commit()
+
+    def rollback(self) -> None:
+        """
+        Undo the changes since the checkpoint, in time proportional to the number of changed elements
+
+        Elements found (or XmlPoints made) after the checkpoint may no longer be part of the document.
+
+        :return: None
+        :raises ValueError: if there is no checkpoint
+        """
+        self._tree.rollback()
+
     def add_namespace(self, prefix, uri):
         self._namespaces[prefix] = uri
 
+    def _findall(self, xpath: str) -> list:
+        return list(plan(xpath, self._namespaces).select(self._tree, self._root, self._namespaces))
+
+    def _find(self, xpath: str) -> Element:
+        nodes = plan(xpath, self._namespaces).select(self._tree, self._root, self._namespaces)
+        return nodes[0] if nodes else None
+
     def remove(self, xpath: str) -> bool:
-        modified = False
-        for node in self._root.findall(xpath, namespaces=self._namespaces):
-            self._parent[node].remove(node)
-            modified = True
-        if modified:
-            self._build_parent_map()
-        return modified
+        nodes = self._findall(xpath)
+        for node in nodes:
+            parent = self._tree.parent_of(node)
+            if parent is None:
+                # Below a node that has already been removed
+                continue
+            self._tree.save(parent)
+            parent.remove(node)
+            self._tree.detached(node, parent)
+        if nodes:
+            self._tree.changed()
+        return len(nodes) > 0
 
     def remove_attr(self, xpath: str, attr: str) -> bool:
         modified = False
-        for node in self._root.findall(xpath, namespaces=self._namespaces):
+        for node in self._findall(xpath):
             if attr in node.attrib:
-                node.attrib.pop(attr)
+                self._tree.pop_attr(node, attr)
         return modified
 
     def set_attr(self, xpath: str, attr: str, value: str) -> bool:
         modified = False
-        for node in self._root.findall(xpath, namespaces=self._namespaces):
-            node.set(attr, value)
+        for node in self._findall(xpath):
+            self._tree.set_attr(node, attr, value)
         return modified
 
     def replace(self, xpath: str, content: str) -> bool:
         modified = False
         sub_nodes = self._text_to_nodes(content)
-        for node in self._root.findall(xpath, namespaces=self._namespaces):
-            parent = self._parent[node]
+        for node in self._findall(xpath):
+            parent = self._tree.parent_of(node)
+            self._tree.save(parent)
             if sub_nodes is not None:
-                index = parent.getchildren().index(node)
+                index = list(parent).index(node)
                 for sub_node in sub_nodes:
                     index = index + 1
                     parent.insert(index, sub_node)
+                    self._tree.attached(parent, sub_node)
                 sub_nodes = None
             parent.remove(node)
+            self._tree.detached(node, parent)
             modified = True
         if modified:
-            self._build_parent_map()
+            self._tree.changed()
         return modified
 
     def append(self, xpath: str, content: str) -> bool:
@@ -76,48 +620,133 @@ class XmlManipulator(object):
                "".join([" xmlns:%s=%s" % (k, quoteattr(self._namespaces[k])) for k in self._namespaces]) +
                ">" + content + "</xml>")
         sub_nodes = self._text_to_nodes(content)
-        for node in self._root.findall(xpath, namespaces=self._namespaces):
+        for node in self._findall(xpath):
+            self._tree.save(node)
             for sub_node in sub_nodes:
                 node.append(sub_node)
-            self._build_parent_map()
+                self._tree.attached(node, sub_node)
+            self._tree.changed()
             return True
         return False
 
     def append_at(self, xpath: str) -> TypeVar('XmlPoint'):
-        node = self._root.find(xpath, namespaces=self._namespaces)
+        node = self._find(xpath)
         if node is None:
             raise Exception("Node not found")
         return XmlPoint(node, self)
 
     def append_at_all(self, xpath: str) -> TypeVar('XmlPoint'):
-        nodes = self._root.findall(xpath, namespaces=self._namespaces)
+        nodes = self._findall(xpath)
         if nodes is None or len(nodes) == 0:
             raise Exception("Node not found")
         return [XmlPoint(node, self) for node in nodes]
 
+    def child(self, tag: str, attrs: dict = dict()) -> Element:
+        """
+        Find the first child of this root with a given tag and attributes
+
+        Uses the child index when attrs contain an identifying attribute
+        (jndi-name, name or ref)
+
+        :param tag: tag of child
+        :param attrs: attributes that should match
+        :return: element or None
+        """
+        for key in _Tree.KEYS:
+            if key in attrs:
+                candidates = [node for node in self._tree.lookup(self._root, tag, key, attrs[key])
+                              if all(node.get(k) == v for k, v in attrs.items())]
+                if len(candidates) > 1:
+                    order = list(self._root)
+                    candidates.sort(key=order.index)
+                return self._tree.reached(candidates[0]) if candidates else None
+        for node in self._root:
+            if node.tag == tag and all(node.get(k) == v for k, v in attrs.items()):
+                return self._tree.reached(node)
+        return None
+
+    def values(self, tag: str, attr: str) -> set:
+        """
+        Values of an attribute on the children of this root with a given tag
+
+        :param tag: tag of children
+        :param attr: attribute name
+        :return: set of values
+        """
+        return {node.get(attr) for node in self._root if node.tag == tag and node.get(attr) is not None}
+
+    def ensure(self, tag: str, attrs: dict = dict()) -> TypeVar('XmlPoint'):
+        """
+        Find a child of this root with a given tag and attributes, create it if missing
+
+        :param tag: tag of child
+        :param attrs: attributes that should match
+        :return: point at the child
+        """
+        node = self.child(tag, attrs)
+        if node is not None:
+            return XmlPoint(node, self)
+        return XmlPoint(self._root, self).element(tag, attrs)
+
     def has(self, xpath: str) -> bool:
-        return self._root.find(xpath, namespaces=self._namespaces) is not None
+        return self._find(xpath) is not None
 
     def root(self, xpath: str) -> TypeVar('XmlManipulator'):
-        node = self._root.find(xpath, namespaces=self._namespaces)
+        node = self._find(xpath)
         if node is None:
             raise Exception("Could not find root: " + xpath)
-        return XmlManipulator(node, self._namespaces)
+        return XmlManipulator._at(node, self._namespaces, self._tree)
 
     def iterate(self, xpath: str, cb: Callable[[Element, Element], bool]) -> None:
-        nodes = self._root.findall(xpath, namespaces=self._namespaces)
+        """
+        Call cb(child, parent) for every child of the nodes matching xpath
+
+        The callback may add or remove children of parent (or change the child), it
+        should return True if it did.
+
+        :param xpath: location of parents
+        :param cb: callback
+        :return: None
+        """
+        nodes = self._findall(xpath)
         modified = False
         for parent in nodes:
-            for child in parent:
-                modified = cb(child, parent) or modified
+            before = list(parent)
+            if self._tree.journal is not None:
+                # The callback changes the elements directly
+                self._tree.save(parent)
+                for child in before:
+                    self._tree.save(child)
+            parent_modified = False
+            for child in before:
+                parent_modified = cb(child, parent) or parent_modified
+            if parent_modified:
+                self._resync_children(parent, before)
+                modified = True
         if modified:
-            self._build_parent_map()
+            self._tree.changed()
+
+    def _resync_children(self, parent: Element, before: list) -> None:
+        # The callback may have touched attributes too, reindex lazily
+        self._tree.index.pop(parent, None)
+        self._tree.touch(parent)
+        after = list(parent)
+        self._tree.dirty.add(parent)
+        self._tree.dirty.update(after)
+        kept = set(after)
+        for child in before:
+            if child not in kept:
+                self._tree.detached(child, parent)
+        known = set(before)
+        for child in after:
+            if child not in known:
+                self._tree.attached(parent, child)
 
     def _text_to_nodes(self, content):
         xml = ("<xml" +
                "".join([" xmlns:%s=%s" % (k, quoteattr(self._namespaces[k])) for k in self._namespaces]) +
                ">" + content + "</xml>")
-        return ET.fromstring(xml).getchildren()
+        return list(self._tree.backend.fromstring(xml))
 
 
 class XmlPoint(object):
@@ -128,20 +757,62 @@ class XmlPoint(object):
         self._parent = parent
 
     def element(self, tag: str, attr: dict = dict(), namespace: str = None) -> TypeVar('XmlPoint'):
-        node = SubElement(self._top, self._xml.ns(tag, namespace), attrib=attr)
-        self._xml._build_parent_map()
+        self._xml._tree.save(self._top)
+        node = self._xml._tree.backend.subelement(self._top, self._xml.ns(tag, namespace), dict(attr))
+        self._xml._tree.attached(self._top, node)
+        self._xml._tree.changed()
         return XmlPoint(node, self._xml, self)
 
+    def elements(self, tag: str, attrs: Iterable[dict], namespace: str = None) -> TypeVar('XmlPoint'):
+        """
+        Append an element for each set of attributes, in one go
+
+        :param tag: tag of the elements
+        :param attrs: attributes of each element
+        :param namespace: prefix of namespace of tag
+        :return: self
+        """
+        tree = self._xml._tree
+        tag = self._xml.ns(tag, namespace)
+        subelement = tree.backend.subelement
+        tree.save(self._top)
+        nodes = [subelement(self._top, tag, dict(attr)) for attr in attrs]
+        if nodes:
+            tree.attached_all(self._top, nodes)
+            tree.changed()
+        return self
+
+    def fragment(self, fragment: Fragment, **params) -> TypeVar('XmlPoint'):
+        """
+        Append copies of the elements of a fragment
+
+        :param fragment: the elements
+        :param params: values of the {name} parameters in the fragment
+        :return: self
+        """
+        tree = self._xml._tree
+        nodes = fragment.stamp(tree.backend, params)
+        tree.save(self._top)
+        self._top.extend(nodes)
+        tree.attached_all(self._top, nodes)
+        tree.changed()
+        return self
+
     def text(self, content: str) -> TypeVar('XmlPoint'):
-        self._top.text = content
+        self._xml._tree.set_text(self._top, content)
         return self
 
     def attr(self, key: str, value: str = None, namespace: str = None) -> TypeVar('XmlPoint'):
-        self._top.set(self._xml.ns(key, namespace), value)
+        self._xml._tree.set_attr(self._top, self._xml.ns(key, namespace), value)
         return self
 
     def clear(self):
+        self._xml._tree.save(self._top)
+        attrib = dict(self._top.attrib)
+        children = list(self._top)
         self._top.clear()
+        self._xml._tree.cleared(self._top, attrib, children)
+        self._xml._tree.changed()
         return self
 
     def done(self):
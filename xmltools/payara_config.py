@@ -0,0 +1,1298 @@
+import argparse
+import os
+import re
+import stat
+import sys
+import time
+
+from xmltools import backend, timing
+from xmltools.jar_installer import JarInstaller
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.plan import CONNECTION, JOIN, UNEXPANDED, Host, JdbcResource, JmsDestinationResource, \
+    JmsFactoryResource, Plan, StreamingPlan, credentials
+from xmltools.result_cache import ResultCache
+
+# The expanding tokenizer, imported when the first config file that needs it is parsed
+Tokenizer = None
+T = None
+
+
+def _tokenizer(src: str):
+    """
+    Tokenizer for an ini style config file
+
+    :param src: full path of config file
+    :return: expanding.tokenizer.Tokenizer
+    """
+    global Tokenizer, T
+    if Tokenizer is None:
+        from expanding.tokenizer import Tokenizer, TokenType as T
+    return Tokenizer.ini_from_file(src)
+
+
+class PayaraConfig(object):
+    """Configuration file reader and mapper
+
+Handles  input gresourced and maps then into a 'config.xml' abstraction
+
+    """
+
+    def _shorthand(**kvargs):
+        """
+        Make  a function that given an token with an abbreviated key returns the value from key kvargs
+        :param kvargs: key to value (keys are _/- equivalent)
+        :return: function returning value fiven a token
+        """
+        keys = sorted([k.lower() for k in kvargs.keys()])
+        last = keys.pop()
+        if keys:
+            keys = "one of (%s or %s)" % (", ".join(keys), last)
+        else:
+            keys = last
+        table = {}
+
+        def _table():
+            # Built on first lookup, most runs use few of the tables
+            values = {}
+            for k, v in sorted(kvargs.items(), key=lambda i: -len(i[0])):
+                k = k.replace("_", "-").lower()
+                values[k] = [v]
+                for i in range(1, len(k)):
+                    short = k[0:i]
+                    if short not in values:
+                        values[short] = []
+                    values[short].append(v)
+            table.update({k: v1 for k, v in values.items() if len(set({str(v2) for v2 in v})) == 1 for v1 in v})
+            return table
+
+        def _lookup(token, type="word"):
+            values = table or _table()
+            key = token.content().replace("_", "-").lower()
+            if key not in values:
+                raise SyntaxError("Unknown %s: `%s' at: %s expected %s" % (type, token.content(), token.at(), keys))
+            return values[key]
+
+        return _lookup
+
+    _JDBC_RULES_DEFAULT = {
+        'attribs': {
+            "res-type": "javax.sql.DataSource",
+            "datasource-classname": "org.postgresql.ds.PGSimpleDataSource",
+            "ping": "true",
+            "fail-all-connections": "true",
+            "is-connection-validation-required": "true",
+            "connection-validation-method": "custom-validation",
+            "validation-classname": "org.glassfish.api.jdbc.validation.PostgresConnectionValidation",
+            "validate-atmost-once-period-in-seconds": "60"
+        },
+        'props': {
+            "SslFactory": "org.postgresql.ssl.NonValidatingFactory",
+            "PortNumber": "5432"
+        },
+        'credentials': ['User', 'Password', 'ServerName', 'PortNumber', 'DatabaseName']
+    }
+    _JDBC_RULES = _shorthand(postgresql=_JDBC_RULES_DEFAULT)
+    _JDBC_KNOWN_ATTRIBS = {
+        "allow-non-component-callers", "associate-with-thread", "connection-creation-retry-attempts",
+        "connection-creation-retry-interval-in-seconds", "connection-leak-reclaim",
+        "connection-leak-timeout-in-seconds", "connection-validation-method",
+        "datasource-classname", "description", "driver-classname", "fail-all-connections",
+        "idle-timeout-in-seconds", "init-sql", "is-connection-validation-required",
+        "is-isolation-level-guaranteed", "lazy-connection-association", "lazy-connection-enlistment",
+        "match-connections", "max-connection-usage-count", "max-pool-size", "max-wait-time-in-millis",
+        "name", "non-transactional-connections", "ping", "pool-resize-quantity", "pooling", "res-type",
+        "sql-trace-listeners", "statement-cache-size", "statement-leak-reclaim",
+        "statement-leak-timeout-in-seconds", "statement-timeout-in-seconds", "steady-pool-size",
+        "target", "transaction-isolation-level", "validate-atmost-once-period-in-seconds",
+        "validation-classname", "validation-table-name", "wrap-jdbc-objects"
+
+    }
+    _JMS_FACTORY_KNOWN = {
+        "associate-with-thread", "connection-creation-retry-attempts",
+        "connection-creation-retry-interval-in-seconds", "connection-definition-name",
+        "connection-leak-reclaim", "connection-leak-timeout-in-seconds", "deployment-order",
+        "fail-all-connections", "idle-timeout-in-seconds", "is-connection-validation-required",
+        "lazy-connection-association", "lazy-connection-enlistment", "match-connections",
+        "max-connection-usage-count", "max-pool-size", "max-wait-time-in-millis", "object-type",
+        "ping", "pooling", "pool-resize-quantity", "resource-adapter-name",
+        "steady-pool-size", "transaction-support", "validate-atmost-once-period-in-seconds"}
+    _JMS_DESTINATION_KNOWN = {
+        "object-type", "deployment-order", "class-name",
+        "res-adapter", "enabled", "res-type", "jndi-name",
+        "description"
+    }
+    _APP_KNOWN = {
+        "context-root", "name", "location"
+    }
+    _CRES_TYPES = _shorthand(properties="java.util.Properties",
+                             props="java.util.Properties",
+                             property="java.util.Properties",
+                             float="java.lang.Float",
+                             character="java.lang.Character",
+                             long="java.lang.Long",
+                             double="java.lang.Double",
+                             short="java.lang.Short",
+                             boolean="java.lang.Boolean",
+                             string="java.lang.String",
+                             byte="java.lang.Byte",
+                             integer="java.lang.Integer")
+
+    def __init__(self, instance_dir: str, domain: str = "domain1", planning: bool = False, host: Host = None,
+                 preserve: bool = False, lazy: bool = False, keep_going: bool = False, pristine: str = None):
+        """
+        Setup the domain.xml from the instance_dir for modification
+
+        :param instance_dir:
+        :param domain: mane og payara domain
+        :param planning: collect operations from all files, and apply them (coalesced) when done
+        :param host: side effects outside domain.xml (default: Host())
+        :param preserve: write unmodified parts of domain.xml as they were
+        :param lazy: parse the sections of domain.xml when they are used (implies preserve)
+        :param keep_going: report and skip config files that fail, instead of raising (see failed)
+        :param pristine: read domain.xml from this file, it is still saved to its own location
+        """
+        self._instance_dir = PayaraConfig.domain_dir(instance_dir, domain)
+        self._domain_xml = None
+        self._host = host if host is not None else Host()
+        self._plan = Plan() if planning else None
+        self._preserve = preserve
+        self._lazy = lazy
+        self._keep_going = keep_going
+        self._pristine = pristine
+        # (config file, error) of the files that have been skipped
+        self.failed = []
+
+    def __getstate__(self):
+        # Parsing in a worker process needs nothing but the paths
+        return {'_instance_dir': self._instance_dir, '_domain_xml': None, '_host': None, '_plan': None,
+                '_preserve': self._preserve, '_lazy': self._lazy, '_keep_going': False, '_pristine': None,
+                'failed': []}
+
+    @property
+    def domain_xml(self) -> DomainXml:
+        """
+        The domain.xml, loaded when first needed
+
+        :return: DomainXml
+        """
+        if self._domain_xml is None:
+            with timing.stage("load"):
+                content = None
+                if self._pristine is not None:
+                    with open(self._pristine, "rb") as io:
+                        content = io.read()
+                self._domain_xml = DomainXml(PayaraConfig.domain_xml_of(self._instance_dir),
+                                             preserve=self._preserve, content=content, lazy=self._lazy)
+            timing.loaded(self._domain_xml)
+        return self._domain_xml
+
+    @staticmethod
+    def domain_dir(instance_dir: str, domain: str = "domain1") -> str:
+        return os.path.join(instance_dir, 'glassfish', 'domains', domain)
+
+    @staticmethod
+    def domain_xml_of(domain_dir: str) -> str:
+        return os.path.join(domain_dir, 'config', 'domain.xml')
+
+    def _process_txt(self, src: str, plan: Plan):
+        """
+        Copy content to stdout
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        with open(src, "r") as io:
+            plan.echo(io.read())
+
+    def _process_app(self, src: str, plan: Plan):
+        """
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        tokenizer = _tokenizer(src)
+
+        cfg_props = {}
+
+        while tokenizer.has_more():
+            line = []
+            if tokenizer.tokens_are(T.NEWLINE):
+                pass
+            elif tokenizer.tokens_are(T.WORD, T.EQ, T.TEXT, T.EOL, output=line):
+                if line[0].content() in cfg_props:
+                    raise Exception("At %s, %s is redefined" % (line[0].at(), line[0].content()))
+                cfg_props[line[0].content()] = line[2].content()
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+        for required in {"location"}:
+            if required not in cfg_props:
+                raise Exception("Required parameter %s is not defined in %s" % (required, src))
+        props = {"context-root": "/",
+                 "name": "app"}
+        props.update(cfg_props)
+        for key in props:
+            if key not in self._APP_KNOWN:
+                raise Exception("Unknown parameter %s is not defined in %s" % (key, src))
+        app_file = self._location(os.path.dirname(src), props['location'])
+        if JOIN not in app_file and not os.path.isfile(app_file):
+            raise Exception("missing file: " + app_file)
+        plan.app(props['name'], app_file, props['context-root'])
+
+    @staticmethod
+    def _location(base: str, path: str) -> str:
+        if UNEXPANDED in path:
+            # Compiling a bundle, joined when it is applied (see App.resolved())
+            return base + JOIN + path
+        return os.path.join(base, path)
+
+    def _process_lib(self, src: str, plan: Plan):
+        """
+        Read sections and copy jars into relevant instance_dir paths
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        base = os.path.dirname(src)
+        lib = os.path.join(self._instance_dir, 'lib')
+        tokenizer = _tokenizer(src)
+        while tokenizer.has_more():
+            line = []
+            if tokenizer.tokens_are(T.NEWLINE):
+                pass
+            elif tokenizer.tokens_are(T.SECTION, T.EOL, output=line):
+                if line[0].content() not in {"app", "common", "ext", "osgi"}:
+                    raise Exception("at %s unknown section. known are: app, common & ext" % line[0].at())
+                if line[0].content() == "osgi":
+                    while tokenizer.has_more():
+                        line = []
+                        if tokenizer.tokens_are(T.NEWLINE):
+                            pass
+                        elif tokenizer.tokens_are(T.TEXT, T.EOL, output=line):
+                            osgi_file = self._location(base, line[0].content())
+                            plan.osgi(os.path.basename(osgi_file), osgi_file)
+                        else:
+                            break
+                elif line[0].content() == "app":
+                    lib = os.path.join(self._instance_dir, 'lib', 'applibs')
+                elif line[0].content() == "ext":
+                    lib = os.path.join(self._instance_dir, 'lib', 'ext')
+                else:
+                    lib = os.path.join(self._instance_dir, 'lib')
+            elif tokenizer.tokens_are(T.TEXT, T.EOL, output=line):
+                plan.install(self._location(base, line[0].content()), lib)
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+    def _process_cres(self, src: str, plan: Plan):
+        """
+        Create custom-resources each section declares a type, and thw following key/value pairs are jndi-name
+        and value. 'properties' are special, in the case that the 1st argument is a simple text with the
+        jndi-name, and the following key/value pairs are properties
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        tokenizer = _tokenizer(src)
+        while tokenizer.has_more():
+            line = []
+            if tokenizer.tokens_are(T.NEWLINE):
+                pass
+            elif tokenizer.tokens_are(T.SECTION, T.EOL, output=line):
+                res_type = PayaraConfig._CRES_TYPES(line[0], type="section")
+                if res_type == "java.util.Properties":
+                    name = None
+                    while tokenizer.has_more():
+                        line = []
+                        if tokenizer.tokens_are(T.NEWLINE):
+                            pass
+                        elif tokenizer.tokens_are(T.TEXT, T.EOL, output=line):
+                            name = line[0].content()
+                            break
+                        else:
+                            unexpected = tokenizer.peek_token()
+                            raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+                    props = self._read_props(tokenizer)
+                    plan.custom_resource_props(name, props)
+                else:
+                    props = self._read_props(tokenizer, key_is=T.TEXT)
+                    plan.custom_resources_primitive((res_type, name, value) for (name, value) in props.items())
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+    def _process_cres_jsonl(self, src: str, plan: Plan) -> None:
+        """
+        Create custom-resources, one json object per line, read as a stream
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        from xmltools import records
+        for record in records.jsonl(src):
+            res_type = PayaraConfig._CRES_TYPES(record.value("type", "string"), type="type")
+            name = record.string("name")
+            if res_type == "java.util.Properties":
+                plan.custom_resource_props(name, record.props("props"))
+            else:
+                plan.custom_resource_primitive(res_type, name, record.string("value"))
+
+    def _process_jdbc_csv(self, src: str, plan: Plan) -> None:
+        """
+        Read jdbc resources, one per row of a csv file, read as a stream
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        from xmltools import records
+        for record in records.csv_rows(src):
+            template = PayaraConfig._JDBC_RULES(record.value("template", "postgresql"), type="template")
+            jndi_name = record.string("jndi-name")
+            attribs = dict(template['attribs'])
+            try:
+                props = PayaraConfig._jdbc_props(template, record.fields.get("connection"),
+                                                 {k: v for (k, v) in record.fields.items()
+                                                  if k not in ("jndi-name", "template", "connection")})
+            except Exception as e:
+                raise record.error(str(e))
+            attribs.update({k: v for (k, v) in props.items() if k in self._JDBC_KNOWN_ATTRIBS})
+            props = {k: v for (k, v) in props.items() if k not in self._JDBC_KNOWN_ATTRIBS}
+            plan.jdbc_resource(jndi_name, attribs, props)
+
+    def _process_jdbc(self, src: str, plan: Plan) -> None:
+        """
+        Read a jdbc resource and enable it
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        template = PayaraConfig._JDBC_RULES_DEFAULT
+        tokenizer = _tokenizer(src)
+        self._eat_newlines(tokenizer)
+        line = []
+        if tokenizer.tokens_are(T.WORD, T.EOL, output=line):
+            template = PayaraConfig._JDBC_RULES(line[0], type="template")
+        while tokenizer.has_more():
+            self._eat_newlines(tokenizer)
+            line = []
+            if tokenizer.tokens_are(T.SECTION, T.EOL, output=line):
+                jndi_name = line[0].content()
+                attribs = dict(template['attribs'])
+                self._eat_newlines(tokenizer)
+                line = []
+                connection = None
+                if tokenizer.tokens_are(T.TEXT, T.EOL, output=line):
+                    connection = line[0].content()
+                props = PayaraConfig._jdbc_props(template, connection, self._read_props(tokenizer))
+                attribs.update({k: v for (k, v) in props.items() if k in self._JDBC_KNOWN_ATTRIBS})
+                props = {k: v for (k, v) in props.items() if k not in self._JDBC_KNOWN_ATTRIBS}
+                plan.jdbc_resource(jndi_name, attribs, props)
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+    def _process_sys(self, src: str, plan: Plan):
+        """
+        process a .sys type file see SYNTAX for description
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        tokenizer = _tokenizer(src)
+        while tokenizer.has_more():
+            line = []
+            if tokenizer.tokens_are(T.NEWLINE):
+                pass
+            elif tokenizer.tokens_are(T.WORD, T.EQ, T.TEXT, T.EOL, output=line):
+                plan.system_property(line[0].content(), line[2].content())
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+    def _process_set(self, src: str, plan: Plan):
+        """
+        process a .set type file see SYNTAX for description
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        tokenizer = _tokenizer(src)
+        actions = PayaraConfig._shorthand(properties=plan.props_at,
+                                          property=plan.props_at,
+                                          props=plan.props_at,
+                                          attributes=plan.attrs_at,
+                                          ensure=plan.ensure_at)
+        while tokenizer.has_more():
+            line = []
+            if tokenizer.tokens_are(T.NEWLINE):
+                pass
+            elif tokenizer.tokens_are(T.SECTION, T.EOL, output=line):
+                action = actions(line[0], type="section")
+                while tokenizer.has_more():
+                    self._eat_newlines(tokenizer)
+                    line = []
+                    if tokenizer.peek_token().is_a(T.SECTION):
+                        break
+                    if tokenizer.tokens_are(T.TEXT, T.EOL, output=line):
+                        xpath = line[0].content()
+                        props = self._read_props(tokenizer, key_is=T.TEXT)
+                        action(xpath, props)
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+    def _process_jms(self, src: str, plan: Plan) -> None:
+        """
+        Create jms resources. see SYNTAX for description
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        tokenizer = _tokenizer(src)
+        self._eat_newlines(tokenizer)
+        line = []
+        while tokenizer.has_more():
+            self._eat_newlines(tokenizer)
+            line = []
+            if tokenizer.tokens_are(T.SECTION, T.EOL, output=line):
+                section = line[0].content()
+                at = line[0].at()
+                if section == 'REMOTE':
+                    props = self._read_props(tokenizer)
+                    if not 'address' in props:
+                        raise Exception("Missing 'address' in jms at %s" % at)
+                    plan.jms_remote(props['address'])
+                elif section.endswith('Factory'):
+                    props = self._read_props(tokenizer, {
+                        "connection-definition-name": "javax.jms." + section,
+                        "resource-adapter-name": "jmsra",
+                        "transaction-support": "XATransaction"
+                    })
+                    props = self._read_props(tokenizer, props)
+                    attribs = {k: v for (k, v) in props.items() if k in self._JMS_FACTORY_KNOWN}
+                    props = {k: v for (k, v) in props.items() if k not in self._JMS_FACTORY_KNOWN}
+                    if not 'name' in props:
+                        raise Exception("Missing 'name' in jms at %s" % at)
+                    name = props['name']
+                    del props['name']
+                    plan.jms_factory_resource(name, attribs, props)
+                else:
+                    props = self._read_props(tokenizer, {
+                        "res-type": "javax.jms." + section,
+                        "res-adapter": "jmsra"
+                    })
+                    props = self._read_props(tokenizer, props)
+                    attribs = {k: v for (k, v) in props.items() if k in self._JMS_DESTINATION_KNOWN}
+                    props = {k: v for (k, v) in props.items() if k not in self._JMS_DESTINATION_KNOWN}
+                    if not 'name' in props:
+                        raise Exception("Missing 'name' in jms at %s" % at)
+                    name = props['name']
+                    del props['name']
+                    if 'Name' not in props:
+                        props['Name'] = name.replace("/", "_")
+                    plan.jms_destination_resource(name, attribs, props)
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+    def _process_xpath(self, src: str, plan: Plan) -> None:
+        """
+        Simple xpath expressions
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        tokenizer = _tokenizer(src)
+        self._eat_newlines(tokenizer)
+        line = []
+        while tokenizer.has_more():
+            self._eat_newlines(tokenizer)
+            line = []
+            if tokenizer.tokens_are(T.SECTION, T.EOL, output=line):
+                section = line[0].content()
+                at = line[0].at()
+                if section.lower() == 'remove':
+                    while tokenizer.has_more():
+                        line = []
+                        self._eat_newlines(tokenizer)
+                        if tokenizer.tokens_are(T.TEXT, T.EOL, output=line):
+                            plan.remove(line[0].content())
+                        else:
+                            break
+                elif section.lower() == 'append':
+                    while tokenizer.has_more():
+                        line = []
+                        self._eat_newlines(tokenizer)
+                        if tokenizer.tokens_are(T.TEXT, T.EQ, T.TEXT, T.EOL, output=line):
+                            plan.append(line[0].content(), line[2].content())
+                        else:
+                            break
+                elif section.lower() == 'remove-attr':
+                    while tokenizer.has_more():
+                        line = []
+                        self._eat_newlines(tokenizer)
+                        if tokenizer.tokens_are(T.TEXT, T.EQ, T.WORD, T.EOL, output=line):
+                            plan.remove_attr(line[0].content(), line[2].content())
+                        else:
+                            break
+                elif section.lower() == 'set-attr':
+                    while tokenizer.has_more():
+                        line = []
+                        self._eat_newlines(tokenizer)
+                        if tokenizer.tokens_are(T.TEXT, T.EQ, T.WORD, T.TEXT, T.EOL, output=line):
+                            plan.set_attr(line[0].content(), line[2].content(), line[3].content())
+                        else:
+                            break
+                else:
+                    raise Exception("Unknown section at %s" % at)
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+
+    def _process_jvm(self, src: str, plan: Plan):
+        """
+        Set/Remove/Reset jvm options
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        tokenizer = _tokenizer(src)
+        props = dict(add=[], remove=[])
+        wipe = False
+        current = props['add']
+        while tokenizer.has_more():
+            line = []
+            if tokenizer.tokens_are(T.NEWLINE):
+                pass
+            elif tokenizer.tokens_are(T.SECTION, T.EOL, output=line):
+                section = line[0].content().lower()
+                if section == 'clear':
+                    wipe = True
+                elif section in props:
+                    current = props[section]
+                else:
+                    raise Exception("Unknown section %a at: %s", section, line[0].at())
+            elif tokenizer.tokens_are(T.TEXT, T.EOL, output=line):
+                if line[0].content() not in current:
+                    current.append(line[0].content())
+            else:
+                unexpected = tokenizer.peek_token()
+                raise SyntaxError("Unexpected input: `%s' at: %s" % (unexpected.content(), unexpected.at()))
+        plan.jvm_options(wipe, props['add'], props['remove'])
+
+    def _process_sh(self, src: str, plan: Plan):
+        """
+        Run the script
+
+        :param src: full path of source file
+        :param plan: where operations are recorded
+        :return: None
+        """
+        plan.run(src)
+
+    # Files read a record at a time, applied while they are read (unless planning)
+    _STREAMED = (".cres.jsonl", ".jdbc.csv")
+
+    def _method(self, src: str):
+        """
+        Find a method matching the suffix of the filename (the last two, ie. .cres.jsonl, or the last)
+
+        :param src: full path of source file
+        :return: the unbound method, that records the operations of the file
+        """
+        suffixes = os.path.basename(src).split(".")[1:]
+        method = None
+        if len(suffixes) >= 2:
+            method = self.__class__.__dict__.get("_process_" + "_".join(suffixes[-2:]))
+        if method is None:
+            method = self.__class__.__dict__.get("_process_" + src[src.rfind(".") + 1:])
+        if method is None:
+            raise Exception("Unknown file type: " + src)
+        return method
+
+    def parse(self, src: str) -> Plan:
+        """
+        Record what a file does
+
+        :param src: full path of source file
+        :return: the operations of the file
+        """
+        plan = Plan()
+        self._method(src).__call__(self, src, plan)
+        return plan
+
+    def _streamed(self, src: str) -> bool:
+        return self._plan is None and src.endswith(self._STREAMED)
+
+    def process(self, src: str, plan: Plan = None) -> None:
+        """
+        Apply a config file (or add it to the plan, if planning)
+
+        The changes a file makes to domain.xml are a transaction: if it fails
+        halfway they are rolled back, so the document is as before the file.
+        Jars it queued for installing are dropped, installed jars, scripts and
+        text are not undone.
+
+        .cres.jsonl and .jdbc.csv files are applied in chunks while they are
+        read (unless planning), so they are never held in memory as a whole.
+
+        :param src: full path of source file
+        :param plan: the already parsed operations of the file (resolved here, see Plan.resolved())
+        :return: None
+        :raises Exception: if the file fails (unless keeping going)
+        """
+        name = os.path.split(src)[-1]
+        print("Setting up from:", name)
+        try:
+            if plan is not None:
+                plan = plan.resolved()
+            streamed = plan is None and self._streamed(src)
+            if plan is None and not streamed:
+                with timing.stage("tokenize", src):
+                    plan = self.parse(src)
+            if self._plan is None:
+                domain_xml = self.domain_xml
+                with timing.stage("apply", src):
+                    mark = self._host.mark()
+                    domain_xml.checkpoint()
+                    try:
+                        if streamed:
+                            plan = StreamingPlan(domain_xml, self._host)
+                            self._method(src).__call__(self, src, plan)
+                            reports = plan.done()
+                        else:
+                            reports = plan.apply(domain_xml, self._host)
+                    except BaseException:
+                        domain_xml.rollback()
+                        self._host.drop(mark)
+                        raise
+                    domain_xml.commit()
+                timing.count("operations", len(plan))
+                self._print_reports(reports)
+            else:
+                timing.count("operations", len(plan))
+                self._plan.extend(plan)
+        except Exception as e:
+            if not self._keep_going:
+                raise
+            self._skip(src, e)
+
+    @staticmethod
+    def _print_reports(reports: list) -> None:
+        for report in reports:
+            for line in report.lines():
+                print(line)
+
+    def _skip(self, src: str, error: Exception) -> None:
+        print("Skipped %s: %s" % (os.path.basename(src), error), file=sys.stderr)
+        self.failed.append((src, str(error)))
+
+    def _parse_timed(self, src: str) -> tuple:
+        # Runs in a worker process, the timings are reported by the parent
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        plan = self.parse(src)
+        return plan, time.perf_counter() - wall, time.process_time() - cpu
+
+    def process_all(self, files: list, jobs: int = 1) -> None:
+        """
+        Parse config files concurrently, and apply them in the given order
+
+        A script may write the config files after it, so (unless planning, where
+        scripts run when all files have been parsed) the files from the first
+        script on are parsed by this process, when their turn comes.
+
+        :param files: full paths of source files
+        :param jobs: number of worker processes
+        :return: None
+        """
+        ahead = len(files)
+        if self._plan is None:
+            ahead = next((i for (i, src) in enumerate(files) if src.endswith(".sh")), ahead)
+        if jobs <= 1 or ahead <= 1:
+            for src in files:
+                self.process(src)
+            return
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            for src in files:
+                self.process(src)
+            return
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(min(jobs, ahead), mp_context=context) as pool:
+            # Streamed files are read by this process, when they are applied
+            futures = [None if i >= ahead or self._streamed(src) else pool.submit(self._parse_timed, src)
+                       for (i, src) in enumerate(files)]
+            for (src, future) in zip(files, futures):
+                if future is None:
+                    self.process(src)
+                    continue
+                try:
+                    (plan, wall, cpu) = future.result()
+                except Exception as e:
+                    if not self._keep_going:
+                        raise
+                    self._skip(src, e)
+                    continue
+                timing.record("tokenize", src, wall, cpu)
+                self.process(src, plan)
+
+    def done(self, fsync: bool = False, skip_unchanged: bool = False):
+        """
+        Apply the plan (if planning), wait for jars to be installed and save the modified domain.xml file
+
+        :param fsync: flush domain.xml to disk
+        :param skip_unchanged: don't write domain.xml if the content is unchanged
+        :return: None
+        """
+        if self._plan is not None:
+            domain_xml = self.domain_xml
+            with timing.stage("apply"):
+                reports = self._plan.apply(domain_xml, self._host, coalesce=True)
+            self._print_reports(reports)
+        with timing.stage("wait"):
+            self._host.wait()
+        domain_xml = self.domain_xml
+        with timing.stage("save"):
+            domain_xml.save(fsync=fsync, skip_unchanged=skip_unchanged)
+
+    @staticmethod
+    def _read_props(tokenizer, props=None, key_is=None):
+        if props is None:
+            props = {}
+        if key_is is None:
+            key_is = T.WORD
+        while tokenizer.has_more():
+            line = []
+            if tokenizer.tokens_are(T.NEWLINE):
+                pass
+            elif tokenizer.tokens_are(key_is, T.EQ, T.TEXT, T.EOL, output=line):
+                props[line[0].content()] = line[2].content()
+            else:
+                break
+        return props
+
+    @staticmethod
+    def _eat_newlines(tokenizer):
+        while tokenizer.has_more() and tokenizer.tokens_are(T.NEWLINE):
+            pass
+
+    @staticmethod
+    def _jdbc_credentials(names, s, props=None):
+        if props is None:
+            props = {}
+        props.update(credentials(names, s))
+        return props
+
+    @staticmethod
+    def _jdbc_props(template: dict, connection: str, explicit: dict) -> dict:
+        """
+        Props of a jdbc resource: the template's, the parts of the connection string and the explicit ones
+
+        When compiling a bundle, a connection string containing variables is split when it is applied
+        (see JdbcResource.resolved())
+
+        :param template: jdbc rules
+        :param connection: [user[:password]@]host[:port]/database or None
+        :param explicit: props given in the config file
+        :return: name to value
+        :raises Exception: if the connection string is invalid
+        """
+        props = dict(template['props'])
+        if connection is not None:
+            names = template['credentials']
+            if UNEXPANDED in connection:
+                props[CONNECTION] = (tuple(names), connection, tuple(name for name in names if name in explicit))
+            else:
+                PayaraConfig._jdbc_credentials(names, connection, props)
+        props.update(explicit)
+        return props
+
+    SYNTAX = """
+    .app:
+    key-value+:
+      * location= - (absolute or relative to .app file) path of war/ear (required)
+      * name= - application name
+      * context-root= - deploy path
+    
+    .lib
+    (section|string)+
+      * section - (one of: osgi, app, common(default) or ext) where to place jars (see asadmin)
+        * string(s) - (absolute or relative to .lib file) path of jar
+        [osgi] is special adds as a osgi application
+    
+    .cres:
+    (section text? key-value*)*
+      * section - custom resource type (short name, ie. string, boolean, properties...)
+        * for `properties`:
+          * text - resource name
+          * key-value - property values
+        * for `primitives/string`
+          * key-value - property name to value
+    .sys:
+    key-value*:
+      * system-property
+     
+    .set:
+    (section (text key-value*)*)*
+      * section is one of ensure, properties, attributes
+        * text - xpath expression to node
+        * key-value - property values (for ensure: . = tag name)
+
+    .jdbc:
+    text? (section text? key-value*)*
+      * text - template defaulte to 'postgresql' (sets sane defaults)
+        * section - jdbc name (ie. jdbc/my-database)
+        * text - connect string (user:pass@host[:port]/base)
+        * key-value - database connection properties
+          - the following is set as connection parameters      
+            allow-non-component-callers, associate-with-thread, connection-creation-retry-attempts,
+            connection-creation-retry-interval-in-seconds, connection-leak-reclaim,
+            connection-leak-timeout-in-seconds, connection-validation-method,
+            datasource-classname, description, driver-classname, fail-all-connections,
+            idle-timeout-in-seconds, init-sql, is-connection-validation-required,
+            is-isolation-level-guaranteed, lazy-connection-association, lazy-connection-enlistment,
+            match-connections, max-connection-usage-count, max-pool-size, max-wait-time-in-millis,
+            name, non-transactional-connections, ping, pool-resize-quantity, pooling, res-type,
+            sql-trace-listeners, statement-cache-size, statement-leak-reclaim,
+            statement-leak-timeout-in-seconds, statement-timeout-in-seconds, steady-pool-size,
+            target, transaction-isolation-level, validate-atmost-once-period-in-seconds,
+            validation-classname, validation-table-name, wrap-jdbc-objects
+          - everything else is set as properties ie. User, Password, ServerName, ApplicationName
+
+    .cres.jsonl:
+    one json object per line
+      * type - custom resource type (short name as in .cres, default string)
+      * name - jndi name
+      * value - for primitives/string
+      * props - for properties, object of property values
+
+    .jdbc.csv:
+    one jdbc resource per row, the first row names the columns
+      * jndi-name - jdbc name (required)
+      * template - as in .jdbc (default postgresql)
+      * connection - connect string (user:pass@host[:port]/base)
+      * any other column - as key-value in .jdbc (empty cells are left out)
+
+    .jms:
+    (section key-value*)*
+      * section is one of: REMOTE/Topic/Queue/*Factory
+      * REMOTE
+        * address= - host[:port] of remote jms server
+      * *Factory
+        * name - the jndi name
+        * key-value - properties
+          - the following properties are known
+            associate-with-thread, connection-creation-retry-attempts,
+            connection-creation-retry-interval-in-seconds, connection-definition-name,
+            connection-leak-reclaim, connection-leak-timeout-in-seconds, deployment-order,
+            fail-all-connections, idle-timeout-in-seconds, is-connection-validation-required,
+            lazy-connection-association, lazy-connection-enlistment, match-connections,
+            max-connection-usage-count, max-pool-size, max-wait-time-in-millis, object-type,
+            ping, pooling, pool-resize-quantity, resource-adapter-name,
+            steady-pool-size, transaction-support, validate-atmost-once-period-in-seconds
+      * *Topic/Queue
+        * name - the jndi name
+        * key-value - properties
+          - the following properties are known, object-type, deployment-order, class-name,
+            res-adapter, enabled, res-type, description, AddressList
+
+    .xpath:
+    (section rules)*
+    * section is one of remove, remove-attr, append, or set-attr
+    * remove (rules = text*)
+      * text - xpath expression to element that should be removed
+    * remove-attr (rules = (text = word)*)
+      * text - xpath expression to element that should have attributes removed
+      * word - attribute name to remove
+    * append (rules = (text = text)*)
+      * text - xpath expression to element that should have content appended
+      * text - literal xml to be inserted
+    * set-attr (rules = (text = word text)*)
+      * text - xpath expression to element that should have attributes set
+      * word - attribute name to set
+      * text - attribute value
+
+    .jvm
+    (section|text)*
+    * section is one of clear, remove or add(default)
+    * clear wipes alle set jvm options
+    * remove
+      * text - shell pattern matching jvm options to remove (ie. -D*.telnet.*)
+    * add
+      * text - literal java-vm flags 
+    
+    .txt
+    * copy content verbatim to stdout
+    
+    .sh
+    * make executable and execute
+    * a script containing the line `# payara5-setup: independent` is run
+      concurrently with the domain.xml changes (output prefixed with its name)
+    """
+
+    def preflight(self, files: list, jobs: int = 1) -> bool:
+        """
+        Validate config files without loading domain.xml or installing anything, and print what is found
+
+        :param files: full paths of source files
+        :param jobs: number of worker processes
+        :return: if there are no errors
+        """
+        from xmltools import check
+        report = check.check(files, self.parse, {
+            JdbcResource: self._JDBC_KNOWN_ATTRIBS,
+            JmsFactoryResource: self._JMS_FACTORY_KNOWN,
+            JmsDestinationResource: self._JMS_DESTINATION_KNOWN
+        }, jobs)
+        for line in report.lines():
+            print(line, file=sys.stderr)
+        return bool(report)
+
+    @staticmethod
+    def validate_name(name: str) -> bool:
+        if re.match("^.*\\.(war|ear|jar)$", name) is not None:
+            return
+        # Two suffixes only where there is a _process_ method for the pair
+        if re.match("^\\d+(?:[-_]\\w+)+\\.(?:cres\\.jsonl|jdbc\\.csv|\\w+)$", name) is None:
+            print("Invalid file name:", name, file=sys.stderr)
+            return False
+        return True
+
+    @staticmethod
+    def expand_location(dir_or_file: str) -> str:
+        if os.path.isdir(dir_or_file):
+            entries = [entry for entry in os.listdir(dir_or_file) if PayaraConfig.validate_name(entry)]
+            entries.sort()
+            return [os.path.abspath(os.path.join(dir_or_file, entry)) for entry in entries]
+        elif os.path.isfile(dir_or_file):
+            return [os.path.abspath(dir_or_file)]
+        else:
+            raise IOError("Unknown location: " + dir_or_file)
+
+
+def main(argv: list = None) -> int:
+    """
+    Command line of payara5-setup
+
+    :param argv: arguments (default: sys.argv[1:])
+    :return: exit code
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[0:1] == ["compile"]:
+        from xmltools.bundle import Bundle
+        compiler = argparse.ArgumentParser(usage="%(prog)s compile -o BUNDLE payara-5-dir [ config-file-or-dir* ]",
+                                           description="Tokenize config files into a bundle, that is applied "
+                                                       "with apply-bundle when the environment is known")
+        compiler.add_argument("payara_dir", metavar="payara-5-dir")
+        compiler.add_argument("locations", metavar="config-file-or-dir", nargs="*")
+        compiler.add_argument("-o", "--output", metavar="BUNDLE", required=True, help="file to write")
+        args = compiler.parse_args(argv[1:])
+        files = [sub_location
+                 for location in args.locations or [os.getcwd()]
+                 for sub_location in PayaraConfig.expand_location(location)]
+        bundle = Bundle.compile(files, PayaraConfig(args.payara_dir).parse)
+        bundle.save(args.output)
+        print("Compiled %d files into %s, variables: %s" %
+              (len(files), args.output, ", ".join(sorted(bundle.variables)) or "none"))
+        return 0
+    if argv[0:1] == ["batch"]:
+        return _batch(argv[1:])
+    applying_bundle = argv[0:1] == ["apply-bundle"]
+    if applying_bundle:
+        argv = argv[1:]
+
+    parser = argparse.ArgumentParser(usage="%(prog)s [options] payara-5-dir [ config-file-or-dir* ]\n"
+                                           "       %(prog)s compile -o BUNDLE payara-5-dir [ config-file-or-dir* ]\n"
+                                           "       %(prog)s apply-bundle [options] payara-5-dir BUNDLE\n"
+                                           "       %(prog)s batch [options] payara-5-dir-or-domain.xml VARIANTS "
+                                           "[ config-file-or-dir* ]",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=PayaraConfig.SYNTAX)
+    parser.add_argument("payara_dir", metavar="payara-5-dir")
+    parser.add_argument("locations", metavar="config-file-or-dir", nargs="*")
+    parser.add_argument("--plan", action="store_true",
+                        help="collect operations from all files, and apply them coalesced before saving")
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="number of processes parsing config files (default: one per cpu for large configs)")
+    parser.add_argument("--fsync", action="store_true",
+                        help="flush domain.xml to disk before exiting")
+    parser.add_argument("--skip-unchanged", action="store_true",
+                        help="don't write domain.xml if the content is unchanged")
+    parser.add_argument("--preserve-formatting", action="store_true",
+                        help="copy the parts of domain.xml that are not modified verbatim, instead of reformatting")
+    parser.add_argument("--lazy", action="store_true",
+                        help="parse the sections of domain.xml when they are used, copy the rest verbatim "
+                             "(implies --preserve-formatting)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always process the config files, don't use or update the result cache")
+    parser.add_argument("--cache-dir", default=ResultCache.default_directory(),
+                        help="location of the result cache (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=64,
+                        help="size limit of the result cache in MB (default: %(default)s)")
+    parser.add_argument("--check", action="store_true",
+                        help="only validate the config files (syntax, keys, files, environment variables)")
+    parser.add_argument("--preflight", action="store_true",
+                        help="validate every config file before changing anything")
+    parser.add_argument("--keep-going", action="store_true",
+                        help="skip config files that fail (their domain.xml changes are rolled back), "
+                             "process the rest and exit with 1")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running, and update domain.xml when config files change")
+    parser.add_argument("--watch-interval", type=float, default=1.0,
+                        help="seconds between scans, when inotify isn't available (default: %(default)s)")
+    parser.add_argument("--task", action="append", default=[], metavar="NAME[:DEPENDENCY,...]=COMMAND",
+                        help="run a shell command concurrently with the domain.xml changes, after the named tasks "
+                             "have succeeded (domain.xml is the domain.xml changes, independent scripts are "
+                             "named by their file name)")
+    parser.add_argument("--task-timeout", action="append", default=[], metavar="[NAME=]SECONDS",
+                        help="kill a command (or script) that runs longer (without NAME: every one)")
+    parser.add_argument("--timings", metavar="FILE",
+                        help="write wall/cpu time per config file and phase, and DomainXml statistics as json "
+                             "(- for stdout)")
+    parser.add_argument("--timings-prometheus", metavar="FILE",
+                        help="write the timings as a prometheus textfile")
+    if not argv:
+        print("Usage: command payara-5-dir [ config-file-or-dir* ]")
+        print("")
+        print(PayaraConfig.SYNTAX)
+        return 1
+    args = parser.parse_args(argv)
+
+    timings = None
+    if args.timings or args.timings_prometheus:
+        timings = timing.Timings()
+        timing.add_recorder(timings)
+
+    def write_timings():
+        if timings is None:
+            return
+        if args.timings == "-":
+            timings.write_json(sys.stdout)
+        elif args.timings:
+            with open(args.timings, "w") as io:
+                timings.write_json(io)
+        if args.timings_prometheus:
+            timings.write_prometheus(args.timings_prometheus)
+
+    if args.watch:
+        if applying_bundle:
+            parser.error("--watch can't be used with apply-bundle")
+        ignored = [option for (option, value) in (("--plan", args.plan), ("--jobs", args.jobs),
+                                                  ("--skip-unchanged", args.skip_unchanged), ("--lazy", args.lazy),
+                                                  ("--check", args.check), ("--preflight", args.preflight),
+                                                  ("--keep-going", args.keep_going), ("--task", args.task),
+                                                  ("--task-timeout", args.task_timeout),
+                                                  ("--timings", args.timings),
+                                                  ("--timings-prometheus", args.timings_prometheus)) if value]
+        if ignored:
+            parser.error("--watch can't be combined with " + ", ".join(ignored))
+        from xmltools import watch
+        locations = args.locations or [os.getcwd()]
+        incremental = watch.Incremental(PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(args.payara_dir)),
+                                        PayaraConfig(args.payara_dir).parse, JarInstaller(),
+                                        preserve=args.preserve_formatting, fsync=args.fsync)
+        watch.run(incremental,
+                  lambda: [sub_location
+                           for location in locations
+                           for sub_location in PayaraConfig.expand_location(location)],
+                  sorted({os.path.abspath(location if os.path.isdir(location) else os.path.dirname(location))
+                          for location in locations}),
+                  args.watch_interval)
+        return 0
+
+    bundle = None
+    if applying_bundle:
+        if len(args.locations) != 1:
+            parser.error("apply-bundle takes one bundle file")
+        from xmltools.bundle import Bundle
+        bundle = Bundle.load(args.locations[0])
+        missing = bundle.missing()
+        if missing:
+            print("Variables must be set:", ", ".join(missing), file=sys.stderr)
+            return 1
+        files = []
+    else:
+        files = [sub_location
+                 for location in args.locations or [os.getcwd()]
+                 for sub_location in PayaraConfig.expand_location(location)]
+    jobs = args.jobs
+    if jobs == 0:
+        jobs = (os.cpu_count() or 1) if len(files) >= 16 else 1
+    if args.check or args.preflight:
+        with timing.stage("check"):
+            valid = PayaraConfig(args.payara_dir).preflight(files, max(jobs, os.cpu_count() or 1))
+        if not valid:
+            return 1
+        if args.check:
+            print("Checked %d file(s)" % len(files))
+            return 0
+    scripts = []
+    if args.task or any(src.endswith(".sh") for src in files):
+        from xmltools import scheduler
+        scripts = [src for src in files if scheduler.independent(src)]
+        files = [src for src in files if src not in scripts]
+
+    def setup() -> int:
+        host = JarInstaller()
+        cache = None
+        pristine = None
+        if bundle is None and not args.no_cache and ResultCache.cacheable(files):
+            cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+            domain_dir = PayaraConfig.domain_dir(args.payara_dir)
+            domain_xml = PayaraConfig.domain_xml_of(domain_dir)
+            try:
+                pristine = ResultCache.pristine(domain_xml)
+            except OSError as e:
+                print("Cannot keep the pristine domain.xml:", e, file=sys.stderr)
+                cache = None
+        if cache is not None:
+            key = cache.key(domain_dir, pristine, files, {'preserve': args.preserve_formatting or args.lazy,
+                                                          'backend': backend.default().name})
+            try:
+                with timing.stage("restore"):
+                    restored = cache.restore(key, domain_xml, host)
+                    if restored:
+                        host.wait()
+                if restored:
+                    print("Restored from cache:", key)
+                    timing.count("cache_hits")
+                    return 0
+            except OSError as e:
+                print("Cannot restore from cache:", e, file=sys.stderr)
+            host = cache.recorder(host)
+
+        cfg = PayaraConfig(args.payara_dir, planning=args.plan, host=host, preserve=args.preserve_formatting,
+                           lazy=args.lazy, keep_going=args.keep_going, pristine=pristine)
+        if bundle is None:
+            cfg.process_all(files, jobs)
+        else:
+            for (src, plan) in bundle.plans():
+                cfg.process(src, plan)
+        cfg.done(fsync=args.fsync, skip_unchanged=args.skip_unchanged)
+        if cfg.failed:
+            print("Skipped %d file(s): %s" % (len(cfg.failed), ", ".join(os.path.basename(src)
+                                                                         for (src, _) in cfg.failed)),
+                  file=sys.stderr)
+            return 1
+        if cache is not None:
+            try:
+                cache.store(key, domain_xml, host)
+            except OSError as e:
+                print("Cannot update cache:", e, file=sys.stderr)
+        return 0
+
+    if not args.task and not scripts:
+        code = setup()
+        write_timings()
+        return code
+
+    # The domain.xml changes are one task, independent scripts and --task commands run beside it
+    timeouts = {}
+    for timeout in args.task_timeout:
+        (name, _, seconds) = timeout.rpartition("=")
+        try:
+            timeouts[name or None] = float(seconds)
+        except ValueError:
+            parser.error("invalid --task-timeout: " + timeout)
+    import shlex
+    tasks = scheduler.Scheduler()
+    tasks.add("domain.xml", setup)
+    try:
+        for src in scripts:
+            os.chmod(src, os.stat(src).st_mode | stat.S_IEXEC)
+            name = os.path.basename(src)
+            # Through the shell, as Host.run does, so a script without #! is run by the shell
+            tasks.add(name, shlex.quote(src), timeout=timeouts.get(name, timeouts.get(None)))
+        for spec in args.task:
+            (name, after, command) = scheduler.parse_task(spec)
+            tasks.add(name, command, after, timeouts.get(name, timeouts.get(None)))
+        unknown = sorted(name for name in timeouts if name is not None and name not in tasks.tasks)
+        if unknown:
+            raise ValueError("--task-timeout for unknown task(s): " + ", ".join(unknown))
+        results = tasks.run()
+    except ValueError as e:
+        parser.error(str(e))
+    write_timings()
+    code = 0
+    for (name, result) in results.items():
+        if result.status != 'ok':
+            print("Task %s: %s%s" % (name, result.status, "" if result.error is None else " (%s)" % result.error),
+                  file=sys.stderr)
+            code = 1
+    if results["domain.xml"].error is not None:
+        raise results["domain.xml"].error
+    return results["domain.xml"].code or code
+
+
+def _batch(argv: list) -> int:
+    """
+    Command line of payara5-setup batch
+
+    :param argv: arguments after 'batch'
+    :return: exit code
+    """
+    from xmltools import batch
+    from xmltools.bundle import Bundle
+    parser = argparse.ArgumentParser(usage="%(prog)s batch [options] payara-5-dir-or-domain.xml VARIANTS "
+                                           "[ config-file-or-dir* ]",
+                                     description="Render a domain.xml for each set of environment variables in "
+                                                 "VARIANTS (json lines, - for stdin), parsing the config files and "
+                                                 "domain.xml once")
+    parser.add_argument("base", metavar="payara-5-dir-or-domain.xml")
+    parser.add_argument("variants", metavar="VARIANTS")
+    parser.add_argument("locations", metavar="config-file-or-dir", nargs="*")
+    parser.add_argument("-o", "--output", default="domain-{n}.xml",
+                        help="where to write each variant, formatted with its variables and n, the line number "
+                             "(default: %(default)s)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of variants rendered in parallel (default: %(default)s)")
+    parser.add_argument("--preserve-formatting", action="store_true",
+                        help="copy the parts of domain.xml that are not modified verbatim, instead of reformatting")
+    parser.add_argument("--lazy", action="store_true",
+                        help="parse the sections of domain.xml when they are used, copy the rest verbatim "
+                             "(implies --preserve-formatting)")
+    args = parser.parse_args(argv)
+    if os.path.isfile(args.base):
+        (payara_dir, location) = (os.path.dirname(os.path.abspath(args.base)), args.base)
+    else:
+        (payara_dir, location) = (args.base, PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(args.base)))
+    try:
+        if args.variants == "-":
+            variants = batch.variants(sys.stdin)
+        else:
+            with open(args.variants, "r") as io:
+                variants = batch.variants(io)
+        outputs = [(args.output.format_map(dict(variables, n=n)), variables) for (n, variables) in variants]
+    except (ValueError, KeyError, IndexError) as e:
+        parser.error("%s: %s" % (args.variants, e))
+    if len({output for (output, _) in outputs}) != len(outputs):
+        parser.error("--output %s doesn't give each variant its own file" % args.output)
+    files = [sub_location
+             for location in args.locations or [os.getcwd()]
+             for sub_location in PayaraConfig.expand_location(location)]
+    started = time.perf_counter()
+    bundle = Bundle.compile(files, PayaraConfig(payara_dir).parse)
+    renderer = batch.Batch(location, bundle, preserve=args.preserve_formatting, lazy=args.lazy)
+    failed = renderer.run(outputs, args.jobs)
+    for (output, error) in failed.items():
+        print("Not rendered: %s (%s)" % (output, error), file=sys.stderr)
+    print("Rendered %d of %d variants in %.3fs" % (len(outputs) - len(failed), len(outputs),
+                                                   time.perf_counter() - started))
+    return 1 if failed else 0
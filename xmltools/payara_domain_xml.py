@@ -1,52 +1,98 @@
-import fnmatch
-from typing import Callable
+from typing import Callable, Iterable
 from xml.etree.ElementTree import Element
 
+from xmltools.files import AtomicFile
+from xmltools.jvm_options import JvmOptionChanges, JvmOptionsReport
 from xmltools.manipulation import XmlManipulator
+from xmltools.templates import Fragment
 
+# The content of an <application>, below its attributes
+_APP = Fragment('<property name="cdiDevModeEnabled" value="false"/>'
+                '<property name="implicitCdiEnabled" value="true"/>'
+                '<property name="preserveAppScopedResources" value="false"/>'
+                '<module name="{name}">'
+                '<engine sniffer="cdi"/><engine sniffer="ejb"/><engine sniffer="security"/>'
+                '<engine sniffer="web"/><engine sniffer="jpa"/><engine sniffer="webservices"/>'
+                '</module>')
+_OSGI = Fragment('<property name="archiveType" value="osgi"/>'
+                 '<property name="isComposite" value="true"/>'
+                 '<module name="{name}"><engine sniffer="osgi"/></module>')
 
-def xpath_of(tag: str, attr: dict = dict()) -> str:
-    if attr:
-        return tag + "".join(["[@" + x[0] + "=\"" + x[1] + "\"]" for x in attr.items()])
-    return tag
+
+def _properties(props: dict) -> Iterable[dict]:
+    return ({"name": key, "value": value} for (key, value) in props.items())
 
 
 class DomainXml(object):
     """"""
 
-    def __init__(self, location: str):
+    def __init__(self, location: str, preserve: bool = False, content: bytes = None, lazy: bool = False):
         """
         Load a 'domain.xml' from the given location
 
         :param location: path od domain.xml file
+        :param preserve: when saving, keep the original bytes (formatting, comments)
+                         of elements that haven't been modified
+        :param content: the content of the file, if it has already been read
+        :param lazy: parse top level sections (resources, configs ...) when they are first used,
+                     implies preserve
         """
         self._location = location
-        with open(location, "r") as io:
-            content = io.read()
-            self._xml = XmlManipulator(content)
+        if content is None:
+            with open(location, "rb") as io:
+                content = io.read()
+        self._xml = XmlManipulator(content, preserve=preserve, lazy=lazy)
 
-    def save(self, location: str = None):
+    def save(self, location: str = None, fsync: bool = False, skip_unchanged: bool = False) -> bool:
         """
         Save the domain.xml to the location from where it was read, or from a newly
         specified location
 
+        The content is streamed to a temporary file in the same directory, which
+        is renamed into place, so a crash never leaves a truncated domain.xml
+
         :param location:
-        :return: None
+        :param fsync: flush to disk before returning
+        :param skip_unchanged: don't write if the file already has this content
+        :return: if the file was written
         """
         if location is None:
             location = self._location
-        with open(location, "w") as io:
-            content = self._xml.to_xml()
-            io.write(content)
+        out = AtomicFile(location, fsync=fsync, skip_unchanged=skip_unchanged)
+        with out as io:
+            self._xml.write(io)
+        return out.written
+
+    def checkpoint(self) -> None:
+        """
+        Start a transaction, the changes from now on can be undone by rollback()
+
+        :return: None
+        :raises ValueError: if there already is a checkpoint
+        """
+        self._xml.checkpoint()
+
+    def commit(self) -> None:
+        """
+        End the transaction, keeping the changes
+
+        :return: None
+        """
+        self._xml.commit()
+
+    def rollback(self) -> None:
+        """
+        End the transaction, undoing the changes (in time proportional to them)
+
+        :return: None
+        :raises ValueError: if there is no checkpoint
+        """
+        self._xml.rollback()
 
     def _ensure(self, xpath: str, tag: str, attrs: dict = None) -> Element:
         if attrs is None:
             attrs = dict()
-        root = self._xml.root(xpath)
-        xp = xpath_of(tag, attrs)
-        if root.has(xp):
-            return root.append_at(xp)
-        return root.append_at(".").element(tag, attrs)
+        return self._xml.root(xpath).ensure(tag, attrs)
 
     def app(self, name: str, path: str, context_root: str = "/"):
         """
@@ -64,17 +110,7 @@ class DomainXml(object):
             .attr("location", "file://" + path) \
             .attr("context-root", context_root) \
             .attr("object-type", "user") \
-            .element("property", {"name": "cdiDevModeEnabled", "value": "false"}).done() \
-            .element("property", {"name": "implicitCdiEnabled", "value": "true"}).done() \
-            .element("property", {"name": "preserveAppScopedResources", "value": "false"}).done() \
-            .element("module", {"name": name}) \
-            .element("engine", {"sniffer": "cdi"}).done() \
-            .element("engine", {"sniffer": "ejb"}).done() \
-            .element("engine", {"sniffer": "security"}).done() \
-            .element("engine", {"sniffer": "web"}).done() \
-            .element("engine", {"sniffer": "jpa"}).done() \
-            .element("engine", {"sniffer": "webservices"}).done() \
-            .done()
+            .fragment(_APP, name=name)
         self._ensure('servers/server[@name="server"]', "application-ref", {"ref": name, "virtual-servers": "server"})
         self._ensure('configs/config[@name="server-config"]', "cdi-service")
 
@@ -92,43 +128,112 @@ class DomainXml(object):
             .attr("name", name) \
             .attr("location", "file://" + path) \
             .attr("object-type", "user") \
-            .element("property", {"name": "archiveType", "value": "osgi"}).done() \
-            .element("property", {"name": "isComposite", "value": "true"}).done() \
-            .element("module", {"name": name}) \
-            .element("engine", {"sniffer": "osgi"}).done() \
-            .done()
+            .fragment(_OSGI, name=name)
         self._ensure('servers/server[@name="server"]', "application-ref", {"ref": name, "virtual-servers": "server"})
 
-    def custom_resource_primitive(self, type: str, name: str, value: str) -> None:
+    def custom_resource_primitive(self, type: str, name: str, value: str, ref: bool = True) -> None:
         """
         Create a custom resource of a primitive
 
         :param type: type 'java.lang.*'
         :param name: jndi name
         :param value: content
+        :param ref: also ensure the server references it
+        :return: None
+        """
+        self._custom_resource_primitive(self._xml.root('resources'), type, name, value)
+        if ref:
+            self.resource_ref(name)
+
+    def custom_resources_primitive(self, resources: Iterable, ref: bool = True) -> None:
+        """
+        Create custom resources of primitives, in one pass
+
+        :param resources: (type, jndi-name, value) tuples
+        :param ref: also ensure the server references them
         :return: None
         """
-        p = self._ensure('resources', "custom-resource", {"jndi-name": name}) \
+        root = self._xml.root('resources')
+        names = []
+        for (type, name, value) in resources:
+            self._custom_resource_primitive(root, type, name, value)
+            names.append(name)
+        if ref:
+            self.resource_refs(names)
+
+    @staticmethod
+    def _custom_resource_primitive(resources: XmlManipulator, type: str, name: str, value: str) -> None:
+        resources.ensure("custom-resource", {"jndi-name": name}) \
             .attr("factory-class", "org.glassfish.resources.custom.factory.PrimitivesAndStringFactory") \
             .attr("res-type", type) \
             .element("property", {"name": "value", "value": value})
-        self._ensure('servers/server[@name="server"]', "resource-ref", {"ref": name})
 
-    def custom_resource_props(self, name: str, props: dict) -> None:
+    def custom_resource_props(self, name: str, props: dict, ref: bool = True) -> None:
         """
         Create a custom resource of java.lang.Properties type
 
         :param name: jndi-name
         :param props: key/value pairs
+        :param ref: also ensure the server references it
+        :return: None
+        """
+        self._custom_resource_props(self._xml.root('resources'), name, props)
+        if ref:
+            self.resource_ref(name)
+
+    def custom_resources_props(self, resources: Iterable, ref: bool = True) -> None:
+        """
+        Create custom resources of java.lang.Properties type, in one pass
+
+        :param resources: (jndi-name, props) tuples
+        :param ref: also ensure the server references them
         :return: None
         """
-        p = self._ensure('resources', "custom-resource", {"jndi-name": name}) \
+        root = self._xml.root('resources')
+        names = []
+        for (name, props) in resources:
+            self._custom_resource_props(root, name, props)
+            names.append(name)
+        if ref:
+            self.resource_refs(names)
+
+    @staticmethod
+    def _custom_resource_props(resources: XmlManipulator, name: str, props: dict) -> None:
+        p = resources.ensure("custom-resource", {"jndi-name": name}) \
             .attr("factory-class", "org.glassfish.resources.custom.factory.PropertiesFactory") \
             .attr("res-type", "java.util.Properties")
-        for kv in props.items():
-            p.element("property", {"name": kv[0], "value": kv[1]})
+        p.elements("property", _properties(props))
+
+    def resource_ref(self, name: str) -> None:
+        """
+        Ensure a resource is referenced by the server
+
+        :param name: jndi-name
+        :return: None
+        """
         self._ensure('servers/server[@name="server"]', "resource-ref", {"ref": name})
 
+    def resource_refs(self, names: Iterable) -> None:
+        """
+        Ensure resources are referenced by the server
+
+        The existing references are collected once, only the missing ones are
+        appended
+
+        :param names: jndi-names
+        :return: None
+        """
+        server = self._xml.root('servers/server[@name="server"]')
+        existing = server.values("resource-ref", "ref")
+        point = None
+        for name in names:
+            if name in existing:
+                continue
+            existing.add(name)
+            if point is None:
+                point = server.append_at(".")
+            point.element("resource-ref", {"ref": name})
+
     def props_at(self, xpath: str, props: dict) -> None:
         """
         Add key/value props <property name="key" value="value"/> at a given xpath
@@ -139,8 +244,7 @@ class DomainXml(object):
         """
         points = [point for point in self._xml.append_at_all(xpath)]
         for point in points:
-            for kv in props.items():
-                point.element("property", {"name": kv[0], "value": kv[1]})
+            point.elements("property", _properties(props))
 
     def attrs_at(self, xpath: str, attrs: dict) -> None:
         """
@@ -163,8 +267,8 @@ class DomainXml(object):
         :return: None
         """
 
-        tag = attrs['.']
-        del attrs['.']
+        attrs = dict(attrs)
+        tag = attrs.pop('.')
         self._ensure(xpath, tag, attrs)
 
     def system_property(self, key: str, value: str,) -> None:
@@ -172,25 +276,46 @@ class DomainXml(object):
             .attr("value", value)
 
 
-    def jdbc_resource(self, name: str, attribs: dict, props: dict) -> None:
+    def jdbc_resource(self, name: str, attribs: dict, props: dict, ref: bool = True) -> None:
         """
         Creata a jdbc pool and resource at a given jndi-path
 
         :param name: base-jndi-name
         :param attribs: pool attributes
         :param props: pool resources
+        :param ref: also ensure the server references it
+        :return: None
+        """
+        self._jdbc_resource(self._xml.root('resources'), name, attribs, props)
+        if ref:
+            self.resource_ref(name)
+
+    def jdbc_resources(self, resources: Iterable, ref: bool = True) -> None:
+        """
+        Create jdbc pools and resources, in one pass
+
+        :param resources: (base-jndi-name, attribs, props) tuples
+        :param ref: also ensure the server references them
         :return: None
         """
-        p = self._ensure('resources', 'jdbc-connection-pool', {'name': name + "/pool"})
+        root = self._xml.root('resources')
+        names = []
+        for (name, attribs, props) in resources:
+            self._jdbc_resource(root, name, attribs, props)
+            names.append(name)
+        if ref:
+            self.resource_refs(names)
+
+    @staticmethod
+    def _jdbc_resource(resources: XmlManipulator, name: str, attribs: dict, props: dict) -> None:
+        p = resources.ensure('jdbc-connection-pool', {'name': name + "/pool"})
         p.clear()
         p.attr('name', name + "/pool")
         for pair in attribs.items():
             p.attr(pair[0], pair[1])
-        for pair in props.items():
-            p.element('property', {'name': pair[0], 'value': pair[1]})
-        self._ensure('resources', "jdbc-resource", {"jndi-name": name}) \
+        p.elements('property', _properties(props))
+        resources.ensure("jdbc-resource", {"jndi-name": name}) \
             .attr('pool-name', name + "/pool")
-        self._ensure('servers/server[@name="server"]', "resource-ref", {"ref": name})
 
     def jms_remote(self, addr: str) -> None:
         """
@@ -211,13 +336,14 @@ class DomainXml(object):
         else:
             a.attr("host", addr)
 
-    def jms_factory_resource(self, name: str, attribs: dict, props: dict) -> None:
+    def jms_factory_resource(self, name: str, attribs: dict, props: dict, ref: bool = True) -> None:
         """
         Create a jms factory
 
         :param name: jndi-name of factory
         :param attribs: factory attributes
         :param props: factory attributes
+        :param ref: also ensure the server references it
         :return: None
         """
         pool_name = name + "-Connection-Pool"
@@ -226,51 +352,88 @@ class DomainXml(object):
         p.attr('name', pool_name)
         for pair in attribs.items():
             p.attr(pair[0], pair[1])
-        for pair in props.items():
-            p.element('property', {'name': pair[0], 'value': pair[1]})
+        p.elements('property', _properties(props))
         p = self._ensure('resources', 'connector-resource', {"jndi-name": name})
         p.clear()
         p.attr("jndi-name", name)
         p.attr("pool-name", pool_name)
-        self._ensure('servers/server[@name="server"]', "resource-ref", {"ref": name})
+        if ref:
+            self.resource_ref(name)
 
-    def jms_destination_resource(self, name: str, attribs: dict, props: dict) -> None:
+    def jms_destination_resource(self, name: str, attribs: dict, props: dict, ref: bool = True) -> None:
         """
         Create a Topic/Queue
 
         :param name: jndi-name
         :param attribs: destination attributes
         :param props: destination properties
+        :param ref: also ensure the server references it
         :return:
         """
-        p = self._ensure('resources', "admin-object-resource", {'jndi-name': name})
+        self._jms_destination_resource(self._xml.root('resources'), name, attribs, props)
+        if ref:
+            self.resource_ref(name)
+
+    def jms_destination_resources(self, resources: Iterable, ref: bool = True) -> None:
+        """
+        Create Topics/Queues, in one pass
+
+        :param resources: (jndi-name, attribs, props) tuples
+        :param ref: also ensure the server references them
+        :return: None
+        """
+        root = self._xml.root('resources')
+        names = []
+        for (name, attribs, props) in resources:
+            self._jms_destination_resource(root, name, attribs, props)
+            names.append(name)
+        if ref:
+            self.resource_refs(names)
+
+    @staticmethod
+    def _jms_destination_resource(resources: XmlManipulator, name: str, attribs: dict, props: dict) -> None:
+        p = resources.ensure("admin-object-resource", {'jndi-name': name})
         p.clear()
         p.attr('jndi-name', name)
         for pair in attribs.items():
             p.attr(pair[0], pair[1])
-        for pair in props.items():
-            p.element('property', {'name': pair[0], 'value': pair[1]})
-        self._ensure('servers/server[@name="server"]', "resource-ref", {"ref": name})
+        p.elements('property', _properties(props))
+
+    def jvm_options(self, clear: bool, adds: Iterable[str], removes: Iterable[str]) -> JvmOptionsReport:
+        """
+        Change the jvm options of the server config
 
-    def jvm_options(self, clear: bool, adds: set, removes: set) -> None:
+        Options matching removes are removed, then an added option replaces the
+        existing option with the same key (-Xmx, -Dname, -XX:Name ...) in place,
+        or is appended. Overrides and conflicting adds are reported.
 
+        :param clear: remove every option first
+        :param adds: options, in order
+        :param removes: shell patterns of options to remove
+        :return: report of overrides and conflicts
+        """
+        changes = JvmOptionChanges(adds, () if clear else removes)
         if clear:
             self._xml.remove('configs/config[@name="server-config"]/java-config/jvm-options')
         else:
-            if removes:
-                self._xml.iterate('configs/config[@name="server-config"]/java-config',
-                                  self._jvm_filter(removes))
+            self._xml.iterate('configs/config[@name="server-config"]/java-config', self._jvm_filter(changes))
         p = self._xml.append_at('configs/config[@name="server-config"]/java-config')
-        for add in adds:
+        for add in changes.remaining():
             p.element("jvm-options").text(add)
+        return changes.report
 
     @staticmethod
-    def _jvm_filter(removes: set) -> Callable[[Element, Element], bool]:
+    def _jvm_filter(changes: JvmOptionChanges) -> Callable[[Element, Element], bool]:
         def func(node, parent):
-            for remove in removes:
-                if fnmatch.fnmatchcase(node.text, remove):
-                    parent.remove(node)
-                    return True
+            if node.tag != "jvm-options" or node.text is None:
+                return False
+            option = changes.update(node.text)
+            if option is None:
+                parent.remove(node)
+                return True
+            if option != node.text:
+                node.text = option
+                return True
             return False
 
         return func
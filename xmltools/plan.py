@@ -0,0 +1,567 @@
+import os
+import re
+import stat
+from collections import namedtuple
+from shutil import copy2 as copy
+
+from xmltools.jvm_options import matcher, option_key
+
+# Starts a variable in a compiled bundle, substituted when the bundle is applied (see xmltools.bundle)
+UNEXPANDED = '\ue000'
+# Joins the directory of a config file and a location that is only known when a bundle is applied
+JOIN = '\ue002'
+# Prop of a jdbc resource holding (credential names, connection string, names set explicitly), for
+# a connection string that can only be split when a bundle is applied
+CONNECTION = '\ue002connection'
+
+
+def credentials(names: list, connection: str) -> dict:
+    """
+    Split a connection string: [user[:password]@]host[:port]/database
+
+    :param names: prop names of user, password, host, port and database
+    :param connection: the string
+    :return: prop name to value, of the parts that are present
+    :raises Exception: if the string doesn't match
+    """
+    m = re.match('(?:([^:@]*)(?::([^@]*))?@)?([^:/]+)(?::(\\d+))?(?:/(.*))', connection)
+    if m is None:
+        raise Exception("Invalid credentials")
+    return {names[i]: m.group(i + 1) for i in range(0, len(names)) if m.group(i + 1) is not None}
+
+
+class Operation(tuple):
+    """
+    Base of the typed operations recorded in a Plan
+
+    target is where the operation is applied ('domain' for DomainXml, 'xml' for
+    the raw XmlManipulator, 'host' for side effects outside domain.xml) and
+    method is the name of the method called with the operation's fields.
+    """
+    target = None
+    method = None
+    # Operations with arbitrary xpaths; nothing is coalesced across them
+    barrier = False
+    # DomainXml method taking a list of these (without the trailing ref field)
+    batch = None
+
+    @property
+    def key(self):
+        """Identity of upserts, where the last writer wins (None if not an upsert)"""
+        return None
+
+    def resolved(self) -> 'Operation':
+        """
+        The operation, once the variables of a compiled bundle have been substituted
+
+        :return: operation to apply
+        """
+        return self
+
+    def apply(self, domain_xml, host):
+        if self.target == 'domain':
+            return getattr(domain_xml, self.method)(*self)
+        elif self.target == 'xml':
+            return getattr(domain_xml.xml, self.method)(*self)
+        else:
+            return getattr(host, self.method)(*self)
+
+
+def _operation(name: str, fields: str, target: str, method: str, key: tuple = None, barrier: bool = False,
+               batch: str = None):
+    cls = type(name, (Operation, namedtuple(name, fields)), {
+        '__slots__': (),
+        'target': target,
+        'method': method,
+        'barrier': barrier,
+        'batch': batch
+    })
+    if key is not None:
+        (kind, field) = key
+        cls.key = property(lambda self: (kind, getattr(self, field)))
+    return cls
+
+
+class App(_operation('App', 'name path context_root', 'domain', 'app', key=('application', 'name'))):
+    __slots__ = ()
+
+    def resolved(self) -> 'App':
+        """
+        Join a location given by a variable, and check that the file exists
+
+        :return: operation to apply
+        :raises Exception: if the file doesn't exist
+        """
+        path = self.path
+        if JOIN in path:
+            path = os.path.join(*path.split(JOIN, 1))
+        if not os.path.isfile(path):
+            raise Exception("missing file: " + path)
+        return self._replace(path=path)
+
+
+class Osgi(_operation('Osgi', 'name path', 'domain', 'osgi', key=('application', 'name'))):
+    __slots__ = ()
+
+    def resolved(self) -> 'Osgi':
+        """
+        Join a location given by a variable, the bundle is named by the joined location
+
+        :return: operation to apply
+        """
+        if JOIN not in self.path:
+            return self
+        path = os.path.join(*self.path.split(JOIN, 1))
+        return self._replace(name=os.path.basename(path), path=path)
+
+
+CustomResourcePrimitive = _operation('CustomResourcePrimitive', 'type name value ref', 'domain',
+                                     'custom_resource_primitive', batch='custom_resources_primitive')
+CustomResourceProps = _operation('CustomResourceProps', 'name props ref', 'domain', 'custom_resource_props',
+                                 batch='custom_resources_props')
+SystemProperty = _operation('SystemProperty', 'name value', 'domain', 'system_property',
+                           key=('system-property', 'name'))
+
+
+class JdbcResource(_operation('JdbcResource', 'name attribs props ref', 'domain', 'jdbc_resource',
+                              key=('jdbc', 'name'), batch='jdbc_resources')):
+    __slots__ = ()
+
+    def resolved(self) -> 'JdbcResource':
+        """
+        Split a connection string given by a variable into props
+
+        Props set explicitly keep their value, and every prop keeps the position it
+        would have had if the string was split when the config file was parsed.
+
+        :return: operation to apply
+        :raises Exception: if the connection string is invalid
+        """
+        if CONNECTION not in self.props:
+            return self
+        props = {}
+        for (key, value) in self.props.items():
+            if key != CONNECTION:
+                props[key] = value
+                continue
+            (names, connection, explicit) = value
+            try:
+                split = credentials(names, connection)
+            except Exception as e:
+                raise Exception("%s of %s" % (e, self.name))
+            for (name, part) in split.items():
+                props[name] = self.props[name] if name in explicit else part
+        return self._replace(props=props)
+
+
+JmsRemote = _operation('JmsRemote', 'addr', 'domain', 'jms_remote')
+JmsFactoryResource = _operation('JmsFactoryResource', 'name attribs props ref', 'domain',
+                                'jms_factory_resource', key=('jms-factory', 'name'))
+JmsDestinationResource = _operation('JmsDestinationResource', 'name attribs props ref', 'domain',
+                                    'jms_destination_resource', key=('jms-destination', 'name'),
+                                    batch='jms_destination_resources')
+ResourceRef = _operation('ResourceRef', 'name', 'domain', 'resource_ref')
+PropsAt = _operation('PropsAt', 'xpath props', 'domain', 'props_at', barrier=True)
+AttrsAt = _operation('AttrsAt', 'xpath attrs', 'domain', 'attrs_at', barrier=True)
+EnsureAt = _operation('EnsureAt', 'xpath attrs', 'domain', 'ensure_at', barrier=True)
+Remove = _operation('Remove', 'xpath', 'xml', 'remove', barrier=True)
+Append = _operation('Append', 'xpath content', 'xml', 'append', barrier=True)
+RemoveAttr = _operation('RemoveAttr', 'xpath attr', 'xml', 'remove_attr', barrier=True)
+SetAttr = _operation('SetAttr', 'xpath attr value', 'xml', 'set_attr', barrier=True)
+
+
+class InstallJar(_operation('InstallJar', 'src lib', 'host', 'install')):
+    __slots__ = ()
+
+    def resolved(self) -> 'InstallJar':
+        """
+        Join a location given by a variable
+
+        :return: operation to apply
+        """
+        if JOIN not in self.src:
+            return self
+        return self._replace(src=os.path.join(*self.src.split(JOIN, 1)))
+
+
+RunScript = _operation('RunScript', 'src', 'host', 'run')
+Echo = _operation('Echo', 'text', 'host', 'echo')
+
+
+class JvmOptions(_operation('JvmOptions', 'clear adds removes', 'domain', 'jvm_options')):
+    __slots__ = ()
+
+    def mergeable(self, other: 'JvmOptions') -> bool:
+        """
+        Check if merged() has the same effect as applying self, then other
+
+        An added option replaces an existing option with the same key in place. When
+        a remove of other may match the existing option or the added one, but not
+        both, the outcome depends on options that aren't known before applying.
+
+        :param other: later jvm_options operation
+        :return: if they can be merged
+        """
+        if self.clear or other.clear:
+            return True
+        for key in {option_key(add) for add in self.adds}:
+            # -XX:+Name and -XX:-Name have the key -XX:Name
+            start = "-XX:" if key.startswith("-XX:") else key
+            for pattern in other.removes:
+                if pattern == "*" or pattern == key + "*" and start == key:
+                    # Matches both
+                    continue
+                literal = re.split(r'[*?\[]', pattern, 1)[0]
+                if literal.startswith(start) or start.startswith(literal):
+                    return False
+        return True
+
+    def merged(self, other: 'JvmOptions') -> 'JvmOptions':
+        """
+        Combine with an operation that follows this one (if mergeable())
+
+        An option of other replaces the one of self with the same key, where it is.
+
+        :param other: later jvm_options operation
+        :return: operation with the same effect as applying self, then other
+        """
+        if other.clear:
+            return other
+        removed = matcher(other.removes)
+        # Of adds with the same key, the last is set
+        effective = {option_key(add): add for add in self.adds}
+        later = {option_key(add): add for add in other.adds}
+        adds = tuple(later.get(option_key(add), add) for add in self.adds if not removed(effective[option_key(add)]))
+        replaced = {option_key(add) for add in adds}
+        adds += tuple(add for add in other.adds if option_key(add) not in replaced)
+        removes = self.removes + tuple(remove for remove in other.removes if remove not in self.removes)
+        return JvmOptions(self.clear, adds, () if self.clear else removes)
+
+
+# Operations by name, for plans stored outside the process
+OPERATIONS = {cls.__name__: cls for cls in (
+    App, Osgi, CustomResourcePrimitive, CustomResourceProps, SystemProperty, JdbcResource, JmsRemote,
+    JmsFactoryResource, JmsDestinationResource, ResourceRef, PropsAt, AttrsAt, EnsureAt, Remove, Append,
+    RemoveAttr, SetAttr, InstallJar, RunScript, Echo, JvmOptions)}
+
+
+class Host(object):
+    """
+    Side effects of a plan, that are outside of domain.xml
+    """
+
+    def install(self, src: str, lib: str) -> None:
+        """
+        Copy a jar into a lib directory
+
+        :param src: full path of jar
+        :param lib: destination directory
+        :return: None
+        """
+        os.makedirs(lib, exist_ok=True)
+        copy(src, lib)
+
+    def run(self, src: str) -> None:
+        """
+        Make a script executable and run it
+
+        :param src: full path of script
+        :return: None
+        """
+        st = os.stat(src)
+        os.chmod(src, st.st_mode | stat.S_IEXEC)
+        os.system(src)
+
+    def echo(self, text: str) -> None:
+        """
+        Copy text to stdout
+
+        :param text: content
+        :return: None
+        """
+        print(text, end='')
+
+    def wait(self) -> None:
+        """
+        Wait for side effects that are still in progress
+
+        :return: None
+        """
+        pass
+
+    def mark(self):
+        """
+        Where the side effects queued from now on start, see drop()
+
+        :return: an opaque position
+        """
+        return None
+
+    def drop(self, mark) -> None:
+        """
+        Forget the side effects queued since mark, that haven't taken effect yet
+        (everything takes effect at once here)
+
+        :param mark: from mark()
+        :return: None
+        """
+        pass
+
+
+class Plan(object):
+    """
+    Operations recorded from config files, applied to domain.xml in one ordered pass
+
+    The recording methods mirror DomainXml (and XmlManipulator for raw xpath
+    operations), so a config file handler can record into a plan without
+    knowing when, or if, the operations are applied.
+
+    Before applying the plan can be coalesced:
+     * upserts of the same resource (jdbc, jms, application, system-property)
+       keep the position of the first and the content of the last
+     * resource-refs are ensured once
+     * jvm option changes are combined into one add/remove set
+    Operations with arbitrary xpaths (.set/.xpath) are barriers, nothing is
+    coalesced across them. The result is identical to applying every operation
+    in order.
+
+    When applied, runs of resources of one kind (and resource-refs) are handed
+    to the bulk methods of DomainXml, so the anchors are looked up once per run.
+    Long runs are handed over in chunks of BATCH_SIZE. A StreamingPlan does the
+    same while it is recorded.
+    """
+
+    # Most operations passed to one bulk method of DomainXml
+    BATCH_SIZE = 1000
+
+    def __init__(self):
+        self._operations = []
+
+    def __iter__(self):
+        return iter(self._operations)
+
+    def __len__(self):
+        return len(self._operations)
+
+    def add(self, operation: Operation) -> None:
+        self._operations.append(operation)
+
+    def extend(self, operations) -> None:
+        self._operations.extend(operations)
+
+    def app(self, name: str, path: str, context_root: str = "/") -> None:
+        self.add(App(name, path, context_root))
+
+    def osgi(self, name: str, path: str) -> None:
+        self.add(Osgi(name, path))
+
+    def custom_resource_primitive(self, type: str, name: str, value: str) -> None:
+        self.add(CustomResourcePrimitive(type, name, value, False))
+        self.add(ResourceRef(name))
+
+    def custom_resources_primitive(self, resources) -> None:
+        for (type, name, value) in resources:
+            self.custom_resource_primitive(type, name, value)
+
+    def custom_resource_props(self, name: str, props: dict) -> None:
+        self.add(CustomResourceProps(name, dict(props), False))
+        self.add(ResourceRef(name))
+
+    def props_at(self, xpath: str, props: dict) -> None:
+        self.add(PropsAt(xpath, dict(props)))
+
+    def attrs_at(self, xpath: str, attrs: dict) -> None:
+        self.add(AttrsAt(xpath, dict(attrs)))
+
+    def ensure_at(self, xpath: str, attrs: dict) -> None:
+        self.add(EnsureAt(xpath, dict(attrs)))
+
+    def system_property(self, key: str, value: str) -> None:
+        self.add(SystemProperty(key, value))
+
+    def jdbc_resource(self, name: str, attribs: dict, props: dict) -> None:
+        self.add(JdbcResource(name, dict(attribs), dict(props), False))
+        self.add(ResourceRef(name))
+
+    def jms_remote(self, addr: str) -> None:
+        self.add(JmsRemote(addr))
+
+    def jms_factory_resource(self, name: str, attribs: dict, props: dict) -> None:
+        self.add(JmsFactoryResource(name, dict(attribs), dict(props), False))
+        self.add(ResourceRef(name))
+
+    def jms_destination_resource(self, name: str, attribs: dict, props: dict) -> None:
+        self.add(JmsDestinationResource(name, dict(attribs), dict(props), False))
+        self.add(ResourceRef(name))
+
+    def jvm_options(self, clear: bool, adds, removes) -> None:
+        self.add(JvmOptions(clear, tuple(adds), tuple(removes)))
+
+    def remove(self, xpath: str) -> None:
+        self.add(Remove(xpath))
+
+    def append(self, xpath: str, content: str) -> None:
+        self.add(Append(xpath, content))
+
+    def remove_attr(self, xpath: str, attr: str) -> None:
+        self.add(RemoveAttr(xpath, attr))
+
+    def set_attr(self, xpath: str, attr: str, value: str) -> None:
+        self.add(SetAttr(xpath, attr, value))
+
+    def install(self, src: str, lib: str) -> None:
+        self.add(InstallJar(src, lib))
+
+    def run(self, src: str) -> None:
+        self.add(RunScript(src))
+
+    def echo(self, text: str) -> None:
+        self.add(Echo(text))
+
+    def resolved(self) -> 'Plan':
+        """
+        The plan with every operation resolved (see Operation.resolved())
+
+        :return: new plan
+        :raises Exception: if an operation is invalid with the values of the variables
+        """
+        plan = Plan()
+        plan.extend(operation.resolved() for operation in self._operations)
+        return plan
+
+    def coalesced(self) -> list:
+        """
+        The operations with redundant work removed
+
+        :return: list of operations
+        """
+        result = []
+        upserts = {}
+        refs = set()
+        jvm = None
+        for operation in self._operations:
+            if operation.barrier:
+                upserts.clear()
+                refs.clear()
+                jvm = None
+            elif isinstance(operation, ResourceRef):
+                if operation.name in refs:
+                    continue
+                refs.add(operation.name)
+            elif isinstance(operation, JvmOptions):
+                if jvm is not None and result[jvm].mergeable(operation):
+                    result[jvm] = result[jvm].merged(operation)
+                    continue
+                jvm = len(result)
+            elif operation.key is not None:
+                at = upserts.get(operation.key)
+                if at is not None and type(result[at]) is type(operation):
+                    result[at] = operation
+                    continue
+                upserts[operation.key] = len(result)
+            result.append(operation)
+        return result
+
+    def apply(self, domain_xml, host: Host = None, coalesce: bool = False) -> list:
+        """
+        Apply the operations in order
+
+        :param domain_xml: DomainXml to modify
+        :param host: side effects outside domain.xml (default: Host())
+        :param coalesce: remove redundant operations first
+        :return: what operations reported, that should be shown (JvmOptionsReport with overrides or conflicts)
+        """
+        applier = _Applier(domain_xml, host, self.BATCH_SIZE)
+        for operation in self.coalesced() if coalesce else self._operations:
+            applier.add(operation)
+        return applier.done()
+
+
+class StreamingPlan(Plan):
+    """
+    A plan that is applied while it is recorded
+
+    Operations are handed to DomainXml as soon as a chunk of BATCH_SIZE is
+    complete, so only one chunk is held in memory, however large the config
+    file is. The result is identical to recording a Plan and applying it
+    without coalescing. The operations are not kept, so it can't be iterated,
+    coalesced or applied again.
+    """
+
+    def __init__(self, domain_xml, host: Host = None):
+        super().__init__()
+        self._applier = _Applier(domain_xml, host, self.BATCH_SIZE)
+        self._count = 0
+
+    def __iter__(self):
+        raise TypeError("The operations of a streaming plan are not kept")
+
+    def __len__(self):
+        return self._count
+
+    def add(self, operation: Operation) -> None:
+        self._applier.add(operation)
+        self._count += 1
+
+    def extend(self, operations) -> None:
+        for operation in operations:
+            self.add(operation)
+
+    def coalesced(self) -> list:
+        raise TypeError("A streaming plan can't be coalesced")
+
+    def apply(self, domain_xml, host: Host = None, coalesce: bool = False) -> list:
+        raise TypeError("A streaming plan is applied while it is recorded")
+
+    def done(self) -> list:
+        """
+        Apply what is left of the last chunk
+
+        :return: what operations reported, that should be shown (JvmOptionsReport with overrides or conflicts)
+        """
+        return self._applier.done()
+
+
+class _Applier(object):
+    """
+    Applies operations one at a time, holding back runs of resources (and
+    resource-refs) for the bulk methods of DomainXml, at most batch_size of each
+    """
+
+    def __init__(self, domain_xml, host: Host, batch_size: int):
+        self._domain_xml = domain_xml
+        self._host = Host() if host is None else host
+        self._batch_size = batch_size
+        self._run = []
+        self._refs = []
+        self._reports = []
+
+    def _flush(self) -> None:
+        run = self._run
+        if run:
+            getattr(self._domain_xml, run[0].batch)([operation[:-1] for operation in run], ref=run[0].ref)
+            run.clear()
+        if self._refs:
+            self._domain_xml.resource_refs([operation.name for operation in self._refs])
+            self._refs.clear()
+
+    def add(self, operation: Operation) -> None:
+        run = self._run
+        if isinstance(operation, ResourceRef):
+            if len(self._refs) >= self._batch_size:
+                self._flush()
+            self._refs.append(operation)
+        elif operation.batch is not None:
+            if run and (type(run[0]) is not type(operation) or run[0].ref != operation.ref or
+                        len(run) >= self._batch_size):
+                self._flush()
+            run.append(operation)
+        else:
+            self._flush()
+            report = operation.apply(self._domain_xml, self._host)
+            if isinstance(operation, JvmOptions) and report:
+                self._reports.append(report)
+
+    def done(self) -> list:
+        self._flush()
+        return self._reports
@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+
+from xmltools.bundle import expand
+
+
+class Value(object):
+    """
+    A field of a record, with where it came from
+
+    Has the content()/at() of a token, so it can be looked up like one.
+    """
+
+    def __init__(self, value: str, src: str, line: int, field: str):
+        self._value = value
+        self._at = "%s:%d (%s)" % (os.path.basename(src), line, field)
+
+    def content(self) -> str:
+        return self._value
+
+    def at(self) -> str:
+        return self._at
+
+
+class Record(object):
+    """
+    One resource read from a json-lines or csv file, with environment variables expanded
+    """
+
+    def __init__(self, src: str, line: int, fields: dict):
+        """
+        :param src: the file
+        :param line: line number of the record
+        :param fields: name to value
+        """
+        self.src = src
+        self.line = line
+        self.fields = fields
+
+    def error(self, message: str) -> SyntaxError:
+        return SyntaxError("%s at: %s:%d" % (message, os.path.basename(self.src), self.line))
+
+    def value(self, field: str, default: str = None) -> Value:
+        """
+        :param field: name
+        :param default: used if the field is missing or empty (None: it is required)
+        :return: the field
+        :raises SyntaxError: if a required field is missing
+        """
+        value = self.fields.get(field)
+        if value is None or value == "":
+            if default is None:
+                raise self.error("Missing %s" % field)
+            value = default
+        return Value(value, self.src, self.line, field)
+
+    def string(self, field: str, default: str = None) -> str:
+        return self.value(field, default).content()
+
+    def props(self, field: str) -> dict:
+        """
+        :param field: name of a field holding an object
+        :return: the object (empty if missing)
+        :raises SyntaxError: if it isn't an object
+        """
+        value = self.fields.get(field)
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            raise self.error("Expected an object of strings in %s" % field)
+        return value
+
+
+def _scalar(value, environ: dict):
+    # json values as they would be written in a config file
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return expand(value, environ)
+    return value
+
+
+def _expanded(record: Record, environ: dict) -> Record:
+    try:
+        fields = {}
+        for (key, value) in record.fields.items():
+            value = _scalar(value, environ)
+            if isinstance(value, dict):
+                value = {expand(k, environ): _scalar(v, environ) for (k, v) in value.items()}
+                if not all(isinstance(v, str) for v in value.values()):
+                    raise record.error("Expected an object of strings in %s" % key)
+            elif value is not None and not isinstance(value, str):
+                raise record.error("Unexpected value of %s" % key)
+            fields[key] = value
+    except KeyError as e:
+        raise record.error(e.args[0])
+    record.fields = fields
+    return record
+
+
+def jsonl(src: str, environ: dict = None):
+    """
+    Read a json-lines file, one object per line (blank lines and lines starting with # are skipped)
+
+    :param src: the file
+    :param environ: environment (default: os.environ)
+    :return: iterator of records
+    :raises SyntaxError: if a line isn't an object, or refers to an unset variable
+    """
+    with open(src, "r", encoding="UTF-8") as io:
+        for (n, line) in enumerate(io, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                fields = json.loads(line)
+            except ValueError as e:
+                raise SyntaxError("%s at: %s:%d" % (e, os.path.basename(src), n))
+            record = Record(src, n, fields)
+            if not isinstance(fields, dict):
+                raise record.error("Expected an object")
+            yield _expanded(record, environ)
+
+
+def csv_rows(src: str, environ: dict = None):
+    """
+    Read a csv file, the first row names the columns (empty cells are left out)
+
+    :param src: the file
+    :param environ: environment (default: os.environ)
+    :return: iterator of records
+    :raises SyntaxError: if a row has more cells than there are columns, or refers to an unset variable
+    """
+    with open(src, "r", encoding="UTF-8", newline="") as io:
+        reader = csv.reader(io)
+        header = None
+        for row in reader:
+            if header is None:
+                header = [column.strip() for column in row]
+                continue
+            record = Record(src, reader.line_num, {})
+            if len(row) > len(header):
+                raise record.error("More cells than columns")
+            record.fields = {column: cell for (column, cell) in zip(header, row) if cell != ""}
+            if record.fields:
+                yield _expanded(record, environ)
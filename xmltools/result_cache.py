@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from xmltools.files import AtomicFile
+from xmltools.plan import Host
+
+# Marker declaring a .sh script safe to skip when the result is cached
+CACHEABLE_MARKER = b"payara5-setup: cacheable"
+
+_ENV_REFERENCE = re.compile(r'\$\{([^}|]+)')
+_VERSION = "1"
+
+
+class RecordingHost(Host):
+    """
+    Forwards side effects to another host, while recording what a cache hit must replay
+    """
+
+    def __init__(self, host: Host):
+        self._host = host
+        self.installs = []
+        self.echoes = []
+
+    def install(self, src: str, lib: str) -> None:
+        self.installs.append((os.path.abspath(src), lib))
+        self._host.install(src, lib)
+
+    def run(self, src: str) -> None:
+        self._host.run(src)
+
+    def echo(self, text: str) -> None:
+        self.echoes.append(text)
+        self._host.echo(text)
+
+    def wait(self) -> None:
+        self._host.wait()
+
+    def mark(self) -> tuple:
+        return (len(self.installs), self._host.mark())
+
+    def drop(self, mark: tuple) -> None:
+        del self.installs[mark[0]:]
+        self._host.drop(mark[1])
+
+
+class ResultCache(object):
+    """
+    Content addressed cache of payara5-setup results
+
+    The key covers the pristine domain.xml (see pristine()), the name and content
+    of every config file and the values of the environment variables these refer to
+    (${VAR} or ${VAR|default}). An entry holds the resulting domain.xml, the jars
+    that were installed (validated by size and modification time on lookup) and
+    the output of .txt files.
+
+    Entries are evicted least recently used first, when the total size exceeds
+    max_size.
+    """
+
+    def __init__(self, directory: str, max_size: int = 64 * 1024 * 1024):
+        self._directory = directory
+        self._max_size = max_size
+
+    @staticmethod
+    def default_directory() -> str:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "payara5-setup")
+
+    @staticmethod
+    def cacheable(files: list) -> bool:
+        """
+        Check if a run can be cached, scripts has to be declared cacheable
+
+        :param files: config files
+        :return: if all files are cacheable
+        """
+        for src in files:
+            if src.endswith(".sh"):
+                with open(src, "rb") as io:
+                    if CACHEABLE_MARKER not in io.read():
+                        return False
+        return True
+
+    @staticmethod
+    def pristine(domain_xml: str) -> str:
+        """
+        A copy of domain.xml as it was before the first run (domain.xml.orig),
+        made the first time it is asked for
+
+        Every run rewrites domain.xml, so a container that is restarted (not
+        recreated) would otherwise look up, and process, the result of the
+        previous run.
+
+        :param domain_xml: path of domain.xml
+        :return: path of the copy
+        """
+        location = domain_xml + ".orig"
+        if not os.path.exists(location):
+            with open(domain_xml, "rb") as src, AtomicFile(location) as dest:
+                shutil.copyfileobj(src, dest)
+        return location
+
+    def key(self, instance_dir: str, domain_xml: str, files: list, options: dict = None) -> str:
+        """
+        Fingerprint the input of a run
+
+        :param instance_dir: payara domain directory
+        :param domain_xml: path of the pristine domain.xml
+        :param files: config files in processing order
+        :param options: command line options that change the result
+        :return: hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([_VERSION, os.path.abspath(instance_dir), options or {}],
+                                 sort_keys=True).encode("UTF-8"))
+        with open(domain_xml, "rb") as io:
+            digest.update(hashlib.sha256(io.read()).digest())
+        variables = set()
+        for src in files:
+            with open(src, "rb") as io:
+                content = io.read()
+            digest.update(json.dumps(os.path.abspath(src)).encode("UTF-8"))
+            digest.update(hashlib.sha256(content).digest())
+            variables.update(_ENV_REFERENCE.findall(content.decode("UTF-8", errors="replace")))
+        env = {name: os.environ.get(name) for name in sorted(variables)}
+        digest.update(json.dumps(env, sort_keys=True).encode("UTF-8"))
+        return digest.hexdigest()
+
+    def recorder(self, host: Host) -> RecordingHost:
+        return RecordingHost(host)
+
+    def restore(self, key: str, domain_xml: str, host: Host) -> bool:
+        """
+        Restore a cached result
+
+        :param key: fingerprint
+        :param domain_xml: where to write domain.xml
+        :param host: where to install jars and echo output
+        :return: if the result was in the cache
+        """
+        entry = os.path.join(self._directory, key)
+        try:
+            with open(os.path.join(entry, "entry.json"), "r") as io:
+                meta = json.load(io)
+        except (IOError, ValueError):
+            return False
+        for (src, size, mtime) in meta['dependencies']:
+            try:
+                st = os.stat(src)
+            except OSError:
+                return False
+            if st.st_size != size or st.st_mtime_ns != mtime:
+                return False
+        with open(os.path.join(entry, "domain.xml"), "rb") as src, AtomicFile(domain_xml) as dest:
+            shutil.copyfileobj(src, dest)
+        for (src, lib) in meta['installs']:
+            host.install(src, lib)
+        for text in meta['echoes']:
+            host.echo(text)
+        os.utime(os.path.join(entry, "entry.json"))
+        return True
+
+    def store(self, key: str, domain_xml: str, recorder: RecordingHost) -> None:
+        """
+        Store the result of a run
+
+        :param key: fingerprint
+        :param domain_xml: the resulting domain.xml
+        :param recorder: the host that recorded the side effects
+        :return: None
+        """
+        entry = os.path.join(self._directory, key)
+        os.makedirs(entry, exist_ok=True)
+        shutil.copyfile(domain_xml, os.path.join(entry, "domain.xml"))
+        dependencies = []
+        for (src, lib) in recorder.installs:
+            st = os.stat(src)
+            dependencies.append((src, st.st_size, st.st_mtime_ns))
+        meta = {
+            'dependencies': dependencies,
+            'installs': recorder.installs,
+            'echoes': recorder.echoes
+        }
+        with open(os.path.join(entry, "entry.json.tmp"), "w") as io:
+            json.dump(meta, io)
+        os.replace(os.path.join(entry, "entry.json.tmp"), os.path.join(entry, "entry.json"))
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries, until the cache is within its size
+
+        :return: None
+        """
+        entries = []
+        total = 0
+        for key in os.listdir(self._directory):
+            entry = os.path.join(self._directory, key)
+            if not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+            try:
+                used = os.path.getmtime(os.path.join(entry, "entry.json"))
+            except OSError:
+                used = 0
+            entries.append((used, size, entry))
+            total = total + size
+        entries.sort()
+        while total > self._max_size and entries:
+            (used, size, entry) = entries.pop(0)
+            shutil.rmtree(entry, ignore_errors=True)
+            total = total - size
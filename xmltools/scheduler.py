@@ -0,0 +1,222 @@
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Callable, Union
+
+from xmltools import timing
+
+# Scripts containing this line are run concurrently with the domain.xml changes
+INDEPENDENT_MARKER = b"payara5-setup: independent"
+
+# NAME[:DEPENDENCY,...]=COMMAND
+_TASK = re.compile(r'^([\w.-]+)(?::([\w.,-]*))?=(.+)$', re.S)
+
+# Outcome of a task: status is 'ok', 'failed', 'timeout' or 'skipped' (a dependency didn't succeed),
+# code is the exit code of a command (or return value of a function) and error what a function raised
+Result = namedtuple('Result', 'status code seconds error')
+
+
+def parse_task(spec: str) -> tuple:
+    """
+    Parse a task given on the command line
+
+    :param spec: NAME=COMMAND or NAME:DEPENDENCY,...=COMMAND
+    :return: (name, dependencies, command)
+    :raises ValueError: if the spec is malformed
+    """
+    m = _TASK.match(spec)
+    if m is None:
+        raise ValueError("Invalid task (expected NAME[:DEPENDENCY,...]=COMMAND): " + spec)
+    after = tuple(name for name in (m.group(2) or "").split(",") if name)
+    return m.group(1), after, m.group(3)
+
+
+def independent(src: str) -> bool:
+    """
+    Check if a script has declared that it can run concurrently with the domain.xml changes
+
+    :param src: config file
+    :return: if src is a script containing the independent marker
+    """
+    if not src.endswith(".sh"):
+        return False
+    with open(src, "rb") as io:
+        return INDEPENDENT_MARKER in io.read()
+
+
+class Task(object):
+    """
+    A unit of work in a Scheduler
+
+    The action is a function (called in a thread, its output isn't captured),
+    or a command (a string is run by the shell, a list is executed directly).
+    Command output is captured, and copied line by line prefixed with the
+    task name.
+    """
+
+    def __init__(self, name: str, action: Union[Callable[[], int], str, list], after: tuple = (),
+                 timeout: float = None):
+        """
+        :param name: name of task, used by dependencies and as output prefix
+        :param action: function or command
+        :param after: names of tasks that have to succeed first
+        :param timeout: seconds before a command is killed (None: no limit, ignored for functions)
+        """
+        self.name = name
+        self.action = action
+        self.after = tuple(after)
+        self.timeout = timeout
+
+
+class Scheduler(object):
+    """
+    Runs tasks concurrently, each as soon as the tasks it depends on have succeeded
+
+    The total time approaches that of the longest chain of dependent tasks. A
+    task, whose dependency failed or timed out, is skipped.
+    """
+
+    def __init__(self, out=None):
+        """
+        :param out: where command output is copied (default: sys.stdout)
+        """
+        self._out = out
+        self._lock = threading.Lock()
+        self.tasks = OrderedDict()
+
+    def add(self, name: str, action: Union[Callable[[], int], str, list], after: tuple = (),
+            timeout: float = None) -> Task:
+        """
+        Add a task
+
+        :param name: unique name of task
+        :param action: function or command
+        :param after: names of tasks that have to succeed first
+        :param timeout: seconds before a command is killed
+        :return: the task
+        :raises ValueError: if the name is in use
+        """
+        if name in self.tasks:
+            raise ValueError("Duplicate task: " + name)
+        task = Task(name, action, after, timeout)
+        self.tasks[name] = task
+        return task
+
+    def order(self) -> list:
+        """
+        The tasks in an order where dependencies come first
+
+        :return: list of names
+        :raises ValueError: if a dependency is unknown or the dependencies form a cycle
+        """
+        result = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError("Dependency cycle: " + " -> ".join(path + (name,)))
+            state[name] = 'visiting'
+            for dependency in self.tasks[name].after:
+                if dependency not in self.tasks:
+                    raise ValueError("Unknown dependency %s of task %s" % (dependency, name))
+                visit(dependency, path + (name,))
+            state[name] = 'done'
+            result.append(name)
+
+        for name in self.tasks:
+            visit(name, ())
+        return result
+
+    def run(self) -> dict:
+        """
+        Run every task, and wait for them
+
+        :return: task name to Result, in dependency order
+        :raises ValueError: if the dependencies are invalid (nothing is run)
+        """
+        order = self.order()
+        results = {}
+        finished = {name: threading.Event() for name in order}
+
+        def work(task):
+            try:
+                for dependency in task.after:
+                    finished[dependency].wait()
+                if any(results[dependency].status != 'ok' for dependency in task.after):
+                    results[task.name] = Result('skipped', None, 0.0, None)
+                else:
+                    results[task.name] = self._execute(task)
+            except Exception as e:
+                # ie. a command that can't be started
+                results[task.name] = Result('failed', None, 0.0, e)
+            finally:
+                finished[task.name].set()
+
+        threads = [threading.Thread(target=work, args=(self.tasks[name],), name=name) for name in order]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return OrderedDict((name, results[name]) for name in order)
+
+    def _execute(self, task: Task) -> Result:
+        wall = time.perf_counter()
+        if callable(task.action):
+            cpu = time.thread_time()
+            try:
+                code = task.action()
+            except Exception as e:
+                return Result('failed', None, time.perf_counter() - wall, e)
+            self._record(task, wall, time.thread_time() - cpu)
+            return Result('ok' if not code else 'failed', code, time.perf_counter() - wall, None)
+        (status, code, cpu) = self._command(task)
+        self._record(task, wall, cpu)
+        return Result(status, code, time.perf_counter() - wall, None)
+
+    def _command(self, task: Task) -> tuple:
+        # Runs in its own process group, so a timeout kills whatever the command started
+        process = subprocess.Popen(task.action, shell=isinstance(task.action, str), stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True)
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        timer = None
+        if task.timeout is not None:
+            timer = threading.Timer(task.timeout, kill)
+            timer.start()
+        try:
+            for line in process.stdout:
+                self._print(task.name, line.decode("UTF-8", errors="replace"))
+            (_, status, usage) = os.wait4(process.pid, 0)
+            process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            process.stdout.close()
+        if timed_out.is_set():
+            self._print(task.name, "timed out after %ss\n" % task.timeout)
+            return 'timeout', process.returncode, usage.ru_utime + usage.ru_stime
+        return 'ok' if process.returncode == 0 else 'failed', process.returncode, usage.ru_utime + usage.ru_stime
+
+    def _print(self, name: str, line: str) -> None:
+        out = self._out if self._out is not None else sys.stdout
+        with self._lock:
+            out.write("[%s] %s" % (name, line if line.endswith("\n") else line + "\n"))
+            out.flush()
+
+    @staticmethod
+    def _record(task: Task, wall: float, cpu: float) -> None:
+        timing.record("task", task.name, time.perf_counter() - wall, cpu)
@@ -0,0 +1,379 @@
+import re
+from xml.etree import ElementTree as ET
+from xml.etree.ElementTree import Element
+from xml.parsers import expat
+
+# A start tag, (expat has checked it is well formed)
+_START_TAG = re.compile(rb'<[^\s/>]+(?:\s+[^\s=]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*(/?)>')
+_ENCODING = re.compile(rb'^<\?xml[^>]*encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+# What can be between the elements of the root: comments, CDATA, processing instructions and tags
+_MARKUP = re.compile(rb'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>|<!DOCTYPE|</?([^\s/>!?]+)', re.S)
+_ATTRIB_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"}
+
+
+def escape(data: str, entities: dict = None) -> str:
+    """
+    Escape &, < and > (as xml.sax.saxutils.escape, which imports urllib, http and email)
+
+    :param data: text
+    :param entities: more characters to replace
+    :return: escaped text
+    """
+    data = data.replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;")
+    if entities:
+        for (char, entity) in entities.items():
+            data = data.replace(char, entity)
+    return data
+
+
+def quoteattr(data: str) -> str:
+    """
+    Escape and quote an attribute value (as xml.sax.saxutils.quoteattr)
+
+    :param data: attribute value
+    :return: quoted value
+    """
+    data = escape(data, {"\n": "&#10;", "\r": "&#13;", "\t": "&#9;"})
+    if '"' in data:
+        if "'" in data:
+            return '"%s"' % data.replace('"', "&quot;")
+        return "'%s'" % data
+    return '"%s"' % data
+
+
+class Unsupported(Exception):
+    """
+    The document can't be spliced, it has to be serialized in full
+    """
+    pass
+
+
+class SourceMap(object):
+    """
+    Where every element of a parsed document came from
+
+    For each element the byte offsets of its start tag, its content and its end
+    are kept. When the document is written, elements that haven't been modified
+    (and have no modified descendants) are copied verbatim from the source. So
+    formatting, comments and the xml declaration survive, and only the
+    modified parts of the document are serialized. Of a modified element the
+    start tag is serialized, what was between its children is copied where it
+    is unchanged, and new children are indented as their siblings.
+    """
+
+    def __init__(self, source: bytes, ranges: dict, encoding: str):
+        """
+        :param source: the document
+        :param ranges: element to (start, content start, end) offsets
+        :param encoding: encoding of the document
+        """
+        self._source = source
+        self._ranges = ranges
+        self._encoding = encoding
+        self.copied = 0
+        self.serialized = 0
+
+    @staticmethod
+    def parse(content: bytes) -> tuple:
+        """
+        Parse a document (into ElementTree elements) recording byte offsets
+
+        :param content: document
+        :return: (root element, SourceMap)
+        :raises Unsupported: if the document isn't in an ascii compatible encoding
+        """
+        encoding = SourceMap._encoding_of(content)
+        ranges = {}
+        root = SourceMap._build(content, 0, ranges)
+        return root, SourceMap(content, ranges, encoding)
+
+    @staticmethod
+    def parse_lazy(content: bytes) -> tuple:
+        """
+        Parse the root and the start tags of its children, the content of the
+        children is parsed by load(), when needed
+
+        The children are found by scanning for their end tags (skipping nested
+        elements of the same name, comments, CDATA and processing instructions),
+        which is a lot cheaper than parsing them.
+
+        :param content: document
+        :return: (root element, SourceMap, children that haven't been loaded)
+        :raises Unsupported: if the document isn't in an ascii compatible encoding,
+                             has a DOCTYPE or declares namespaces on the root
+        """
+        encoding = SourceMap._encoding_of(content)
+        pos = 0
+        while True:
+            m = _MARKUP.search(content, pos)
+            if m is None:
+                raise ET.ParseError("No root element")
+            if m.group(0).startswith(b"<!DOCTYPE"):
+                raise Unsupported("Cannot load a document with a DOCTYPE lazily")
+            if m.group(1) is not None:
+                break
+            pos = m.end()
+        root_start = m.start()
+        root_tag = _START_TAG.match(content, root_start)
+        if root_tag is None or root_tag.group(1) == b"/" or b"xmlns" in root_tag.group(0):
+            raise Unsupported("Cannot load the root element lazily")
+        skeleton = [content[:root_tag.end()]]
+        sections = []
+        pos = root_tag.end()
+        while True:
+            m = _MARKUP.search(content, pos)
+            if m is None:
+                raise ET.ParseError("Unclosed root element")
+            if m.group(1) is None:
+                pos = m.end()
+                continue
+            if m.group(0).startswith(b"</"):
+                root_end = content.index(b">", m.end()) + 1
+                skeleton.append(content[pos:])
+                break
+            skeleton.append(content[pos:m.start()])
+            tag = _START_TAG.match(content, m.start())
+            if tag is None:
+                raise ET.ParseError("Malformed start tag at byte %d" % m.start())
+            if tag.group(1) == b"/":
+                sections.append((m.start(), tag.end(), tag.end()))
+                skeleton.append(tag.group(0))
+            else:
+                end = SourceMap._end_of(content, m.group(1), tag.end())
+                sections.append((m.start(), tag.end(), end))
+                skeleton.append(content[m.start():tag.end() - 1] + b"/>")
+                pos = end
+                continue
+            pos = tag.end()
+        root = ET.fromstring(b"".join(skeleton))
+        children = list(root)
+        if len(children) != len(sections):
+            raise Unsupported("Cannot split the document into sections")
+        ranges = {root: (root_start, root_tag.end(), root_end)}
+        lazy = set()
+        for (child, section) in zip(children, sections):
+            ranges[child] = section
+            if section[1] != section[2]:
+                lazy.add(child)
+        return root, SourceMap(content, ranges, encoding), lazy
+
+    @staticmethod
+    def _end_of(content: bytes, name: bytes, pos: int) -> int:
+        # Offset after the end tag of an element whose content starts at pos
+        depth = 1
+        for m in re.compile(rb'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>|<(/?)' + re.escape(name) + rb'(?=[\s/>])',
+                            re.S).finditer(content, pos):
+            if m.group(1) is None:
+                continue
+            if m.group(1):
+                depth -= 1
+                if depth == 0:
+                    return content.index(b">", m.end()) + 1
+            elif _START_TAG.match(content, m.start()).group(1) != b"/":
+                depth += 1
+        raise ET.ParseError("Unclosed element %s" % name.decode("UTF-8", "replace"))
+
+    def load(self, node: Element) -> None:
+        """
+        Parse the content of a child returned by parse_lazy()
+
+        :param node: the child
+        :return: None
+        """
+        (start, _, end) = self._ranges[node]
+        declaration = ('<?xml version="1.0" encoding="%s"?>' % self._encoding).encode("ascii")
+        loaded = SourceMap._build(declaration + self._source[start:end], start - len(declaration), self._ranges)
+        del self._ranges[loaded]
+        node.text = loaded.text
+        node[:] = list(loaded)
+
+    @staticmethod
+    def _encoding_of(content: bytes) -> str:
+        m = _ENCODING.match(content)
+        encoding = m.group(1).decode("ascii") if m else "UTF-8"
+        if content.startswith((b'\xff\xfe', b'\xfe\xff')) or encoding.lower().startswith(("utf-16", "utf-32")):
+            raise Unsupported("Cannot splice a document encoded as " + encoding)
+        return encoding
+
+    @staticmethod
+    def _build(content: bytes, offset: int, ranges: dict) -> Element:
+        # Parse content, adding the offsets (+ offset) of every element to ranges
+        builder = ET.TreeBuilder()
+        parser = expat.ParserCreate(None, "}")
+        parser.buffer_text = True
+        parser.ordered_attributes = True
+        stack = []
+
+        def name(tag):
+            return "{" + tag if "}" in tag else tag
+
+        def start(tag, attrs):
+            node = builder.start(name(tag), {name(attrs[i]): attrs[i + 1] for i in range(0, len(attrs), 2)})
+            at = parser.CurrentByteIndex
+            m = _START_TAG.match(content, at)
+            stack.append((node, at, m.end(), m.group(1) == b"/"))
+
+        def end(tag):
+            builder.end(name(tag))
+            (node, at, content_start, empty) = stack.pop()
+            if empty:
+                ranges[node] = (at + offset, content_start + offset, content_start + offset)
+            else:
+                ranges[node] = (at + offset, content_start + offset,
+                                content.index(b">", parser.CurrentByteIndex) + 1 + offset)
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = builder.data
+        try:
+            parser.Parse(content, True)
+        except expat.ExpatError as e:
+            raise ET.ParseError(str(e))
+        return builder.close()
+
+    def write(self, root: Element, io, dirty: set, parent_of) -> None:
+        """
+        Write a (modified) document
+
+        :param root: root of the document
+        :param io: binary file object
+        :param dirty: elements whose attributes, text or list of children have changed
+        :param parent_of: function giving the parent of an element
+        :return: None
+        :raises Unsupported: if the modified part uses namespaces (nothing has been written)
+        """
+        opened = set()
+        for node in dirty:
+            while True:
+                node = parent_of(node)
+                if node is None or node in opened:
+                    break
+                opened.add(node)
+        chunks = []
+        (start, _, end) = self._ranges.get(root, (None, None, None))
+        if start is None:
+            raise Unsupported("The document root has been replaced")
+        chunks.append(self._source[:start])
+        self._write(root, chunks, dirty, opened)
+        chunks.append(self._source[end:])
+        copied = 0
+        serialized = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(self._encoding, "xmlcharrefreplace")
+                serialized += len(chunk)
+            else:
+                copied += len(chunk)
+            io.write(chunk)
+        self.copied += copied
+        self.serialized += serialized
+
+    def _write(self, node: Element, chunks: list, dirty: set, opened: set) -> None:
+        (start, content_start, end) = self._ranges.get(node, (None, None, None))
+        if start is not None and node not in dirty:
+            if node not in opened:
+                chunks.append(self._source[start:end])
+                return
+            # Only descendants have changed: copy start tag, end tag and what is between the children
+            at = start
+            for child in node:
+                (child_start, _, child_end) = self._ranges[child]
+                chunks.append(self._source[at:child_start])
+                self._write(child, chunks, dirty, opened)
+                at = child_end
+            chunks.append(self._source[at:end])
+            return
+        if not isinstance(node.tag, str):
+            raise Unsupported("Cannot serialize %s" % node.tag)
+        if "{" in node.tag or any("{" in key for key in node.attrib):
+            raise Unsupported("Cannot serialize namespaces: %s" % node.tag)
+        chunks.append("<" + node.tag + "".join(' %s="%s"' % (key, escape(value, _ATTRIB_ENTITIES))
+                                               for (key, value) in node.attrib.items()))
+        if node.text is None and len(node) == 0:
+            chunks.append(" />")
+            return
+        chunks.append(">")
+        if start is None or content_start == end:
+            if node.text:
+                chunks.append(escape(node.text))
+            for child in node:
+                self._write(child, chunks, dirty, opened)
+                if child.tail:
+                    chunks.append(escape(child.tail))
+        else:
+            self._write_content(node, content_start, self._source.rindex(b"</", content_start, end),
+                                chunks, dirty, opened)
+        chunks.append("</" + node.tag + ">")
+
+    def _write_content(self, node: Element, content_start: int, content_end: int, chunks: list, dirty: set,
+                       opened: set) -> None:
+        # The content of a modified element, that had content in the source. What was between the children
+        # (comments, formatting) is copied where they are still in the same order and the text is unchanged.
+        # Elsewhere, if the source was indented, new children are indented as the last child was
+        starts = {}
+        gaps = []
+        at = content_start
+        for (child_start, child_end) in self._children_in(content_start, content_end):
+            starts[child_start] = len(gaps)
+            gaps.append(self._source[at:child_start])
+            at = child_end
+        gaps.append(self._source[at:content_end])
+        count = len(gaps) - 1
+        separator = self._indent(gaps[-2]) if count > 0 else None
+        closing = self._indent(gaps[-1]) if count > 0 else None
+
+        def gap(text, i, after, last):
+            # text is the text before the i'th original child (or the end, if i is count)
+            if i is not None and after == i - 1 and (i == count) == last and self._text_of(gaps[i]) == (text or ""):
+                chunks.append(gaps[i])
+            elif separator is not None and closing is not None and (text is None or not text.strip()):
+                chunks.append(closing if last else separator)
+            elif text:
+                chunks.append(escape(text))
+
+        children = list(node)
+        previous = -1
+        text = node.text
+        for child in children:
+            index = None
+            if child in self._ranges:
+                index = starts.get(self._ranges[child][0])
+            gap(text, index, previous, False)
+            self._write(child, chunks, dirty, opened)
+            previous = -2 if index is None else index
+            text = child.tail
+        gap(text, count, previous, True)
+
+    def _children_in(self, pos: int, end: int):
+        # (start, end) offsets of the elements in the source between pos and end (not their descendants)
+        source = self._source
+        while True:
+            m = _MARKUP.search(source, pos, end)
+            if m is None:
+                return
+            if m.group(1) is None:
+                pos = m.end()
+                continue
+            tag = _START_TAG.match(source, m.start())
+            if tag.group(1) == b"/":
+                pos = tag.end()
+            else:
+                pos = SourceMap._end_of(source, m.group(1), tag.end())
+            yield (m.start(), pos)
+
+    def _text_of(self, gap: bytes):
+        # The character data of a part of the source (None if it can't be parsed on its own)
+        if b"<" not in gap and b"&" not in gap:
+            return gap.decode(self._encoding)
+        declaration = ('<?xml version="1.0" encoding="%s"?><x>' % self._encoding).encode("ascii")
+        try:
+            return ET.fromstring(declaration + gap + b"</x>").text or ""
+        except ET.ParseError:
+            return None
+
+    def _indent(self, gap: bytes):
+        # The whitespace at the end of a gap, if it has no text
+        text = self._text_of(gap)
+        if text is None or text.strip():
+            return None
+        return gap[gap.rfind(b">") + 1:]
@@ -0,0 +1,59 @@
+import copy
+import re
+
+# {name} in an attribute value of a fragment
+_PARAMETER = re.compile(r'\{(\w+)\}')
+
+
+class Fragment(object):
+    """
+    Sibling elements of a fixed shape, parsed once and stamped out by copying
+
+    Attribute values may contain {name} parameters, which are substituted
+    when stamping. The elements are parsed (per backend) on first use, and
+    the places that have parameters are found once, so stamping is a deep
+    copy (done in C by ElementTree and lxml) and setting those attributes.
+    """
+
+    def __init__(self, content: str):
+        """
+        :param content: xml of the elements (without whitespace between them)
+        """
+        self._content = content
+        self._prototypes = {}
+
+    def _prototype(self, backend) -> tuple:
+        prototype = self._prototypes.get(backend.name)
+        if prototype is None:
+            root = backend.fromstring("<fragment>" + self._content + "</fragment>")
+            # (path of child indexes, attribute, value with parameters)
+            slots = []
+            stack = [((i,), child) for (i, child) in enumerate(root)]
+            while stack:
+                (path, node) = stack.pop()
+                for (key, value) in node.attrib.items():
+                    if _PARAMETER.search(value):
+                        slots.append((path, key, value))
+                for (i, child) in enumerate(node):
+                    stack.append((path + (i,), child))
+            prototype = (root, slots)
+            self._prototypes[backend.name] = prototype
+        return prototype
+
+    def stamp(self, backend, params: dict) -> list:
+        """
+        New copies of the elements
+
+        :param backend: backend of the document they are inserted into
+        :param params: values of the parameters
+        :return: list of elements
+        :raises KeyError: if a parameter has no value
+        """
+        (root, slots) = self._prototype(backend)
+        nodes = [copy.deepcopy(node) for node in root]
+        for (path, key, value) in slots:
+            node = nodes[path[0]]
+            for i in path[1:]:
+                node = node[i]
+            node.set(key, _PARAMETER.sub(lambda m: params[m.group(1)], value))
+        return nodes
@@ -0,0 +1,57 @@
+import os
+import re
+
+from xmltools.plan import Host, Plan
+
+
+class Recorder(Host):
+    # Host that records its side effects instead of doing them
+
+    def __init__(self):
+        self.calls = []
+
+    def install(self, src, lib):
+        self.calls.append(("install", src, lib))
+
+    def run(self, src):
+        self.calls.append(("run", src))
+
+    def echo(self, text):
+        self.calls.append(("echo", text))
+
+    def wait(self):
+        pass
+
+
+def parse(src: str) -> Plan:
+    # Stand-in for the tokenizer: a .txt file is echoed as is, other files are lines of `kind name value...`
+    # once ${NAME|default} is expanded from the environment
+    with open(src) as io:
+        content = io.read()
+    plan = Plan()
+    if src.endswith(".txt"):
+        plan.echo(content)
+        return plan
+    content = re.sub(r'\$\{([^}|]+)(?:\|([^}]*))?\}', lambda m: os.environ.get(m.group(1), m.group(2)) or "",
+                     content)
+    for line in content.splitlines():
+        words = line.split(" ")
+        if words[0] == "sys":
+            plan.system_property(words[1], " ".join(words[2:]))
+        elif words[0] == "jdbc":
+            # key=value words are properties, a bare word is the url
+            plan.jdbc_resource(words[1], {"pool-name": words[1]},
+                               dict(word.split("=", 1) if "=" in word else ("Url", word) for word in words[2:]))
+        elif words[0] == "jvm":
+            plan.jvm_options(False, [words[1] + words[2]], [words[1] + "*"])
+        elif words[0] == "remove":
+            plan.remove(words[1])
+        elif words[0] == "echo":
+            plan.echo(" ".join(words[1:]))
+        elif words[0] == "lib":
+            plan.install(os.path.join(os.path.dirname(src), words[1]), "/nowhere")
+        elif words[0] == "app":
+            plan.app("app", os.path.join(os.path.dirname(src), words[1]))
+        else:
+            raise SyntaxError("Unexpected input: `%s'" % words[0])
+    return plan
@@ -0,0 +1,56 @@
+from unittest import TestCase, skipUnless
+from xml.etree import ElementTree as ET
+
+from xmltools import backend
+from xmltools.manipulation import XmlManipulator
+
+
+class TestBackend(TestCase):
+
+    def test_available(self):
+        self.assertIn("etree", backend.available())
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            backend.get("dom")
+
+    def test_set_default(self):
+        previous = backend.set_default("etree")
+        try:
+            self.assertEqual("etree", backend.default().name)
+            self.assertEqual("etree", XmlManipulator("<root/>")._tree.backend.name)
+        finally:
+            backend.set_default(previous.name)
+
+    def test_of_element(self):
+        self.assertEqual("etree", backend.of(ET.fromstring("<root/>")).name)
+        x = XmlManipulator(ET.fromstring("<root><a/></root>"))
+        self.assertEqual("etree", x._tree.backend.name)
+
+    def test_bytes(self):
+        x = XmlManipulator('<?xml version="1.0" encoding="UTF-8"?><root><a n="æ"/></root>'.encode("UTF-8"),
+                           backend="etree")
+        self.assertTrue(x.has('a[@n="æ"]'))
+
+    def test_fallback_findall(self):
+        x = XmlManipulator("<root><a><b n='1'/></a><b n='2'/></root>", backend="etree")
+        self.assertEqual(["1", "2"], [b.get("n") for b in x._findall(".//b")])
+
+
+@skipUnless("lxml" in backend.available(), "lxml is not installed")
+class TestLxmlBackend(TestCase):
+
+    def test_xpath_fallback(self):
+        x = XmlManipulator("<root><a n='1'/><a n='2'/></root>", backend="lxml")
+        self.assertEqual(["2"], [a.get("n") for a in x._findall("a[last()]")])
+
+    def test_parents_are_native(self):
+        x = XmlManipulator("<root><a/></root>", backend="lxml")
+        x.append_at(".").element("b")
+        x.remove("a")
+        self.assertEqual({}, x._tree.parent)
+        self.assertEqual(["b"], [c.tag for c in x._root])
+
+    def test_comments_are_not_elements(self):
+        x = XmlManipulator("<root><!-- c --><a/></root>", backend="lxml")
+        self.assertEqual(["a"], [c.tag for c in x._findall("*")])
@@ -0,0 +1,64 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from xmltools.batch import Batch, variants
+from xmltools.bundle import Bundle, _marker
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.plan import JdbcResource, ResourceRef, SystemProperty
+
+BASE = os.path.join(os.path.dirname(__file__), "domain_orig.xml")
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.bundle = Bundle([
+            ("01-env.sys", [SystemProperty("env", _marker("ENV"))]),
+            ("02-db.jdbc", [JdbcResource("jdbc/db", {"pool-name": "jdbc/db"},
+                                         {"Url": "postgres://" + _marker("DB") + "/x"}, False),
+                            ResourceRef("jdbc/db")])
+        ], {"ENV": None, "DB": "localhost"})
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.dir.name, name)
+
+    def test_variants(self):
+        self.assertEqual([(1, {"A": "1"}), (3, {})], variants(io.StringIO('{"A": "1"}\n\n{}\n')))
+        with self.assertRaises(ValueError):
+            variants(io.StringIO('{"A": 1}\n'))
+        with self.assertRaises(ValueError):
+            variants(io.StringIO('[]\n'))
+
+    def check(self, jobs: int, preserve: bool = False):
+        batch = Batch(BASE, self.bundle, preserve=preserve, environ={})
+        failed = batch.run([(self.output("a/domain.xml"), {"ENV": "a"}),
+                            (self.output("b/domain.xml"), {"ENV": "b", "DB": "db-b"}),
+                            (self.output("c/domain.xml"), {})], jobs)
+        self.assertEqual([self.output("c/domain.xml")], list(failed))
+        self.assertFalse(os.path.exists(self.output("c/domain.xml")))
+        for (name, env, db) in (("a", "a", "localhost"), ("b", "b", "db-b")):
+            xml = DomainXml(self.output(name + "/domain.xml")).xml
+            self.assertTrue(xml.has('servers/server/system-property[@name="env"][@value="%s"]' % env))
+            self.assertTrue(xml.has('resources/jdbc-connection-pool[@name="jdbc/db/pool"]'
+                                    '/property[@name="Url"][@value="postgres://%s/x"]' % db))
+        # Variants don't see each other's changes, and the base is left alone
+        self.assertFalse(DomainXml(self.output("b/domain.xml")).xml.has(
+            'servers/server/system-property[@value="a"]'))
+        self.assertFalse(DomainXml(BASE).xml.has('servers/server/system-property[@name="env"]'))
+
+    def test_forked(self):
+        self.check(2)
+
+    def test_sequential_preserving(self):
+        self.check(1, preserve=True)
+
+    def test_without_fork(self):
+        batch = Batch(BASE, self.bundle, environ={"ENV": "x"})
+        self.assertEqual({}, batch._run_parsing([(self.output("1.xml"), {}), (self.output("2.xml"), {"ENV": "y"})]))
+        self.assertTrue(DomainXml(self.output("2.xml")).xml.has('servers/server/system-property[@value="y"]'))
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from benchmarks import generator
+from benchmarks.suite import Suite, compare
+from xmltools.payara_domain_xml import DomainXml
+
+
+class TestGenerator(TestCase):
+
+    def test_parse_scale(self):
+        self.assertEqual(generator.SCALES['small'], generator.parse_scale("small"))
+        self.assertEqual(generator.Scale(1, 0, 5, 0, 0), generator.parse_scale("apps=1,cres=5"))
+        self.assertEqual(50000, generator.parse_scale("medium,cres=50000").cres)
+        with self.assertRaises(ValueError):
+            generator.parse_scale("huge")
+
+    def test_domain_xml(self):
+        scale = generator.Scale(apps=2, jdbc=3, cres=4, jms=5, jvm=6)
+        with tempfile.NamedTemporaryFile(suffix=".xml") as io:
+            io.write(generator.domain_xml(scale))
+            io.flush()
+            xml = DomainXml(io.name).xml
+        self.assertEqual(2, len(xml._findall("applications/application")))
+        self.assertEqual(3, len(xml._findall("resources/jdbc-resource[@pool-name]")) - 3)
+        self.assertEqual(4, len(xml._findall("resources/custom-resource")))
+        self.assertEqual(5, len(xml._findall("resources/admin-object-resource")))
+        self.assertTrue(xml.has('servers/server/resource-ref[@ref="jms/queue-4"]'))
+
+    def test_config_dir(self):
+        with tempfile.TemporaryDirectory() as directory:
+            files = generator.config_dir(directory, generator.Scale(apps=2, jdbc=1, cres=1, jms=0, jvm=0))
+            self.assertEqual(["10-app-00000.app", "10-app-00001.app", "20-jdbc.jdbc", "30-cres.cres"],
+                             [os.path.basename(f) for f in files])
+            self.assertTrue(os.path.isfile(os.path.join(directory, "app-1.war")))
+
+
+class TestSuite(TestCase):
+
+    def test_run_and_compare(self):
+        report = Suite(generator.parse_scale("tiny"), repeat=1).run()
+        self.assertIn("custom_resource_primitive", report['timings'])
+        self.assertIn("save", report['timings'])
+        self.assertIn("import xmltools.payara_config", report['timings'])
+        self.assertIn("payara5-setup --help", report['timings'])
+        self.assertGreater(report['memory']['peak'], 0)
+        self.assertEqual([], compare(report, report))
+        slower = dict(report, timings={name: dict(t, seconds=t['seconds'] * 2 + 1)
+                                       for (name, t) in report['timings'].items()})
+        self.assertIn("save", [name for (name, before, now) in compare(slower, report)])
+        with self.assertRaises(ValueError):
+            compare(report, dict(report, scale={}))
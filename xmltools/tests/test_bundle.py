@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from xmltools.bundle import Bundle
+from xmltools.payara_config import PayaraConfig
+from xmltools.plan import JOIN, App, InstallJar, JdbcResource, JvmOptions, Osgi, ResourceRef, SystemProperty, \
+    Echo
+
+from helpers import parse
+
+
+class TestBundle(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.files = []
+        self.write("01-a.sys", "sys a.b ${A_B|fallback}\nsys plain value\n")
+        self.write("02-db.jdbc", "jdbc jdbc/db postgres://${DB_HOST}/${DB_NAME|db}\n")
+        self.write("03-mem.jvm", "jvm -Xmx ${MX|2G}\n")
+        self.write("04-msg.txt", "${NOT_A_VARIABLE}\n")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name: str, content: str) -> None:
+        location = os.path.join(self.dir.name, name)
+        with open(location, "w") as io:
+            io.write(content)
+        self.files.append(location)
+
+    def compile(self) -> Bundle:
+        return Bundle.compile(self.files[:3], parse)
+
+    def test_variables(self):
+        bundle = Bundle.compile(self.files, parse)
+        self.assertEqual({"A_B": "fallback", "DB_HOST": None, "DB_NAME": "db", "MX": "2G"}, bundle.variables)
+        self.assertEqual(["DB_HOST"], bundle.missing({}))
+        self.assertEqual([], bundle.missing({"DB_HOST": "x"}))
+
+    def test_environment_is_restored(self):
+        os.environ["MX"] = "1G"
+        try:
+            self.compile()
+            self.assertEqual("1G", os.environ["MX"])
+            self.assertNotIn("DB_HOST", os.environ)
+        finally:
+            del os.environ["MX"]
+
+    def test_conflicting_defaults(self):
+        self.write("05-b.sys", "sys other ${MX|4G}\n")
+        with self.assertRaises(ValueError):
+            Bundle.compile(self.files, parse)
+
+    def test_plans_are_expanded(self):
+        plans = self.compile().plans({"DB_HOST": "h", "MX": "512m"})
+        self.assertEqual(self.files[:3], [src for (src, _) in plans])
+        self.assertEqual([SystemProperty("a.b", "fallback"), SystemProperty("plain", "value")], list(plans[0][1]))
+        self.assertEqual([JdbcResource("jdbc/db", {"pool-name": "jdbc/db"}, {"Url": "postgres://h/db"}, False),
+                          ResourceRef("jdbc/db")], list(plans[1][1]))
+        self.assertEqual([JvmOptions(False, ("-Xmx512m",), ("-Xmx*",))], list(plans[2][1]))
+
+    def test_missing_variable(self):
+        with self.assertRaises(KeyError):
+            self.compile().plans({})
+
+    def test_save_load(self):
+        location = os.path.join(self.dir.name, "bundle.json")
+        self.compile().save(location)
+        bundle = Bundle.load(location)
+        environ = {"DB_HOST": "h", "DB_NAME": "prod"}
+        self.assertEqual([(src, list(plan)) for (src, plan) in self.compile().plans(environ)],
+                         [(src, list(plan)) for (src, plan) in bundle.plans(environ)])
+        self.assertEqual([JvmOptions(False, ("-Xmx2G",), ("-Xmx*",))], list(bundle.plans(environ)[2][1]))
+
+    def test_load_rejects_other_version(self):
+        location = os.path.join(self.dir.name, "bundle.json")
+        with open(location, "w") as io:
+            io.write('{"version": 0, "variables": {}, "files": []}')
+        with self.assertRaises(ValueError):
+            Bundle.load(location)
+
+    def test_echo_survives(self):
+        location = os.path.join(self.dir.name, "bundle.json")
+        Bundle([("x.txt", [Echo("${X}\n")])], {}).save(location)
+        self.assertEqual([Echo("${X}\n")], list(Bundle.load(location).plans({})[0][1]))
+
+
+class TestResolvedWhenApplied(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_connection_string_with_variables(self):
+        src = os.path.join(self.dir.name, "10-pools.jdbc.csv")
+        with open(src, "w") as io:
+            io.write("jndi-name,connection,PortNumber\n"
+                     "jdbc/a,u:p@h:${PORT}/db,\n"
+                     "jdbc/b,${DB_URL},\n"
+                     "jdbc/c,${DB_URL},6000\n")
+        cfg = PayaraConfig(self.dir.name)
+        location = os.path.join(self.dir.name, "bundle.json")
+        Bundle.compile([src], cfg.parse).save(location)
+        plan = list(Bundle.load(location).plans({"PORT": "5433", "DB_URL": "v:w@x/y"})[0][1].resolved())
+        with open(src, "w") as io:
+            io.write("jndi-name,connection,PortNumber\n"
+                     "jdbc/a,u:p@h:5433/db,\n"
+                     "jdbc/b,v:w@x/y,\n"
+                     "jdbc/c,v:w@x/y,6000\n")
+        expected = list(cfg.parse(src))
+        self.assertEqual(expected, plan)
+        self.assertEqual([list(op.props.items()) for op in expected if isinstance(op, JdbcResource)],
+                         [list(op.props.items()) for op in plan if isinstance(op, JdbcResource)])
+        self.assertEqual("5433", plan[0].props["PortNumber"])
+        self.assertEqual("6000", plan[4].props["PortNumber"])
+        with self.assertRaisesRegex(Exception, "Invalid credentials of jdbc/b"):
+            Bundle.load(location).plans({"PORT": "5433", "DB_URL": "nothing"})[0][1].resolved()
+
+    def test_app_location_with_variable(self):
+        war = os.path.join(self.dir.name, "app.war")
+        with open(war, "w"):
+            pass
+        bundle = Bundle([("10-a.app", [App("app", "/config" + JOIN + "\ue000WAR\ue001", "/")])], {"WAR": None})
+        self.assertEqual([App("app", war, "/")], list(bundle.plans({"WAR": war})[0][1].resolved()))
+        bundle = Bundle([("10-a.app", [App("app", self.dir.name + JOIN + "\ue000WAR\ue001", "/")])], {"WAR": None})
+        self.assertEqual([App("app", war, "/")], list(bundle.plans({"WAR": "app.war"})[0][1].resolved()))
+        with self.assertRaisesRegex(Exception, "missing file: "):
+            bundle.plans({"WAR": "other.war"})[0][1].resolved()
+
+    def test_osgi_named_by_variable(self):
+        jar = os.path.join(self.dir.name, "bundle.jar")
+        bundle = Bundle([("10-a.lib", [Osgi("\ue000JAR\ue001", "/config" + JOIN + "\ue000JAR\ue001"),
+                                       InstallJar("/config" + JOIN + "\ue000JAR\ue001", "/lib")])], {"JAR": None})
+        self.assertEqual([Osgi("bundle.jar", jar), InstallJar(jar, "/lib")],
+                         list(bundle.plans({"JAR": jar})[0][1].resolved()))
+
+    def test_invalid_file_is_skipped(self):
+        payara = os.path.join(self.dir.name, "payara5")
+        location = PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(payara))
+        os.makedirs(os.path.dirname(location))
+        shutil.copy(os.path.join(os.path.dirname(__file__), "domain_orig.xml"), location)
+        bundle = Bundle([("10-a.app", [App("app", self.dir.name + JOIN + "\ue000WAR\ue001", "/")]),
+                         ("20-b.sys", [SystemProperty("b", "\ue000WAR\ue001")])], {"WAR": None})
+        cfg = PayaraConfig(payara, keep_going=True)
+        for (src, plan) in bundle.plans({"WAR": "missing.war"}):
+            cfg.process(src, plan)
+        self.assertEqual([("10-a.app", "missing file: " + os.path.join(self.dir.name, "missing.war"))], cfg.failed)
+        self.assertIn('<system-property name="b" value="missing.war"', cfg.domain_xml.xml.to_xml())
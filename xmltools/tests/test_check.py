@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from xmltools.check import check, check_file
+from xmltools.plan import JdbcResource
+
+from helpers import parse
+
+KNOWN = {JdbcResource: {"max-pool-size", "steady-pool-size"}}
+
+
+class TestCheck(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.files = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name: str, content: str) -> str:
+        location = os.path.join(self.dir, name)
+        with open(location, "w") as io:
+            io.write(content)
+        self.files.append(location)
+        return location
+
+    def test_valid(self):
+        self.write("a.jar", "")
+        src = self.write("01-a.lib", "lib a.jar\n")
+        self.assertEqual(([], []), check_file(src, parse, KNOWN, {}))
+
+    def test_missing_files(self):
+        src = self.write("01-a.lib", "lib a.jar\napp b.war\n")
+        (errors, warnings) = check_file(src, parse, KNOWN, {})
+        self.assertEqual(["missing file: " + os.path.join(self.dir, "a.jar"),
+                          "missing file: " + os.path.join(self.dir, "b.war")], errors)
+
+    def test_unset_variables(self):
+        src = self.write("01-a.jdbc", "jdbc jdbc/${DB|x} User=${USER_NAME} Password=${PASS}\n")
+        (errors, _) = check_file(src, parse, KNOWN, {"PASS": "p"})
+        self.assertEqual(["environment variable(s) without default not set: USER_NAME"], errors)
+        self.assertEqual(([], []), check_file(self.write("01-b.txt", "${USER_NAME}\n"), parse, KNOWN, {}))
+
+    def test_unset_variables_and_other_errors(self):
+        src = self.write("01-a.lib", "lib ${JAR_DIR}/a.jar\nlib b.jar\napp c.war\n")
+        (errors, _) = check_file(src, parse, KNOWN, {})
+        self.assertEqual(["environment variable(s) without default not set: JAR_DIR",
+                          "missing file: " + os.path.join(self.dir, "b.jar"),
+                          "missing file: " + os.path.join(self.dir, "c.war")], errors)
+        self.assertNotIn("JAR_DIR", os.environ)
+        src = self.write("02-a.lib", "lib ${JAR_DIR}/a.jar\nbad\n")
+        (errors, _) = check_file(src, parse, KNOWN, {})
+        self.assertEqual(["environment variable(s) without default not set: JAR_DIR",
+                          "Unexpected input: `bad'"], errors)
+
+    def test_variables_of_environ(self):
+        self.write("a.jar", "")
+        src = self.write("01-a.lib", "lib ${JAR_NAME}\n")
+        self.assertEqual(([], []), check_file(src, parse, KNOWN, {"JAR_NAME": "a.jar"}))
+        self.assertNotIn("JAR_NAME", os.environ)
+        os.environ["JAR_NAME"] = "a.jar"
+        try:
+            (errors, _) = check_file(src, parse, KNOWN, {"JAR_NAME": "b.jar"})
+            self.assertEqual(["missing file: " + os.path.join(self.dir, "b.jar")], errors)
+            self.assertEqual("a.jar", os.environ["JAR_NAME"])
+        finally:
+            del os.environ["JAR_NAME"]
+
+    def test_unknown_attributes(self):
+        src = self.write("01-a.jdbc", "jdbc jdbc/db max-pool-siz=1 User=x ssl-mode=require\n")
+        (errors, warnings) = check_file(src, parse, KNOWN, {})
+        self.assertEqual([], errors)
+        self.assertEqual(2, len(warnings))
+        self.assertIn("did you mean max-pool-size?", warnings[0])
+        self.assertIn("ssl-mode", warnings[1])
+
+    def test_all_errors_are_reported(self):
+        self.write("01-a.lib", "bad\n")
+        self.write("02-b.lib", "lib missing.jar\n")
+        self.write("03-c.jdbc", "jdbc jdbc/db\n")
+        self.write("04-d.lib", "worse\n")
+        for jobs in (1, 4):
+            report = check(self.files, parse, KNOWN, jobs, {})
+            self.assertFalse(report)
+            self.assertEqual(["01-a.lib", "02-b.lib", "04-d.lib"],
+                             [os.path.basename(src) for (src, _) in report.errors])
+            self.assertEqual("01-a.lib: error: Unexpected input: `bad'", report.lines()[0])
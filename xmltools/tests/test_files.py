@@ -0,0 +1,73 @@
+import os
+import stat
+import tempfile
+from unittest import TestCase, skipUnless
+
+from xmltools.files import AtomicFile
+
+
+class TestAtomicFile(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self._tmp.name, "domain.xml")
+        with open(self.location, "wb") as io:
+            io.write(b"old")
+        os.chmod(self.location, 0o640)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def content(self):
+        with open(self.location, "rb") as io:
+            return io.read()
+
+    def test_write(self):
+        out = AtomicFile(self.location, fsync=True)
+        with out as io:
+            io.write(b"new")
+        self.assertTrue(out.written)
+        self.assertEqual(b"new", self.content())
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.location).st_mode))
+        self.assertEqual(["domain.xml"], os.listdir(self._tmp.name))
+
+    def test_failure_keeps_original(self):
+        with self.assertRaises(ValueError):
+            with AtomicFile(self.location) as io:
+                io.write(b"partial")
+                raise ValueError()
+        self.assertEqual(b"old", self.content())
+        self.assertEqual(["domain.xml"], os.listdir(self._tmp.name))
+
+    def test_skip_unchanged(self):
+        before = os.stat(self.location).st_ino
+        out = AtomicFile(self.location, skip_unchanged=True)
+        with out as io:
+            io.write(b"old")
+        self.assertFalse(out.written)
+        self.assertEqual(before, os.stat(self.location).st_ino)
+        self.assertEqual(["domain.xml"], os.listdir(self._tmp.name))
+
+    def test_new_file(self):
+        location = os.path.join(self._tmp.name, "other.xml")
+        with AtomicFile(location, skip_unchanged=True) as io:
+            io.write(b"new")
+        with open(location, "rb") as io:
+            self.assertEqual(b"new", io.read())
+
+    def test_symlink_is_written_through(self):
+        link = os.path.join(self._tmp.name, "link.xml")
+        os.symlink("domain.xml", link)
+        with AtomicFile(link) as io:
+            io.write(b"new")
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(b"new", self.content())
+        self.assertEqual(["domain.xml", "link.xml"], sorted(os.listdir(self._tmp.name)))
+
+    @skipUnless(hasattr(os, "geteuid") and os.geteuid() == 0, "only root can give a file away")
+    def test_owner_is_kept(self):
+        os.chown(self.location, 1234, 4321)
+        with AtomicFile(self.location) as io:
+            io.write(b"new")
+        st = os.stat(self.location)
+        self.assertEqual((1234, 4321, 0o640), (st.st_uid, st.st_gid, stat.S_IMODE(st.st_mode)))
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from xmltools.jar_installer import JarInstaller
+
+
+class TestJarInstaller(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+        self.lib = os.path.join(self.dir, "lib")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def file(self, name, content):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as io:
+            io.write(content)
+        return path
+
+    def content(self, path):
+        with open(path) as io:
+            return io.read()
+
+    def test_copy(self):
+        installer = JarInstaller(link=False)
+        installer.install(self.file("a.jar", "aaa"), self.lib)
+        installer.install(self.file("b.jar", "bb"), os.path.join(self.lib, "ext"))
+        installer.wait()
+        self.assertEqual("aaa", self.content(os.path.join(self.lib, "a.jar")))
+        self.assertEqual("bb", self.content(os.path.join(self.lib, "ext", "b.jar")))
+        self.assertEqual(5, installer.copied)
+        self.assertEqual(0, installer.skipped)
+
+    def test_link(self):
+        installer = JarInstaller()
+        src = self.file("a.jar", "aaa")
+        installer.install(src, self.lib)
+        installer.wait()
+        self.assertTrue(os.path.samefile(src, os.path.join(self.lib, "a.jar")))
+        self.assertEqual(3, installer.linked)
+
+    def test_skip_identical(self):
+        self.file("lib/a.jar", "aaa")
+        self.file("lib/b.jar", "xxx")
+        installer = JarInstaller(link=False)
+        installer.install(self.file("a.jar", "aaa"), self.lib)
+        installer.install(self.file("b.jar", "bbb"), self.lib)
+        installer.wait()
+        self.assertEqual(3, installer.skipped)
+        self.assertEqual(3, installer.copied)
+        self.assertEqual("bbb", self.content(os.path.join(self.lib, "b.jar")))
+
+    def test_last_wins(self):
+        installer = JarInstaller(link=False)
+        installer.install(self.file("x/a.jar", "first"), self.lib)
+        installer.install(self.file("y/a.jar", "second"), self.lib)
+        installer.wait()
+        self.assertEqual("second", self.content(os.path.join(self.lib, "a.jar")))
+        self.assertEqual(["a.jar"], os.listdir(self.lib))
+
+    def test_missing_source(self):
+        installer = JarInstaller()
+        installer.install(os.path.join(self.dir, "missing.jar"), self.lib)
+        self.assertRaises(OSError, installer.wait)
+
+    def test_drop(self):
+        installer = JarInstaller(link=False)
+        installer.install(self.file("x/a.jar", "first"), self.lib)
+        mark = installer.mark()
+        installer.install(self.file("y/a.jar", "second"), self.lib)
+        installer.install(self.file("y/b.jar", "b"), self.lib)
+        installer.drop(mark)
+        installer.wait()
+        self.assertEqual("first", self.content(os.path.join(self.lib, "a.jar")))
+        self.assertEqual(["a.jar"], os.listdir(self.lib))
+
+    def test_drop_after_wait(self):
+        installer = JarInstaller(link=False)
+        mark = installer.mark()
+        installer.install(self.file("x/a.jar", "a"), self.lib)
+        installer.wait()
+        installer.install(self.file("x/b.jar", "b"), self.lib)
+        installer.drop(mark)
+        installer.wait()
+        self.assertEqual(["a.jar"], os.listdir(self.lib))
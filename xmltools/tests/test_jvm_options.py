@@ -0,0 +1,75 @@
+import os
+from unittest import TestCase
+
+from xmltools.jvm_options import JvmOptionChanges, matcher, option_key
+from xmltools.payara_domain_xml import DomainXml
+
+if os.path.isdir(os.path.join("xmltools", "tests")):
+    os.chdir(os.path.join("xmltools", "tests"))
+
+SERVER_CONFIG = 'configs/config[@name="server-config"]/java-config/jvm-options'
+
+
+class TestJvmOptions(TestCase):
+
+    def test_option_key(self):
+        self.assertEqual("-Xmx", option_key("-Xmx2G"))
+        self.assertEqual("-Xss", option_key("-Xss512k"))
+        self.assertEqual("-Dfoo.bar", option_key("-Dfoo.bar=1=2"))
+        self.assertEqual("-Dflag", option_key("-Dflag"))
+        self.assertEqual("-XX:UseG1GC", option_key("-XX:+UseG1GC"))
+        self.assertEqual("-XX:UseG1GC", option_key("-XX:-UseG1GC"))
+        self.assertEqual("-XX:NewRatio", option_key("-XX:NewRatio=2"))
+        self.assertEqual("[1.8|1.8.0u120]-Dx", option_key("[1.8|1.8.0u120]-Dx=1"))
+        self.assertEqual("-Xmixed", option_key("-Xmixed"))
+        self.assertEqual("-server", option_key("-server"))
+
+    def test_matcher(self):
+        remove = matcher(["-Xmx*", "-D*.telnet.*", "-server"])
+        self.assertTrue(remove("-Xmx1G"))
+        self.assertTrue(remove("-Dosgi.shell.telnet.port=6666"))
+        self.assertTrue(remove("-server"))
+        self.assertFalse(remove("-server2"))
+        self.assertFalse(remove("-xmx1G"))
+        self.assertFalse(matcher([])("-server"))
+
+    def test_changes(self):
+        changes = JvmOptionChanges(["-Xmx1G", "-Da=1", "-Xmx2G", "-XX:+UseG1GC"], ["-Db=*"])
+        self.assertEqual("-Xmx2G", changes.update("-Xmx512m"))
+        self.assertIsNone(changes.update("-Xmx256m"))
+        self.assertIsNone(changes.update("-Db=1"))
+        self.assertEqual("-XX:+UseG1GC", changes.update("-XX:+UseG1GC"))
+        self.assertEqual("-server", changes.update("-server"))
+        self.assertEqual(["-Da=1"], changes.remaining())
+        self.assertEqual([("-Xmx512m", "-Xmx2G")], changes.report.overrides)
+        self.assertEqual([("-Xmx", ["-Xmx1G", "-Xmx2G"])], changes.report.conflicts)
+
+
+class TestDomainXmlJvmOptions(TestCase):
+
+    def options(self, domain_xml: DomainXml) -> list:
+        return [node.text for node in domain_xml.xml._findall(SERVER_CONFIG)]
+
+    def test_replaced_in_place(self):
+        domain_xml = DomainXml("domain_orig.xml")
+        before = self.options(domain_xml)
+        report = domain_xml.jvm_options(False, ["-Xmx2G", "-XX:NewRatio=3", "-Dnew=1"], [])
+        after = self.options(domain_xml)
+        self.assertEqual(before.index("-Xmx512m"), after.index("-Xmx2G"))
+        self.assertEqual(before.index("-XX:NewRatio=2"), after.index("-XX:NewRatio=3"))
+        self.assertEqual("-Dnew=1", after[-1])
+        self.assertEqual(len(before) + 1, len(after))
+        self.assertEqual([("-Xmx512m", "-Xmx2G"), ("-XX:NewRatio=2", "-XX:NewRatio=3")], report.overrides)
+
+    def test_removed_then_added(self):
+        domain_xml = DomainXml("domain_orig.xml")
+        report = domain_xml.jvm_options(False, ["-Xmx2G"], ["-Xmx*", "-D*.telnet.*"])
+        after = self.options(domain_xml)
+        self.assertEqual("-Xmx2G", after[-1])
+        self.assertFalse([option for option in after if ".telnet." in option or option == "-Xmx512m"])
+        self.assertFalse(report)
+
+    def test_clear(self):
+        domain_xml = DomainXml("domain_orig.xml")
+        domain_xml.jvm_options(True, ["-server", "-Xmx1G"], ["-server"])
+        self.assertEqual(["-server", "-Xmx1G"], self.options(domain_xml))
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from xmltools.log_levels import LogLevels, JUL_LEVELS, LOGBACK_LEVELS, main, merge_logback, merge_properties
+from xmltools.manipulation import XmlManipulator
+
+ENV = {"LOG": "error", "LOG__foo_bar": "d", "LOG__x_y": "Warn", "LOG__empty": "", "PATH": "/bin"}
+
+
+class TestLogLevels(TestCase):
+
+    def test_environment(self):
+        levels = LogLevels(LOGBACK_LEVELS, ENV)
+        self.assertEqual("ERROR", levels.root)
+        self.assertEqual({"foo.bar": "DEBUG", "x.y": "WARNING"}, levels.loggers)
+
+    def test_logback_existing_logger_is_updated(self):
+        xml = XmlManipulator('<configuration><logger name="foo.bar" level="INFO"/><root level="INFO"/>'
+                             '</configuration>')
+        LogLevels(LOGBACK_LEVELS, ENV).apply_logback(xml)
+        self.assertEqual(["DEBUG"], [n.get("level") for n in xml._findall('logger[@name="foo.bar"]')])
+        self.assertEqual(["x.y"], [n.get("name") for n in xml._findall('logger[@name="x.y"]')])
+        self.assertEqual("ERROR", xml._find("root").get("level"))
+
+    def test_properties(self):
+        lines = ["handlers=x\n", "foo.bar.level=INFO\n", "other.level=INFO\n"]
+        self.assertEqual(["handlers=x\n", "foo.bar.level=DEBUG\n", "other.level=INFO\n", "\n", "x.y.level=WARNING\n"],
+                         list(LogLevels(JUL_LEVELS, ENV).apply_properties(lines)))
+
+    def test_in_place(self):
+        levels = LogLevels(JUL_LEVELS, ENV)
+        with tempfile.TemporaryDirectory() as directory:
+            files = [os.path.join(directory, name) for name in ("a.properties", "b.properties")]
+            for name in files:
+                with open(name, "w") as io:
+                    io.write("foo.bar.level=INFO\n")
+            main("payara-log-setup", "logging.properties", lambda src, dest: merge_properties(levels, src, dest),
+                 ["-i"] + files)
+            for name in files:
+                with open(name, "r") as io:
+                    self.assertEqual("foo.bar.level=DEBUG\n\nx.y.level=WARNING\n", io.read())
+            self.assertEqual([], [name for name in os.listdir(directory) if name.endswith(".tmp")])
+
+    def test_logback_keeps_comments(self):
+        levels = LogLevels(LOGBACK_LEVELS, {"LOG__foo_bar": "t"})
+        with tempfile.TemporaryDirectory() as directory:
+            src = os.path.join(directory, "logback.xml")
+            dest = os.path.join(directory, "out.xml")
+            with open(src, "w") as io:
+                io.write('<?xml version="1.0"?>\n<!-- c -->\n<configuration>\n  <logger name="foo.bar" level="INFO"/>\n'
+                         '</configuration>\n')
+            merge_logback(levels, src, dest)
+            with open(dest, "r") as io:
+                self.assertEqual('<?xml version="1.0"?>\n<!-- c -->\n<configuration>\n'
+                                 '  <logger name="foo.bar" level="TRACE" />\n</configuration>\n', io.read())
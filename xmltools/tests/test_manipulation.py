@@ -1,5 +1,6 @@
-from unittest import TestCase
+from unittest import TestCase, skipUnless
 
+from xmltools import backend
 from xmltools.manipulation import XmlManipulator
 
 xml_1 = """<?xml version="1.0"?>
@@ -11,6 +12,16 @@ xml_3 = """<?xml version="1.0"?>
 
 
 class XmlTestCase(TestCase):
+    backend = "etree"
+    # Prefix the backend serializes info:1 with
+    prefix = "ns0"
+
+    def setUp(self):
+        self._backend = backend.set_default(self.backend)
+
+    def tearDown(self):
+        backend.set_default(self._backend.name)
+
     def assertInOrder(self, text, *args):
         try:
             pos = -1
@@ -37,7 +48,7 @@ class TestXmlManipulator(XmlTestCase):
         x.add_namespace("ns2", "info:1")
         x.remove("./ns2:foo/ns2:bar")
         self.assertNotIn("bar", x.to_xml())
-        self.assertInOrder(x.to_xml(), "ns0:root", "ns0:foo", "/ns0:root")
+        self.assertInOrder(x.to_xml(), self.prefix + ":root", self.prefix + ":foo", "/" + self.prefix + ":root")
 
     def test_remove_attr_ns(self):
         x = XmlManipulator(xml_2)
@@ -55,7 +66,7 @@ class TestXmlManipulator(XmlTestCase):
         x = XmlManipulator(xml_2)
         x.add_namespace("ns2", "info:1")
         x.replace("./ns2:foo/ns2:bar", "<ns2:xml1/><ns2:xml2/>")
-        self.assertInOrder(x.to_xml(), "ns0:root", "ns0:foo", "ns0:xml1", "ns0:xml2", "/ns0:foo", "/ns0:root")
+        self.assertInOrder(x.to_xml(), self.prefix + ":root", self.prefix + ":foo", self.prefix + ":xml1", self.prefix + ":xml2", "/" + self.prefix + ":foo", "/" + self.prefix + ":root")
 
     def test_append_ns(self):
         x = XmlManipulator(xml_2)
@@ -77,14 +88,14 @@ class TestXmlManipulator(XmlTestCase):
         x.add_namespace("ns2", "info:1")
         p = x.append_at(".")
         p.element("fool").text("'s name").element("barley", namespace="ns2").attr("a", "b")
-        self.assertInOrder(x.to_xml(), "ns0:root", "ns0:foo", "ns0:bar", "/ns0:foo", "fool", "name", "ns0:barley", 'a="b"', "/fool", "/ns0:root")
+        self.assertInOrder(x.to_xml(), self.prefix + ":root", self.prefix + ":foo", self.prefix + ":bar", "/" + self.prefix + ":foo", "fool", "name", self.prefix + ":barley", 'a="b"', "/fool", "/" + self.prefix + ":root")
 
     def test_root(self):
         x = XmlManipulator(xml_2)
         x.add_namespace("ns2", "info:1")
         r = x.root("ns2:foo")
         r.append_at("ns2:bar").text("here")
-        self.assertInOrder(x.to_xml(), "ns0:root", "ns0:foo", "ns0:bar", "here", "/ns0:bar", "/ns0:foo", "/ns0:root")
+        self.assertInOrder(x.to_xml(), self.prefix + ":root", self.prefix + ":foo", self.prefix + ":bar", "here", "/" + self.prefix + ":bar", "/" + self.prefix + ":foo", "/" + self.prefix + ":root")
 
     def test_iterate(self):
         x = XmlManipulator(xml_3)
@@ -93,3 +104,212 @@ class TestXmlManipulator(XmlTestCase):
         x.iterate("ns2:foo", lambda e, p: l.append(e.get("a")))
         self.assertIn("1", l)
         self.assertIn("2", l)
+
+
+class TestParentTracking(XmlTestCase):
+
+    def setUp(self):
+        super().setUp()
+        XmlManipulator.debug = True
+
+    def tearDown(self):
+        XmlManipulator.debug = False
+        super().tearDown()
+
+    def test_element_and_clear(self):
+        x = XmlManipulator(xml_1)
+        p = x.append_at("foo").element("baz").element("qux").done()
+        self.assertIs(x._tree.parent[p._top[0]], p._top)
+        p.clear()
+        x._tree.verify()
+        self.assertEqual(3, len(x._tree.parent))
+
+    def test_remove_subtree(self):
+        x = XmlManipulator(xml_1)
+        x.append_at("foo/bar").element("deep").element("deeper")
+        x.remove("foo")
+        x._tree.verify()
+        self.assertEqual(0, len(x._tree.parent))
+
+    def test_replace_append(self):
+        x = XmlManipulator(xml_3)
+        x.add_namespace("ns2", "info:1")
+        x.replace("./ns2:foo/ns2:bar", "<ns2:xml1><ns2:x/></ns2:xml1>")
+        x.append("ns2:foo", "<ns2:xml2/>")
+        x._tree.verify()
+
+    def test_iterate_remove(self):
+        x = XmlManipulator(xml_3)
+        x.add_namespace("ns2", "info:1")
+
+        def drop(node, parent):
+            parent.remove(node)
+            return True
+
+        x.iterate("ns2:foo", drop)
+        x._tree.verify()
+        self.assertNotIn("bar", x.to_xml())
+
+    def test_root_shares_tracking(self):
+        x = XmlManipulator(xml_1)
+        x.root("foo").append_at(".").element("baz")
+        x.remove("foo/baz")
+        x._tree.verify()
+
+    def test_verify_detects_stale(self):
+        x = XmlManipulator(xml_1)
+        x._root.find("foo").clear()
+        self.assertRaises(AssertionError, x._tree.verify)
+
+
+class TestChildIndex(XmlTestCase):
+
+    def setUp(self):
+        super().setUp()
+        XmlManipulator.debug = True
+
+    def tearDown(self):
+        XmlManipulator.debug = False
+        super().tearDown()
+
+    def test_ensure_finds_existing(self):
+        x = XmlManipulator('<root><r name="a"/><r name="b" v="1"/><r name="b" v="2"/></root>')
+        self.assertEqual("1", x.ensure("r", {"name": "b"})._top.get("v"))
+        self.assertEqual("2", x.ensure("r", {"name": "b", "v": "2"})._top.get("v"))
+        self.assertEqual(3, len(x._root))
+
+    def test_ensure_creates(self):
+        x = XmlManipulator('<root><r name="a"/></root>')
+        x.ensure("r", {"name": "c"})
+        x.ensure("r", {"name": "c"})
+        x.ensure("s")
+        x.ensure("s")
+        self.assertEqual(3, len(x._root))
+
+    def test_index_follows_attr_changes(self):
+        x = XmlManipulator('<root><r name="a"/></root>')
+        self.assertIsNotNone(x.child("r", {"name": "a"}))
+        x.append_at("r").attr("name", "b")
+        self.assertIsNone(x.child("r", {"name": "a"}))
+        self.assertIsNotNone(x.child("r", {"name": "b"}))
+        x.remove_attr("r", "name")
+        self.assertIsNone(x.child("r", {"name": "b"}))
+        x.set_attr("r", "name", "c")
+        self.assertIsNotNone(x.child("r", {"name": "c"}))
+        x.append_at("r").clear()
+        self.assertIsNone(x.child("r", {"name": "c"}))
+
+    def test_index_follows_structure(self):
+        x = XmlManipulator('<root><r name="a"><x/></r></root>')
+        self.assertIsNotNone(x.child("r", {"name": "a"}))
+        x.remove("r")
+        self.assertIsNone(x.child("r", {"name": "a"}))
+        x.append(".", '<r name="a"/>')
+        self.assertIsNotNone(x.child("r", {"name": "a"}))
+        x.replace("r", '<r name="b"/>')
+        self.assertIsNone(x.child("r", {"name": "a"}))
+        self.assertIsNotNone(x.child("r", {"name": "b"}))
+
+
+class TestCheckpoint(XmlTestCase):
+
+    def setUp(self):
+        super().setUp()
+        XmlManipulator.debug = True
+
+    def tearDown(self):
+        XmlManipulator.debug = False
+        super().tearDown()
+
+    @staticmethod
+    def mutate(x: XmlManipulator) -> None:
+        x.set_attr("r[@name='a']", "name", "z")
+        x.remove_attr("r[@name='b']", "v")
+        x.remove("r[@name='c']")
+        x.replace("s", '<s2><t/></s2>')
+        x.append(".", '<r name="d"/>')
+        x.append_at("r[@name='d']").element("deep").attr("k", "v").text("text")
+        x.append_at("r[@name='b']").clear()
+
+        def change(node, parent):
+            if node.get("name") == "o1":
+                parent.remove(node)
+            else:
+                node.text = "changed"
+            return True
+
+        x.iterate("opts", change)
+
+    def test_rollback(self):
+        content = ('<root><r name="a"><x/></r><r name="b" v="1"/>tail<r name="c"><y/></r><s/>'
+                   '<opts><o name="o1">1</o><o name="o2">2</o></opts></root>')
+        x = XmlManipulator(content)
+        self.assertIsNotNone(x.child("r", {"name": "a"}))
+        self.assertTrue(x.has("opts/o"))
+        before = x.to_xml()
+        x.checkpoint()
+        self.mutate(x)
+        self.assertNotEqual(before, x.to_xml())
+        x.rollback()
+        x._tree.verify()
+        self.assertEqual(before, x.to_xml())
+        self.assertIsNotNone(x.child("r", {"name": "a"}))
+        self.assertIsNone(x.child("r", {"name": "z"}))
+        self.assertEqual(2, len(x._findall("opts/o")))
+        self.assertEqual(1, x._tree.rollbacks)
+
+    def test_commit(self):
+        x = XmlManipulator('<root><r name="a"/><r name="b" v="1"/><r name="c"/><s/><opts><o name="o1"/></opts></root>')
+        x.checkpoint()
+        self.mutate(x)
+        x.commit()
+        after = x.to_xml()
+        x.checkpoint()
+        x.remove("r")
+        x.rollback()
+        self.assertEqual(after, x.to_xml())
+        self.assertIsNone(x._tree.journal)
+
+    def test_preserved(self):
+        content = b'<root>\n  <r name="a"  v="1"/>\n  <!-- c -->\n  <s name="b"> <t/> </s>\n</root>'
+        x = XmlManipulator(content, preserve=True)
+        x.set_attr("s", "v", "2")
+        changed = x.to_xml()
+        x.checkpoint()
+        x.set_attr("r", "v", "3")
+        x.append_at("s").element("u")
+        x.rollback()
+        self.assertEqual(changed, x.to_xml())
+        self.assertEqual({x._find("s")}, x._tree.dirty)
+
+    def test_lazy(self):
+        content = b'<root>\n  <resources>\n    <r name="a"/>\n  </resources>\n  <other/>\n</root>'
+        x = XmlManipulator(content, lazy=True)
+        x.checkpoint()
+        x.append_at("resources").element("r", {"name": "b"})
+        x.remove("resources/r[@name='a']")
+        x.rollback()
+        self.assertEqual(content.decode("UTF-8"), x.to_xml())
+
+    def test_misuse(self):
+        x = XmlManipulator(xml_1)
+        self.assertRaises(ValueError, x.rollback)
+        x.checkpoint()
+        self.assertRaises(ValueError, x.checkpoint)
+
+
+@skipUnless("lxml" in backend.available(), "lxml is not installed")
+class TestXmlManipulatorLxml(TestXmlManipulator):
+    backend = "lxml"
+    # lxml keeps the prefixes of the document
+    prefix = "ns1"
+
+
+@skipUnless("lxml" in backend.available(), "lxml is not installed")
+class TestChildIndexLxml(TestChildIndex):
+    backend = "lxml"
+
+
+@skipUnless("lxml" in backend.available(), "lxml is not installed")
+class TestCheckpointLxml(TestCheckpoint):
+    backend = "lxml"
@@ -0,0 +1,418 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, skipUnless
+
+from xmltools import backend, records
+from xmltools.jar_installer import JarInstaller
+from xmltools.payara_config import PayaraConfig
+from xmltools.plan import CustomResourcePrimitive, CustomResourceProps, Host, JvmOptions, Plan, PropsAt, \
+    ResourceRef, StreamingPlan
+from xmltools.records import jsonl
+from xmltools.result_cache import ResultCache
+from xmltools.splice import escape, quoteattr
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Echoes(Host):
+
+    def __init__(self):
+        self.echoes = []
+
+    def echo(self, text):
+        self.echoes.append(text)
+
+
+class TestColdStart(TestCase):
+
+    def test_import_is_light(self):
+        # What payara5-setup shouldn't pay for until it is needed
+        code = "import sys, xmltools.payara_config\n" \
+               "print(' '.join(sorted(m for m in ('expanding', 'xml.sax.saxutils', 'multiprocessing', " \
+               "'concurrent.futures', 'xmltools.check', 'xmltools.bundle', 'xmltools.watch') if m in sys.modules)))"
+        loaded = subprocess.run([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.PIPE,
+                                universal_newlines=True, check=True).stdout.strip()
+        self.assertEqual("", loaded)
+
+    def test_help(self):
+        completed = subprocess.run([sys.executable, os.path.join(ROOT, "payara5-setup"), "--help"], cwd=ROOT,
+                                   stdout=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(0, completed.returncode)
+        self.assertIn("payara-5-dir", completed.stdout)
+
+    def test_watch_rejects_ignored_options(self):
+        command = [sys.executable, os.path.join(ROOT, "payara5-setup"), "--watch", "--plan", "--keep-going",
+                   "/nonexistent"]
+        completed = subprocess.run(command, cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+        self.assertEqual(2, completed.returncode)
+        self.assertIn("--watch can't be combined with --plan, --keep-going", completed.stderr)
+
+    def test_escape(self):
+        self.assertEqual("a &amp; &lt;b&gt;", escape("a & <b>"))
+        self.assertEqual("x&#10;", escape("x\n", {"\n": "&#10;"}))
+        self.assertEqual('"a"', quoteattr("a"))
+        self.assertEqual("'a\"b'", quoteattr('a"b'))
+        self.assertEqual('"a&quot;b\'c&#10;"', quoteattr('a"b\'c\n'))
+
+
+class TestTasks(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.payara = os.path.join(self.dir.name, "payara5")
+        location = PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(self.payara))
+        os.makedirs(os.path.dirname(location))
+        shutil.copy(os.path.join(ROOT, "xmltools", "tests", "domain_orig.xml"), location)
+        self.config = os.path.join(self.dir.name, "config")
+        os.mkdir(self.config)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def script(self, name: str, content: str) -> str:
+        location = os.path.join(self.config, name)
+        with open(location, "w") as io:
+            io.write("#!/bin/sh\n" + content)
+        return location
+
+    def run_main(self, *args) -> tuple:
+        completed = subprocess.run([sys.executable, os.path.join(ROOT, "payara5-setup"), "--no-cache",
+                                    self.payara, self.config] + list(args), cwd=ROOT, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+        return completed.returncode, completed.stdout, completed.stderr
+
+    def test_independent_script_and_tasks(self):
+        marker = os.path.join(self.dir.name, "marker")
+        self.script("10-ordered.sh", "echo ordered\n")
+        self.script("20-free.sh", "# payara5-setup: independent\necho free\n")
+        (code, out, err) = self.run_main("--task", "first=echo hello", "--task",
+                                         "second:first,domain.xml=touch " + marker)
+        self.assertEqual(0, code, err)
+        self.assertIn("ordered\n", out)
+        self.assertIn("[20-free.sh] free\n", out)
+        self.assertIn("[first] hello\n", out)
+        self.assertNotIn("Setting up from: 20-free.sh", out)
+        self.assertTrue(os.path.exists(marker))
+
+    def test_independent_script_without_shebang(self):
+        with open(os.path.join(self.config, "20-free.sh"), "w") as io:
+            io.write("# payara5-setup: independent\necho free\n")
+        (code, out, err) = self.run_main()
+        self.assertEqual(0, code, err)
+        self.assertIn("[20-free.sh] free\n", out)
+
+    def test_failed_task(self):
+        self.script("10-ordered.sh", "echo ordered\n")
+        (code, out, err) = self.run_main("--task", "bad=exit 2", "--task", "after:bad=echo never",
+                                         "--task-timeout", "bad=10")
+        self.assertEqual(1, code)
+        self.assertIn("Task bad: failed", err)
+        self.assertIn("Task after: skipped", err)
+        self.assertNotIn("never", out)
+
+    def test_invalid_tasks(self):
+        (code, out, err) = self.run_main("--task", "a:b=true")
+        self.assertEqual(2, code)
+        self.assertIn("Unknown dependency b", err)
+
+
+class TestKeepGoing(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.payara = os.path.join(self.dir.name, "payara5")
+        self.location = PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(self.payara))
+        os.makedirs(os.path.dirname(self.location))
+        shutil.copy(os.path.join(ROOT, "xmltools", "tests", "domain_orig.xml"), self.location)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    @staticmethod
+    def plan(name: str, fail: bool) -> Plan:
+        plan = Plan()
+        plan.extend([CustomResourcePrimitive("java.lang.String", name, "v", True), ResourceRef(name),
+                     JvmOptions(False, ("-D%s=1" % name,), ("-Xmx512m",))])
+        if fail:
+            plan.extend([PropsAt("nowhere", {"a": "1"})])
+        return plan
+
+    def test_failing_file_is_rolled_back(self):
+        cfg = PayaraConfig(self.payara)
+        before = cfg.domain_xml.xml.to_xml()
+        with self.assertRaisesRegex(Exception, "Node not found"):
+            cfg.process("10-bad.cres", self.plan("jndi/bad", True))
+        self.assertEqual(before, cfg.domain_xml.xml.to_xml())
+
+    def test_keep_going(self):
+        cfg = PayaraConfig(self.payara, keep_going=True)
+        cfg.process("10-bad.cres", self.plan("jndi/bad", True))
+        cfg.process("20-good.cres", self.plan("jndi/good", False))
+        cfg.done()
+        self.assertEqual(["10-bad.cres"], [src for (src, _) in cfg.failed])
+        with open(self.location) as io:
+            content = io.read()
+        self.assertIn('ref="jndi/good"', content)
+        self.assertIn('-Djndi/good=1', content)
+        self.assertNotIn('jndi/bad', content)
+
+    def test_keep_going_drops_queued_jars(self):
+        lib = os.path.join(self.dir.name, "lib")
+        jars = []
+        for name in ("bad", "good"):
+            jars.append(os.path.join(self.dir.name, name + ".jar"))
+            with open(jars[-1], "w") as io:
+                io.write(name)
+        cache = ResultCache(os.path.join(self.dir.name, "cache"))
+        host = cache.recorder(JarInstaller())
+        cfg = PayaraConfig(self.payara, host=host, keep_going=True)
+        good = self.plan("jndi/good", False)
+        good.install(jars[1], lib)
+        cfg.process("10-good.cres", good)
+        bad = Plan()
+        bad.install(jars[0], lib)
+        bad.extend(self.plan("jndi/bad", True))
+        cfg.process("20-bad.cres", bad)
+        cfg.done()
+        self.assertEqual(["20-bad.cres"], [src for (src, _) in cfg.failed])
+        self.assertEqual(["good.jar"], os.listdir(lib))
+        self.assertEqual([(jars[1], lib)], host.installs)
+
+    def test_command_line(self):
+        config = os.path.join(self.dir.name, "config")
+        os.mkdir(config)
+        with open(os.path.join(config, "10-bad.cres.jsonl"), "w") as io:
+            io.write('{"name": "jndi/bad"}\n')
+        with open(os.path.join(config, "20-good.cres.jsonl"), "w") as io:
+            io.write('{"name": "jndi/good", "value": "v"}\n')
+        command = [sys.executable, os.path.join(ROOT, "payara5-setup"), "--no-cache", self.payara, config]
+        completed = subprocess.run(command + ["--keep-going"], cwd=ROOT, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+        self.assertEqual(1, completed.returncode)
+        self.assertIn("Skipped 10-bad.cres.jsonl: Missing value", completed.stderr)
+        self.assertIn("Skipped 1 file(s): 10-bad.cres.jsonl", completed.stderr)
+        with open(self.location) as io:
+            self.assertIn('jndi-name="jndi/good"', io.read())
+
+
+class TestRestart(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.payara = os.path.join(self.dir.name, "payara5")
+        self.location = PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(self.payara))
+        os.makedirs(os.path.dirname(self.location))
+        shutil.copy(os.path.join(ROOT, "xmltools", "tests", "domain_orig.xml"), self.location)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_twice(self, *environs) -> list:
+        config = os.path.join(self.dir.name, "config")
+        os.mkdir(config)
+        with open(os.path.join(config, "10-a.cres.jsonl"), "w") as io:
+            io.write('{"name": "jndi/a", "value": "v"}\n')
+        command = [sys.executable, os.path.join(ROOT, "payara5-setup"), "--cache-dir",
+                   os.path.join(self.dir.name, "cache"), self.payara, config]
+        outputs = []
+        for environ in environs:
+            completed = subprocess.run(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       universal_newlines=True, timeout=60, env=dict(os.environ, **environ))
+            self.assertEqual(0, completed.returncode, completed.stderr)
+            with open(self.location) as io:
+                outputs.append(io.read())
+            outputs.append(completed.stdout)
+        return outputs
+
+    def test_restart_hits_the_cache(self):
+        outputs = self.run_twice({}, {})
+        self.assertIn('jndi-name="jndi/a"', outputs[0])
+        self.assertNotIn("Restored from cache", outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+        self.assertIn("Restored from cache", outputs[3])
+        with open(os.path.join(ROOT, "xmltools", "tests", "domain_orig.xml")) as orig, \
+                open(self.location + ".orig") as io:
+            self.assertEqual(orig.read(), io.read())
+
+
+    @skipUnless("lxml" in backend.available(), "lxml is not installed")
+    def test_backend_is_in_the_key(self):
+        outputs = self.run_twice({"XMLTOOLS_BACKEND": "etree"}, {"XMLTOOLS_BACKEND": "lxml"})
+        self.assertNotIn("Restored from cache", outputs[3])
+        self.assertNotEqual(outputs[0], outputs[2])
+
+
+class TestProcessAll(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        location = PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(self.dir.name))
+        os.makedirs(os.path.dirname(location))
+        shutil.copy(os.path.join(ROOT, "xmltools", "tests", "domain_orig.xml"), location)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name: str, content: str) -> str:
+        location = os.path.join(self.dir.name, name)
+        with open(location, "w") as io:
+            io.write(content)
+        return location
+
+    def test_files_after_a_script_are_parsed_after_it(self):
+        later = os.path.join(self.dir.name, "30-b.txt")
+        files = [self.write("10-a.txt", "a\n"),
+                 self.write("20-gen.sh", "echo generated > %s\n" % later),
+                 self.write("30-b.txt", "stale\n")]
+        host = Echoes()
+        PayaraConfig(self.dir.name, host=host).process_all(files, jobs=4)
+        self.assertEqual(["a\n", "generated\n"], host.echoes)
+
+
+class TestBatchCommand(TestCase):
+
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = os.path.join(directory, "config")
+            os.mkdir(config)
+            with open(os.path.join(config, "10-hello.txt"), "w") as io:
+                io.write("hello\n")
+            with open(os.path.join(directory, "variants.jsonl"), "w") as io:
+                io.write('{"ENV": "a"}\n{"ENV": "b"}\n')
+            completed = subprocess.run([sys.executable, os.path.join(ROOT, "payara5-setup"), "batch",
+                                        "-o", os.path.join(directory, "out", "{ENV}-{n}.xml"),
+                                        os.path.join(ROOT, "xmltools", "tests", "domain_orig.xml"),
+                                        os.path.join(directory, "variants.jsonl"), config],
+                                       cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       universal_newlines=True, timeout=60)
+            self.assertEqual(0, completed.returncode, completed.stderr)
+            self.assertIn("Rendered 2 of 2 variants", completed.stdout)
+            self.assertNotIn("hello", completed.stdout)
+            self.assertEqual(["a-1.xml", "b-2.xml"], sorted(os.listdir(os.path.join(directory, "out"))))
+
+
+class TestBulkFiles(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cfg = PayaraConfig(self.dir.name)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name: str, content: str) -> str:
+        location = os.path.join(self.dir.name, name)
+        with open(location, "w") as io:
+            io.write(content)
+        return location
+
+    def test_names(self):
+        self.assertTrue(PayaraConfig.validate_name("10-many.cres.jsonl"))
+        self.assertTrue(PayaraConfig.validate_name("10-pools.jdbc.csv"))
+        self.assertFalse(PayaraConfig.validate_name("10-a.b.c.cres"))
+        # Disabled by renaming
+        self.assertFalse(PayaraConfig.validate_name("10-db.jdbc.disabled"))
+        self.assertFalse(PayaraConfig.validate_name("10-x.cres.bak"))
+        self.assertTrue(PayaraConfig.validate_name("10-db.jdbc"))
+
+    def test_cres_jsonl(self):
+        src = self.write("10-many.cres.jsonl", '{"name": "jndi/s", "value": "text"}\n'
+                                               '{"type": "bool", "name": "jndi/b", "value": true}\n'
+                                               '{"type": "props", "name": "jndi/p", "props": {"a": "1"}}\n')
+        self.assertEqual([CustomResourcePrimitive("java.lang.String", "jndi/s", "text", False),
+                          ResourceRef("jndi/s"),
+                          CustomResourcePrimitive("java.lang.Boolean", "jndi/b", "true", False),
+                          ResourceRef("jndi/b"),
+                          CustomResourceProps("jndi/p", {"a": "1"}, False),
+                          ResourceRef("jndi/p")], list(self.cfg.parse(src)))
+
+    def test_cres_jsonl_unknown_type(self):
+        src = self.write("10-many.cres.jsonl", '{"type": "x", "name": "jndi/s", "value": "text"}\n')
+        with self.assertRaisesRegex(SyntaxError, "Unknown type: `x' at: 10-many.cres.jsonl:1"):
+            self.cfg.parse(src)
+
+    def test_jdbc_csv(self):
+        src = self.write("10-pools.jdbc.csv", "jndi-name,connection,max-pool-size,ApplicationName\n"
+                                              "jdbc/a,user:pw@db-a/base,8,\n"
+                                              "jdbc/b,db-b:5433/other,,app\n")
+        (a, ref_a, b, ref_b) = list(self.cfg.parse(src))
+        self.assertEqual(("jdbc/a", "8", "user", "db-a", "5432", "base"),
+                         (a.name, a.attribs["max-pool-size"], a.props["User"], a.props["ServerName"],
+                          a.props["PortNumber"], a.props["DatabaseName"]))
+        self.assertNotIn("max-pool-size", a.props)
+        self.assertNotIn("ApplicationName", a.props)
+        self.assertEqual(("db-b", "5433", "app"), (b.props["ServerName"], b.props["PortNumber"],
+                                                   b.props["ApplicationName"]))
+        self.assertEqual(PayaraConfig._JDBC_RULES_DEFAULT['attribs']["ping"], b.attribs["ping"])
+
+    def test_jdbc_csv_requires_name(self):
+        src = self.write("10-pools.jdbc.csv", "connection\nuser:pw@db-a/base\n")
+        with self.assertRaisesRegex(SyntaxError, "Missing jndi-name at: 10-pools.jdbc.csv:2"):
+            self.cfg.parse(src)
+
+
+class TestStreamedBulkFiles(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.payara = os.path.join(self.dir.name, "payara5")
+        self.location = PayaraConfig.domain_xml_of(PayaraConfig.domain_dir(self.payara))
+        os.makedirs(os.path.dirname(self.location))
+        shutil.copy(os.path.join(ROOT, "xmltools", "tests", "domain_orig.xml"), self.location)
+        self.src = os.path.join(self.dir.name, "10-many.cres.jsonl")
+        self.batch_size = StreamingPlan.BATCH_SIZE
+        StreamingPlan.BATCH_SIZE = 10
+
+    def tearDown(self):
+        StreamingPlan.BATCH_SIZE = self.batch_size
+        self.dir.cleanup()
+
+    def write(self, count: int, last: str = None):
+        with open(self.src, "w") as io:
+            for n in range(count):
+                io.write('{"name": "jndi/s%d", "value": "v%d"}\n' % (n, n))
+            if last is not None:
+                io.write(last + "\n")
+
+    def test_applied_while_read(self):
+        self.write(45)
+        cfg = PayaraConfig(self.payara)
+        domain_xml = cfg.domain_xml
+        read = [0]
+        calls = []
+
+        def counted(src, environ=None):
+            for record in jsonl(src, environ):
+                read[0] += 1
+                yield record
+
+        def bulk(resources, ref=True):
+            resources = list(resources)
+            calls.append((read[0], len(resources)))
+            upsert(resources, ref=ref)
+
+        upsert = domain_xml.custom_resources_primitive
+        domain_xml.custom_resources_primitive = bulk
+        records.jsonl = counted
+        try:
+            cfg.process(self.src)
+        finally:
+            records.jsonl = jsonl
+        self.assertEqual([(11, 10), (21, 10), (31, 10), (41, 10), (45, 5)], calls)
+
+        planned = PayaraConfig(self.payara, planning=True)
+        planned.process(self.src)
+        planned.done()
+        with open(self.location) as io:
+            self.assertEqual(io.read(), domain_xml.xml.to_xml())
+
+    def test_failing_file_is_rolled_back(self):
+        self.write(25, '{"name": "jndi/bad"}')
+        cfg = PayaraConfig(self.payara)
+        before = cfg.domain_xml.xml.to_xml()
+        with self.assertRaisesRegex(SyntaxError, "Missing value"):
+            cfg.process(self.src)
+        self.assertEqual(before, cfg.domain_xml.xml.to_xml())
@@ -1,5 +1,6 @@
 import hashlib
 import os
+import tempfile
 from unittest import TestCase
 
 from xmltools.manipulation import XmlManipulator
@@ -34,12 +35,21 @@ def md5(filename):
 
 class TestDomainXml(XmlTestCase):
 
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def out(self, name: str) -> str:
+        return os.path.join(self._tmp.name, name)
+
     def test_foo(self):
         domain_xml = DomainXml("domain_orig.xml")
-        domain_xml.save("domain2.xml")
-        domain_xml.save("domain3.xml")
-        md5_old = md5("domain2.xml")
-        md5_new = md5("domain3.xml")
+        domain_xml.save(self.out("domain2.xml"))
+        domain_xml.save(self.out("domain3.xml"))
+        md5_old = md5(self.out("domain2.xml"))
+        md5_new = md5(self.out("domain3.xml"))
         self.assertEqual(md5_old, md5_new)
 
     def test_ensure(self):
@@ -47,11 +57,11 @@ class TestDomainXml(XmlTestCase):
         domain_xml._ensure('servers/server[@name="server"]', "application-ref", {"ref": "app", "virtual-servers": "server"})
         self.assertInOrder(domain_xml, "<servers>", "<server", "<application-ref", "ref=\"app\"", "</server>", "</servers>")
 
-        domain_xml.save("domain2.xml")
-        md5_old = md5("domain2.xml")
+        domain_xml.save(self.out("domain2.xml"))
+        md5_old = md5(self.out("domain2.xml"))
         domain_xml._ensure('servers/server[@name="server"]', "application-ref", {"ref": "app", "virtual-servers": "server"})
-        domain_xml.save("domain3.xml")
-        md5_new = md5("domain3.xml")
+        domain_xml.save(self.out("domain3.xml"))
+        md5_new = md5(self.out("domain3.xml"))
         self.assertEqual(md5_old, md5_new)
 
     def test_ensure_app(self):
@@ -74,7 +84,45 @@ class TestDomainXml(XmlTestCase):
             .element("engine", {"sniffer": "security"}).done() \
             .element("engine", {"sniffer": "web"}).done() \
             .done()
-        domain_xml.save("domain.xml")
+        domain_xml.save(self.out("domain.xml"))
 
         text = domain_xml._xml.to_xml()
         print(text)
+
+    def test_save(self):
+        domain_xml = DomainXml("domain_orig.xml")
+        domain_xml.system_property("key", "value")
+        self.assertTrue(domain_xml.save(self.out("domain2.xml")))
+        with open(self.out("domain2.xml"), "rb") as io:
+            self.assertEqual(domain_xml.xml.to_xml().encode("UTF-8"), io.read())
+        self.assertFalse(domain_xml.save(self.out("domain2.xml"), skip_unchanged=True))
+        self.assertTrue(domain_xml.save(self.out("domain2.xml"), fsync=True))
+
+    def test_bulk_same_as_single(self):
+        primitives = [("java.lang.String", "jndi/a", "a"), ("java.lang.Integer", "jndi/b", "1"),
+                      ("java.lang.String", "jndi/a", "again")]
+        props = [("jndi/props", {"x": "y"})]
+        jdbc = [("jdbc/a", {"ping": "true"}, {"User": "u"}), ("jdbc/__default", {}, {})]
+        jms = [("jms/q", {"res-type": "javax.jms.Queue"}, {"Name": "q"})]
+        single = DomainXml("domain_orig.xml")
+        for spec in primitives:
+            single.custom_resource_primitive(*spec)
+        for spec in props:
+            single.custom_resource_props(*spec)
+        for spec in jdbc:
+            single.jdbc_resource(*spec)
+        for spec in jms:
+            single.jms_destination_resource(*spec)
+        bulk = DomainXml("domain_orig.xml")
+        bulk.custom_resources_primitive(iter(primitives))
+        bulk.custom_resources_props(props)
+        bulk.jdbc_resources(jdbc)
+        bulk.jms_destination_resources(jms)
+        self.assertEqual(single.xml.to_xml(), bulk.xml.to_xml())
+
+    def test_resource_refs(self):
+        domain_xml = DomainXml("domain_orig.xml")
+        domain_xml.resource_refs(["jdbc/__default", "jndi/a", "jndi/b", "jndi/a"])
+        refs = domain_xml.xml._findall('servers/server[@name="server"]/resource-ref')
+        self.assertEqual(["jdbc/__TimerPool", "jdbc/__default", "jdbc/__derby", "jndi/a", "jndi/b"],
+                         [ref.get("ref") for ref in refs])
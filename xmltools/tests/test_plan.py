@@ -0,0 +1,164 @@
+import os
+import pickle
+from unittest import TestCase
+
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.plan import Plan, JvmOptions, ResourceRef, JdbcResource, App, Osgi, Remove
+
+from helpers import Recorder
+
+if os.path.isdir(os.path.join("xmltools", "tests")):
+    os.chdir(os.path.join("xmltools", "tests"))
+
+
+def record(plan: Plan) -> None:
+    plan.echo("hello")
+    plan.app("app", "/tmp/app.war", "/")
+    plan.jdbc_resource("jdbc/db", {"ping": "true"}, {"User": "a"})
+    plan.custom_resource_primitive("java.lang.String", "jndi/str", "v1")
+    plan.install("/tmp/foo.jar", "/tmp/lib")
+    plan.jvm_options(False, ["-Xmx1G", "-Dfoo=1"], ["-Xmx*"])
+    plan.system_property("key", "v1")
+    plan.jdbc_resource("jdbc/other", {}, {})
+    plan.jdbc_resource("jdbc/db", {"ping": "false"}, {"User": "b"})
+    plan.jms_factory_resource("jms/factory", {}, {"x": "y"})
+    plan.osgi("app", "/tmp/app.jar")
+    plan.app("app", "/tmp/app2.war", "/x")
+    plan.jvm_options(False, ["-Xms1G"], ["-Dfoo=*"])
+    plan.system_property("key", "v2")
+    plan.custom_resource_props("jndi/props", {"a": "b"})
+    plan.set_attr('configs/config[@name="server-config"]/java-config', "debug-enabled", "true")
+    plan.jdbc_resource("jdbc/db", {"ping": "x"}, {})
+    plan.jms_destination_resource("jms/queue", {}, {"Name": "q"})
+    plan.jms_destination_resource("jms/queue", {"enabled": "false"}, {"Name": "q"})
+    plan.run("/tmp/script.sh")
+    plan.jvm_options(True, ["-server"], [])
+    plan.jvm_options(False, ["-Xmx2G"], ["-server"])
+
+
+class TestPlan(TestCase):
+
+    def test_coalesce_is_identical(self):
+        plan = Plan()
+        record(plan)
+        direct = DomainXml("domain_orig.xml")
+        direct_host = Recorder()
+        plan.apply(direct, direct_host)
+        coalesced = DomainXml("domain_orig.xml")
+        coalesced_host = Recorder()
+        plan.apply(coalesced, coalesced_host, coalesce=True)
+        self.assertEqual(direct.xml.to_xml(), coalesced.xml.to_xml())
+        self.assertEqual(direct_host.calls, coalesced_host.calls)
+        self.assertLess(len(plan.coalesced()), len(plan))
+
+    def test_same_as_domain_xml(self):
+        plan = Plan()
+        plan.jdbc_resource("jdbc/db", {"ping": "true"}, {"User": "a"})
+        plan.custom_resource_primitive("java.lang.Integer", "jndi/int", "1")
+        plan.jvm_options(False, ["-Xmx1G"], ["-Xmx*"])
+        planned = DomainXml("domain_orig.xml")
+        plan.apply(planned)
+        direct = DomainXml("domain_orig.xml")
+        direct.jdbc_resource("jdbc/db", {"ping": "true"}, {"User": "a"})
+        direct.custom_resource_primitive("java.lang.Integer", "jndi/int", "1")
+        direct.jvm_options(False, {"-Xmx1G"}, {"-Xmx*"})
+        self.assertEqual(direct.xml.to_xml(), planned.xml.to_xml())
+
+    def test_batched_same_as_domain_xml(self):
+        plan = Plan()
+        plan.custom_resources_primitive([("java.lang.String", "jndi/a", "a"), ("java.lang.String", "jndi/b", "b")])
+        plan.custom_resource_primitive("java.lang.String", "jndi/a", "again")
+        plan.jms_destination_resource("jms/q", {}, {"Name": "q"})
+        plan.custom_resource_props("jndi/props", {"x": "y"})
+        plan.jdbc_resource("jdbc/db", {}, {"User": "a"})
+        plan.remove('servers/server/resource-ref[@ref="jndi/b"]')
+        plan.custom_resource_primitive("java.lang.String", "jndi/b", "b")
+        planned = DomainXml("domain_orig.xml")
+        plan.apply(planned)
+        direct = DomainXml("domain_orig.xml")
+        for operation in plan:
+            operation.apply(direct, None)
+        self.assertEqual(direct.xml.to_xml(), planned.xml.to_xml())
+
+    def test_long_runs_are_chunked(self):
+        plan = Plan()
+        plan.custom_resources_primitive(("java.lang.String", "jndi/%d" % i, str(i)) for i in range(25))
+        plan.BATCH_SIZE = 10
+        planned = DomainXml("domain_orig.xml")
+        calls = []
+        batch = planned.custom_resources_primitive
+        planned.custom_resources_primitive = lambda resources, ref: calls.append(len(resources)) or \
+            batch(resources, ref=ref)
+        plan.apply(planned)
+        self.assertEqual([10, 10, 5], calls)
+        direct = DomainXml("domain_orig.xml")
+        for operation in plan:
+            operation.apply(direct, None)
+        self.assertEqual(direct.xml.to_xml(), planned.xml.to_xml())
+
+    def test_refs_merged(self):
+        plan = Plan()
+        plan.jdbc_resource("jdbc/db", {}, {})
+        plan.custom_resource_primitive("java.lang.String", "jdbc/db", "v")
+        self.assertEqual(1, len([op for op in plan.coalesced() if isinstance(op, ResourceRef)]))
+
+    def test_upsert_keeps_first_position(self):
+        plan = Plan()
+        plan.jdbc_resource("jdbc/a", {"v": "1"}, {})
+        plan.jdbc_resource("jdbc/b", {}, {})
+        plan.jdbc_resource("jdbc/a", {"v": "2"}, {})
+        ops = [op for op in plan.coalesced() if isinstance(op, JdbcResource)]
+        self.assertEqual(["jdbc/a", "jdbc/b"], [op.name for op in ops])
+        self.assertEqual({"v": "2"}, ops[0].attribs)
+
+    def test_upsert_of_other_type_is_kept(self):
+        plan = Plan()
+        plan.app("a", "/a.war")
+        plan.osgi("a", "/a.jar")
+        plan.app("a", "/b.war")
+        self.assertEqual([App, Osgi, App], [type(op) for op in plan.coalesced()])
+
+    def test_barrier(self):
+        plan = Plan()
+        plan.jdbc_resource("jdbc/a", {}, {})
+        plan.remove('resources/jdbc-connection-pool')
+        plan.jdbc_resource("jdbc/a", {}, {})
+        self.assertEqual(5, len(plan.coalesced()))
+        self.assertIsInstance(plan.coalesced()[2], Remove)
+
+    def test_jvm_merged(self):
+        plan = Plan()
+        plan.jvm_options(False, ["-Xmx1G", "-Da=1", "-Db=1"], ["-Xmx*"])
+        plan.jvm_options(False, ["-Xmx2G", "-Db=2"], ["-Da*", "-Xmx*"])
+        self.assertEqual([JvmOptions(False, ("-Db=2", "-Xmx2G"), ("-Xmx*", "-Da*"))], plan.coalesced())
+
+    def test_jvm_not_merged(self):
+        # A remove matching the replaced option, or the one replacing it, but not both
+        for (adds, removes) in ((["-Djava.awt.headless=false"], ["-Djava.awt.headless=f*"]),
+                                (["-Djava.awt.headless=false"], ["-Djava.awt.headless=true"])):
+            plan = Plan()
+            plan.jvm_options(False, adds, [])
+            plan.jvm_options(False, [], removes)
+            self.assertEqual(2, len(plan.coalesced()))
+            planned = DomainXml("domain_orig.xml")
+            plan.apply(planned, coalesce=True)
+            direct = DomainXml("domain_orig.xml")
+            plan.apply(direct)
+            self.assertEqual(direct.xml.to_xml(), planned.xml.to_xml())
+
+    def test_jvm_reports(self):
+        plan = Plan()
+        plan.jvm_options(False, ["-Xmx1G"], [])
+        plan.jvm_options(False, ["-Xmx2G"], [])
+        plan.jvm_options(False, ["-Dnew=1"], [])
+        reports = plan.apply(DomainXml("domain_orig.xml"))
+        self.assertEqual([["JVM option -Xmx512m overridden by -Xmx1G"], ["JVM option -Xmx1G overridden by -Xmx2G"]],
+                         [report.lines() for report in reports])
+        # Merged, the options don't conflict
+        reports = plan.apply(DomainXml("domain_orig.xml"), coalesce=True)
+        self.assertEqual([["JVM option -Xmx512m overridden by -Xmx2G"]], [report.lines() for report in reports])
+
+    def test_pickle(self):
+        plan = Plan()
+        record(plan)
+        self.assertEqual(list(plan), list(pickle.loads(pickle.dumps(plan))))
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from xmltools.records import csv_rows, jsonl
+
+
+class TestRecords(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name: str, content: str) -> str:
+        location = os.path.join(self.dir.name, name)
+        with open(location, "w") as io:
+            io.write(content)
+        return location
+
+    def test_jsonl(self):
+        src = self.write("1-a.cres.jsonl", '{"name": "a", "value": "${X|x}"}\n\n# comment\n'
+                                           '{"name": "b", "value": 2, "flag": true, "props": {"k": "${Y}"}}\n')
+        found = [(r.line, r.fields) for r in jsonl(src, {"Y": "y"})]
+        self.assertEqual([(1, {"name": "a", "value": "x"}),
+                          (4, {"name": "b", "value": "2", "flag": "true", "props": {"k": "y"}})], found)
+
+    def test_jsonl_is_streamed(self):
+        src = self.write("1-a.cres.jsonl", '{"name": "a"}\nnot json\n')
+        records = jsonl(src, {})
+        self.assertEqual("a", next(records).string("name"))
+        with self.assertRaisesRegex(SyntaxError, "1-a.cres.jsonl:2"):
+            next(records)
+
+    def test_jsonl_errors(self):
+        with self.assertRaisesRegex(SyntaxError, "Expected an object"):
+            list(jsonl(self.write("a.jsonl", '["a"]\n'), {}))
+        with self.assertRaisesRegex(SyntaxError, "not set: X at: a.jsonl:1"):
+            list(jsonl(self.write("a.jsonl", '{"name": "${X}"}\n'), {}))
+        with self.assertRaisesRegex(SyntaxError, "Missing value at: a.jsonl:1"):
+            next(jsonl(self.write("a.jsonl", '{"name": "a"}\n'), {})).string("value")
+
+    def test_csv(self):
+        src = self.write("1-a.jdbc.csv", 'jndi-name, connection ,User\n'
+                                         'jdbc/a,"u:p@h/db",${U|me}\n'
+                                         ',,\n'
+                                         'jdbc/b,,\n')
+        self.assertEqual([(2, {"jndi-name": "jdbc/a", "connection": "u:p@h/db", "User": "me"}),
+                          (4, {"jndi-name": "jdbc/b"})],
+                         [(r.line, r.fields) for r in csv_rows(src, {})])
+        with self.assertRaisesRegex(SyntaxError, "More cells"):
+            list(csv_rows(self.write("b.csv", "a\n1,2\n"), {}))
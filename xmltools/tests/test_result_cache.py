@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from xmltools.result_cache import ResultCache
+
+from helpers import Recorder
+
+
+class TestResultCache(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.dir = self._tmp.name
+        self.domain_xml = self.file("domain.xml", "<domain/>")
+        self.cfg = self.file("10-a.sys", "a = ${TEST_CACHE_VAR|x}\n")
+        self.jar = self.file("a.jar", "jar")
+        self.cache = ResultCache(os.path.join(self.dir, "cache"))
+        os.environ.pop("TEST_CACHE_VAR", None)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+        os.environ.pop("TEST_CACHE_VAR", None)
+
+    def file(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "w") as io:
+            io.write(content)
+        return path
+
+    def run_and_store(self):
+        key = self.cache.key(self.dir, self.domain_xml, [self.cfg])
+        recorder = self.cache.recorder(Recorder())
+        recorder.install(self.jar, "/lib")
+        recorder.echo("hello")
+        self.file("domain.xml", "<domain><done/></domain>")
+        self.cache.store(key, self.domain_xml, recorder)
+        self.file("domain.xml", "<domain/>")
+        return key
+
+    def test_hit(self):
+        key = self.run_and_store()
+        self.assertEqual(key, self.cache.key(self.dir, self.domain_xml, [self.cfg]))
+        host = Recorder()
+        self.assertTrue(self.cache.restore(key, self.domain_xml, host))
+        with open(self.domain_xml) as io:
+            self.assertEqual("<domain><done/></domain>", io.read())
+        self.assertEqual([("install", self.jar, "/lib"), ("echo", "hello")], host.calls)
+
+    def test_key_covers_input(self):
+        key = self.cache.key(self.dir, self.domain_xml, [self.cfg])
+        os.environ["TEST_CACHE_VAR"] = "y"
+        self.assertNotEqual(key, self.cache.key(self.dir, self.domain_xml, [self.cfg]))
+        os.environ.pop("TEST_CACHE_VAR")
+        self.file("10-a.sys", "a = b\n")
+        self.assertNotEqual(key, self.cache.key(self.dir, self.domain_xml, [self.cfg]))
+        self.file("10-a.sys", "a = ${TEST_CACHE_VAR|x}\n")
+        self.file("domain.xml", "<domain a='1'/>")
+        self.assertNotEqual(key, self.cache.key(self.dir, self.domain_xml, [self.cfg]))
+
+    def test_miss_on_changed_jar(self):
+        key = self.run_and_store()
+        os.utime(self.jar, ns=(0, 0))
+        self.assertFalse(self.cache.restore(key, self.domain_xml, Recorder()))
+
+    def test_scripts(self):
+        self.assertFalse(ResultCache.cacheable([self.cfg, self.file("20-a.sh", "#!/bin/sh\n")]))
+        self.assertTrue(ResultCache.cacheable([self.file("20-a.sh", "#!/bin/sh\n# payara5-setup: cacheable\n")]))
+
+    def test_eviction(self):
+        self.cache = ResultCache(os.path.join(self.dir, "cache"), 1)
+        key = self.run_and_store()
+        self.assertFalse(self.cache.restore(key, self.domain_xml, Recorder()))
+
+    def test_lru(self):
+        first = self.run_and_store()
+        self.file("10-a.sys", "a = b\n")
+        second = self.run_and_store()
+        entry = os.path.join(self.dir, "cache", second, "entry.json")
+        os.utime(entry, (time.time() - 60, time.time() - 60))
+        size = sum(os.path.getsize(os.path.join(self.dir, "cache", first, name))
+                   for name in os.listdir(os.path.join(self.dir, "cache", first)))
+        ResultCache(os.path.join(self.dir, "cache"), size).evict()
+        self.assertTrue(os.path.isdir(os.path.join(self.dir, "cache", first)))
+        self.assertFalse(os.path.isdir(os.path.join(self.dir, "cache", second)))
+
+    def test_pristine(self):
+        pristine = ResultCache.pristine(self.domain_xml)
+        key = self.cache.key(self.dir, pristine, [self.cfg])
+        # The run rewrites domain.xml, a restart still starts from the copy
+        self.file("domain.xml", "<domain><done/></domain>")
+        self.assertEqual(pristine, ResultCache.pristine(self.domain_xml))
+        with open(pristine) as io:
+            self.assertEqual("<domain/>", io.read())
+        self.assertEqual(key, self.cache.key(self.dir, pristine, [self.cfg]))
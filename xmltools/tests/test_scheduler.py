@@ -0,0 +1,81 @@
+import io
+import sys
+import threading
+import time
+from unittest import TestCase
+
+from xmltools.scheduler import Scheduler, parse_task
+
+
+class TestScheduler(TestCase):
+
+    def test_parse_task(self):
+        self.assertEqual(("log", (), "payara-log-setup a b"), parse_task("log=payara-log-setup a b"))
+        self.assertEqual(("pw", ("domain.xml", "log"), "x=1 y"), parse_task("pw:domain.xml,log=x=1 y"))
+        with self.assertRaises(ValueError):
+            parse_task("no command")
+
+    def test_order(self):
+        scheduler = Scheduler()
+        scheduler.add("c", lambda: 0, ("b",))
+        scheduler.add("b", lambda: 0, ("a",))
+        scheduler.add("a", lambda: 0)
+        self.assertEqual(["a", "b", "c"], scheduler.order())
+        with self.assertRaises(ValueError):
+            scheduler.add("a", lambda: 0)
+
+    def test_cycle_and_unknown(self):
+        scheduler = Scheduler()
+        scheduler.add("a", lambda: 0, ("b",))
+        scheduler.add("b", lambda: 0, ("a",))
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            scheduler.run()
+        scheduler = Scheduler()
+        scheduler.add("a", lambda: 0, ("x",))
+        with self.assertRaisesRegex(ValueError, "Unknown"):
+            scheduler.run()
+
+    def test_concurrent(self):
+        # Both tasks have to be running at the same time to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+        scheduler = Scheduler()
+        scheduler.add("a", lambda: barrier.wait() and 0)
+        scheduler.add("b", lambda: barrier.wait() and 0)
+        results = scheduler.run()
+        self.assertEqual(['ok', 'ok'], [result.status for result in results.values()])
+
+    def test_dependencies(self):
+        done = []
+        scheduler = Scheduler()
+        scheduler.add("second", lambda: done.append("second"), ("first",))
+        scheduler.add("first", lambda: time.sleep(0.05) or done.append("first"))
+        scheduler.run()
+        self.assertEqual(["first", "second"], done)
+
+    def test_failure_skips_dependents(self):
+        scheduler = Scheduler(out=io.StringIO())
+        scheduler.add("broken", lambda: 1 / 0)
+        scheduler.add("after", lambda: 0, ("broken",))
+        scheduler.add("exit", [sys.executable, "-c", "raise SystemExit(3)"])
+        results = scheduler.run()
+        self.assertEqual('failed', results["broken"].status)
+        self.assertIsInstance(results["broken"].error, ZeroDivisionError)
+        self.assertEqual('skipped', results["after"].status)
+        self.assertEqual(('failed', 3), results["exit"][:2])
+
+    def test_output_is_prefixed(self):
+        out = io.StringIO()
+        scheduler = Scheduler(out=out)
+        scheduler.add("hello", "echo one; echo two 1>&2; printf three")
+        self.assertEqual('ok', scheduler.run()["hello"].status)
+        self.assertEqual("[hello] one\n[hello] two\n[hello] three\n", out.getvalue())
+
+    def test_timeout(self):
+        out = io.StringIO()
+        scheduler = Scheduler(out=out)
+        scheduler.add("slow", "sleep 10 & sleep 10; echo never", timeout=0.2)
+        before = time.perf_counter()
+        result = scheduler.run()["slow"]
+        self.assertLess(time.perf_counter() - before, 5)
+        self.assertEqual('timeout', result.status)
+        self.assertNotIn("never", out.getvalue())
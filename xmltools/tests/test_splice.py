@@ -0,0 +1,159 @@
+import os
+from io import BytesIO
+from unittest import TestCase
+from xml.etree import ElementTree as ET
+
+from xmltools.manipulation import XmlManipulator
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.splice import SourceMap, Unsupported
+
+DOMAIN_XML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domain_orig.xml")
+
+
+def write(xml) -> bytes:
+    out = BytesIO()
+    xml.write(out)
+    return out.getvalue()
+
+
+class TestSplice(TestCase):
+
+    def assertSameXml(self, expected: bytes, actual: bytes):
+        self.assertEqual(ET.canonicalize(expected.decode("UTF-8"), strip_text=True),
+                         ET.canonicalize(actual.decode("UTF-8"), strip_text=True))
+
+    def test_unmodified_is_identical(self):
+        with open(DOMAIN_XML, "rb") as io:
+            content = io.read()
+        x = XmlManipulator(content, preserve=True)
+        self.assertEqual(content, write(x))
+        self.assertEqual(len(content), x._tree.source.copied)
+        self.assertEqual(0, x._tree.source.serialized)
+
+    def test_same_tree_as_elementtree(self):
+        with open(DOMAIN_XML, "rb") as io:
+            content = io.read()
+        (root, _) = SourceMap.parse(content)
+        self.assertEqual(ET.tostring(ET.fromstring(content)), ET.tostring(root))
+
+    def test_domain_xml(self):
+        spliced = DomainXml(DOMAIN_XML, preserve=True)
+        full = DomainXml(DOMAIN_XML)
+        for domain_xml in (spliced, full):
+            domain_xml.custom_resource_primitive("java.lang.String", "jndi/a", "a<b")
+            domain_xml.system_property("x", "y")
+            domain_xml.jvm_options(False, {"-Xmx1g"}, {"-Xmx*"})
+            domain_xml.attrs_at('configs/config[@name="server-config"]/admin-service', {"type": "das"})
+        self.assertSameXml(write(full.xml), write(spliced.xml))
+        content = write(spliced.xml).decode("UTF-8")
+        with open(DOMAIN_XML, "r") as io:
+            original = io.read()
+        # Comments and formatting outside the modified elements survive
+        self.assertTrue(content.startswith(original[:original.index("<domain")]))
+        self.assertIn("<!--PAYARA-495-->", content)
+        self.assertIn('<jvm-options>-Xmx1g</jvm-options>', content)
+        self.assertEqual(original.count('-Xmx512m') - 1, content.count('-Xmx512m'))
+        self.assertIn('<property name="value" value="a&lt;b" />', content)
+        self.assertLess(spliced.xml._tree.source.serialized, spliced.xml._tree.source.copied)
+
+    def test_only_modified_elements_change(self):
+        content = b'<?xml version="1.0"?>\n<!-- head -->\n<r>\n  <a  x="1"/>\n  <b y=\'>\'>t</b>\n  <c/>\n</r>\n'
+        x = XmlManipulator(content, preserve=True)
+        x.set_attr("b", "y", "<")
+        x.append_at("c").element("d")
+        self.assertEqual(b'<?xml version="1.0"?>\n<!-- head -->\n<r>\n  <a  x="1"/>\n  <b y="&lt;">t</b>\n'
+                         b'  <c><d /></c>\n</r>\n', write(x))
+
+    def test_remove(self):
+        content = b'<r>\n  <a/>\n  <b/>\n</r>'
+        x = XmlManipulator(content, preserve=True)
+        x.remove("a")
+        self.assertEqual(b'<r>\n  <b/>\n</r>', write(x))
+
+    def test_content_of_modified_element(self):
+        x = XmlManipulator(b'<r><a x="1"><!-- inner --><b/>t&amp;<?pi?></a></r>', preserve=True)
+        x.set_attr("a", "x", "2")
+        self.assertEqual(b'<r><a x="2"><!-- inner --><b/>t&amp;<?pi?></a></r>', write(x))
+
+    def test_new_children_are_indented(self):
+        content = b'<r>\n  <a>\n    <!-- inner -->\n    <b/>\n  </a>\n</r>'
+        x = XmlManipulator(content, preserve=True)
+        x.append_at("a").element("d")
+        self.assertEqual(b'<r>\n  <a>\n    <!-- inner -->\n    <b/>\n    <d />\n  </a>\n</r>', write(x))
+        x = XmlManipulator(content, preserve=True)
+        x.remove("a/b")
+        self.assertEqual(b'<r>\n  <a>\n  </a>\n</r>', write(x))
+
+    def test_namespaces_fall_back(self):
+        content = b'<ns1:r xmlns:ns1="info:1"><ns1:a/></ns1:r>'
+        x = XmlManipulator(content, {"ns1": "info:1"}, preserve=True)
+        self.assertEqual(content, write(x))
+        x.append_at("ns1:a").element("b", namespace="ns1")
+        self.assertIn(b"<ns0:b />", write(x))
+
+    def test_needs_bytes(self):
+        with self.assertRaises(ValueError):
+            XmlManipulator("<r/>", preserve=True)
+        with self.assertRaises(Unsupported):
+            SourceMap.parse('<?xml version="1.0" encoding="UTF-16"?><r/>'.encode("UTF-16"))
+
+    def test_encoding(self):
+        content = '<?xml version="1.0" encoding="ISO-8859-1"?><r a="æ"><b/></r>'.encode("ISO-8859-1")
+        x = XmlManipulator(content, preserve=True)
+        x.set_attr("b", "c", "ø")
+        self.assertEqual('<?xml version="1.0" encoding="ISO-8859-1"?><r a="æ"><b c="ø" /></r>'.encode("ISO-8859-1"),
+                         write(x))
+
+
+class TestLazy(TestCase):
+
+    def test_sections(self):
+        content = (b'<?xml version="1.0"?>\n<!-- <x> -->\n<r a="&amp;">\n <a x="1"/>\n <b y=\'>\'>'
+                   b'<b><b/></b><!-- </b> --><![CDATA[</b>]]><?pi </b>?>t</b>\n <c><d/></c>\n</r>\n')
+        (root, source, lazy) = SourceMap.parse_lazy(content)
+        self.assertEqual("&", root.get("a"))
+        self.assertEqual(["a", "b", "c"], [child.tag for child in root])
+        self.assertEqual({root[1], root[2]}, lazy)
+        self.assertEqual(0, len(root[1]))
+        source.load(root[1])
+        (expected, _) = SourceMap.parse(content)
+        self.assertEqual(ET.tostring(expected[1]), ET.tostring(root[1]))
+        root[1][0].set("z", "1")
+        out = BytesIO()
+        source.write(root, out, {root[1][0]}, lambda node: {root[1][0]: root[1], root[1]: root}.get(node))
+        self.assertEqual(content.replace(b"<b><b/></b>", b'<b z="1"><b/></b>'), out.getvalue())
+
+    def test_unsupported(self):
+        for content in (b'<!DOCTYPE r [<!ENTITY e "x">]><r><a>&e;</a></r>', b'<r xmlns:p="urn:p"><p:a/></r>',
+                        b'<r/>'):
+            with self.assertRaises(Unsupported):
+                SourceMap.parse_lazy(content)
+            # Falls back to preserving
+            self.assertIsNotNone(XmlManipulator(content, lazy=True)._tree.source)
+
+    def test_untouched_sections_are_not_parsed(self):
+        with open(DOMAIN_XML, "rb") as io:
+            content = io.read()
+        x = XmlManipulator(content, lazy=True)
+        sections = len(x._tree.lazy)
+        self.assertEqual(content, write(x))
+        x.set_attr('resources/jdbc-resource[@jndi-name="jdbc/__default"]', "enabled", "false")
+        self.assertEqual(sections - 1, len(x._tree.lazy))
+        self.assertEqual(1, x._tree.loads)
+        x._tree.verify()
+
+    def test_same_as_preserving(self):
+        lazy = DomainXml(DOMAIN_XML, lazy=True)
+        spliced = DomainXml(DOMAIN_XML, preserve=True)
+        for domain_xml in (lazy, spliced):
+            domain_xml.custom_resource_primitive("java.lang.String", "jndi/a", "a<b")
+            domain_xml.app("app", "/tmp/app.war")
+            domain_xml.jvm_options(False, {"-Xmx1g"}, {"-Xmx*"})
+            domain_xml.xml.remove('configs/config[@name="default-config"]')
+        self.assertEqual(write(spliced.xml), write(lazy.xml))
+
+    def test_fallback_xpath_loads_everything(self):
+        x = XmlManipulator(open(DOMAIN_XML, "rb").read(), lazy=True)
+        self.assertEqual(len(XmlManipulator(open(DOMAIN_XML, "rb").read())._findall(".//jdbc-resource")),
+                         len(x._findall(".//jdbc-resource")))
+        self.assertEqual(set(), x._tree.lazy)
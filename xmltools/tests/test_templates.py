@@ -0,0 +1,62 @@
+from unittest import TestCase, skipUnless
+
+from xmltools import backend
+from xmltools.manipulation import XmlManipulator
+from xmltools.templates import Fragment
+
+FRAGMENT = Fragment('<property name="fixed" value="1"/><module name="{name}"><engine sniffer="{kind}-x"/></module>')
+
+
+class TestFragment(TestCase):
+
+    def setUp(self):
+        XmlManipulator.debug = True
+
+    def tearDown(self):
+        XmlManipulator.debug = False
+
+    def check(self, name: str):
+        xml = XmlManipulator("<r><app/></r>", backend=name)
+        point = xml.append_at("app")
+        point.fragment(FRAGMENT, name="a", kind="web").fragment(FRAGMENT, name="b", kind="ejb")
+        self.assertEqual('<r><app><property name="fixed" value="1" /><module name="a"><engine sniffer="web-x" />'
+                         '</module><property name="fixed" value="1" /><module name="b"><engine sniffer="ejb-x" />'
+                         '</module></app></r>', xml.to_xml().split("?>", 1)[1].strip().replace('"/>', '" />'))
+        # Copies are independent, and found by lookups
+        self.assertTrue(xml.has('app/module[@name="b"]/engine[@sniffer="ejb-x"]'))
+        xml.set_attr('app/module[@name="a"]/engine', "sniffer", "changed")
+        self.assertTrue(xml.has('app/module[@name="b"]/engine[@sniffer="ejb-x"]'))
+        with self.assertRaises(KeyError):
+            point.fragment(FRAGMENT, name="c")
+
+    def test_etree(self):
+        self.check("etree")
+
+    @skipUnless("lxml" in backend.available(), "lxml is not installed")
+    def test_lxml(self):
+        self.check("lxml")
+
+
+class TestElements(TestCase):
+
+    def setUp(self):
+        XmlManipulator.debug = True
+
+    def tearDown(self):
+        XmlManipulator.debug = False
+
+    def test_elements(self):
+        xml = XmlManipulator("<r><p/></r>")
+        # Build the child index first, it has to be kept up to date
+        self.assertFalse(xml.has('p/property[@name="a"]'))
+        xml.append_at("p").elements("property", ({"name": k, "value": v} for (k, v) in (("a", "1"), ("b", "2"))))
+        self.assertTrue(xml.has('p/property[@name="a"][@value="1"]'))
+        self.assertEqual(2, len(xml._findall("p/property")))
+        xml.append_at("p").elements("property", [])
+        self.assertEqual(2, len(xml._findall("p/property")))
+
+    def test_preserved_document(self):
+        xml = XmlManipulator(b'<r>\n  <!-- kept -->\n  <p/>\n</r>', preserve=True)
+        xml.append_at("p").elements("property", [{"name": "a"}]).fragment(FRAGMENT, name="m", kind="k")
+        self.assertEqual('<r>\n  <!-- kept -->\n  <p><property name="a" /><property name="fixed" value="1" />'
+                         '<module name="m"><engine sniffer="k-x" /></module></p>\n</r>', xml.to_xml())
@@ -0,0 +1,75 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from xmltools import timing
+from xmltools.payara_domain_xml import DomainXml
+
+DOMAIN_XML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domain_orig.xml")
+
+
+class TestTimings(TestCase):
+
+    def setUp(self):
+        self.timings = timing.Timings()
+        timing.add_recorder(self.timings)
+
+    def tearDown(self):
+        timing.remove_recorder(self.timings)
+
+    def test_stages(self):
+        with timing.stage("tokenize", "/some/where/10-a.cres"):
+            pass
+        timing.record("tokenize", "/some/where/20-b.cres", 0.5, 0.25)
+        with timing.stage("save"):
+            pass
+        report = self.timings.report()
+        self.assertEqual(2, report['phases']['tokenize']['count'])
+        self.assertGreaterEqual(report['phases']['tokenize']['wall'], 0.5)
+        self.assertEqual(["10-a.cres", "20-b.cres"], list(report['files']))
+        self.assertEqual(["tokenize", "tokenize", "save"], [s['phase'] for s in report['stages']])
+
+    def test_domain_xml(self):
+        domain_xml = DomainXml(DOMAIN_XML)
+        timing.loaded(domain_xml)
+        domain_xml.custom_resource_primitive("java.lang.String", "jndi/a", "a")
+        domain_xml.custom_resource_primitive("java.lang.String", "jndi/b", "b")
+        report = self.timings.report()
+        self.assertEqual(2, report['methods']['custom_resource_primitive']['calls'])
+        # nested calls are counted too
+        self.assertEqual(2, report['methods']['resource_ref']['calls'])
+        counters = report['counters']
+        self.assertEqual(counters['nodes_before'] + 6, counters['nodes_after'])
+        self.assertGreater(counters['xpath_evaluations'], 0)
+        # lxml elements know their parent, there is no parent map to build
+        self.assertEqual(0 if domain_xml.xml._tree.native else 1, counters['parent_map_builds'])
+
+    def test_counters_and_json(self):
+        timing.count("operations", 3)
+        timing.count("operations")
+        out = io.StringIO()
+        self.timings.write_json(out)
+        self.assertIn('"operations": 4', out.getvalue())
+
+    def test_prometheus(self):
+        timing.record("apply", '/x/10-"q".set', 1.5, 1.0)
+        timing.count("operations", 2)
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, "payara5-setup.prom")
+            self.timings.write_prometheus(location)
+            with open(location, "r") as io:
+                content = io.read()
+        self.assertIn('# TYPE payara5_setup_phase_seconds gauge', content)
+        self.assertIn('payara5_setup_phase_seconds{phase="apply"} 1.5', content)
+        self.assertIn('payara5_setup_file_seconds{file="10-\\"q\\".set"} 1.5', content)
+        self.assertIn('payara5_setup_operations 2.0', content)
+
+
+class TestNoRecorder(TestCase):
+
+    def test_noop(self):
+        with timing.stage("apply"):
+            pass
+        timing.count("operations")
+        timing.record("apply", None, 1, 1)
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.watch import Incremental, InotifyWatcher, PollingWatcher
+
+from helpers import Recorder, parse
+
+if os.path.isdir(os.path.join("xmltools", "tests")):
+    os.chdir(os.path.join("xmltools", "tests"))
+
+
+class TestIncremental(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.domain_xml = os.path.join(self.dir, "domain.xml")
+        shutil.copy("domain_orig.xml", self.domain_xml)
+        self.files = []
+        self.write("01-a.sys", "sys a 1\necho hello\n")
+        self.write("02-db.jdbc", "jdbc jdbc/db url\n")
+        self.host = Recorder()
+        self.incremental = Incremental(self.domain_xml, parse, self.host)
+        self.incremental.start(self.files)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name: str, content: str) -> str:
+        location = os.path.join(self.dir, name)
+        with open(location, "w") as io:
+            io.write(content)
+        if location not in self.files:
+            self.files.append(location)
+        return location
+
+    def expected(self) -> str:
+        # What a full run from the original domain.xml gives
+        domain_xml = DomainXml("domain_orig.xml")
+        for src in self.files:
+            parse(src).apply(domain_xml, Recorder())
+        return domain_xml.xml.to_xml()
+
+    def saved(self) -> str:
+        return DomainXml(self.domain_xml).xml.to_xml()
+
+    def test_start(self):
+        self.assertEqual(self.expected(), self.saved())
+        self.assertEqual([("echo", "hello")], self.host.calls)
+
+    def test_upsert_is_incremental(self):
+        src = self.write("02-db.jdbc", "jdbc jdbc/db other\njdbc jdbc/new url\n")
+        self.assertEqual("incremental", self.incremental.update(self.files, {src}))
+        self.assertEqual(self.expected(), self.saved())
+        self.assertEqual(1, self.incremental.replays)
+
+    def test_unchanged(self):
+        self.assertIsNone(self.incremental.update(self.files, {self.files[0], os.path.join(self.dir, "x.txt")}))
+
+    def test_removed_operation_is_replayed(self):
+        src = self.write("02-db.jdbc", "jdbc jdbc/other url\n")
+        self.assertEqual("replayed", self.incremental.update(self.files, {src}))
+        self.assertEqual(self.expected(), self.saved())
+        self.assertNotIn("jdbc/db", self.saved())
+        # Side effects of unchanged files aren't repeated
+        self.assertEqual([("echo", "hello")], self.host.calls)
+
+    def test_later_file_with_same_key_is_replayed(self):
+        self.write("03-b.sys", "sys a 3\n")
+        self.assertEqual("replayed", self.incremental.update(self.files, set()))
+        src = self.write("01-a.sys", "sys a 2\necho hello\n")
+        self.assertEqual("replayed", self.incremental.update(self.files, {src}))
+        self.assertEqual(self.expected(), self.saved())
+
+    def test_deleted_file(self):
+        os.unlink(self.files[1])
+        removed = self.files.pop()
+        self.assertEqual("replayed", self.incremental.update(self.files, {removed}))
+        self.assertEqual(self.expected(), self.saved())
+
+    def test_failed_update_is_rolled_back(self):
+        domain_xml = self.incremental._domain_xml
+        before = domain_xml.xml.to_xml()
+        batch = domain_xml.jdbc_resources
+
+        def failing(resources, ref):
+            batch(resources, ref=ref)
+            raise OSError("failed halfway")
+
+        domain_xml.jdbc_resources = failing
+        src = self.write("02-db.jdbc", "jdbc jdbc/db other\njdbc jdbc/new url\n")
+        with self.assertRaises(OSError):
+            self.incremental.update(self.files, {src})
+        del domain_xml.jdbc_resources
+        self.assertEqual(before, domain_xml.xml.to_xml())
+        self.assertEqual("incremental", self.incremental.update(self.files, {src}))
+        self.assertEqual(self.expected(), self.saved())
+
+    def test_parse_error_changes_nothing(self):
+        src = self.write("02-db.jdbc", "garbage\n")
+        with self.assertRaises(SyntaxError):
+            self.incremental.update(self.files, {src})
+        self.write("02-db.jdbc", "jdbc jdbc/db url\n")
+        self.assertIsNone(self.incremental.update(self.files, {src}))
+
+
+class TestWatchers(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, watcher):
+        try:
+            self.assertEqual(set(), watcher.wait(0.01))
+            location = os.path.join(self.dir, "01-a.sys")
+            with open(location, "w") as io:
+                io.write("a = 1\n")
+            self.assertEqual({location}, watcher.wait(5))
+            os.unlink(location)
+            self.assertEqual({location}, watcher.wait(5))
+        finally:
+            watcher.close()
+
+    def test_polling(self):
+        self.check(PollingWatcher([self.dir], 0.01))
+
+    def test_inotify(self):
+        try:
+            watcher = InotifyWatcher([self.dir])
+        except (OSError, AttributeError):
+            self.skipTest("inotify is not available")
+        self.check(watcher)
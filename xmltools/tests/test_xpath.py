@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+from xmltools.manipulation import XmlManipulator
+from xmltools.xpath import Step, plan
+
+xml_1 = """<?xml version="1.0"?>
+<root><a name="x"><b k="1"/><b k="2"/></a><a name="y"><b/></a></root>"""
+
+
+class TestXPathPlan(TestCase):
+
+    def test_parse(self):
+        p = plan('configs/config[@name="server-config"]/java-config', {})
+        self.assertEqual((Step("configs", ()), Step("config", (("name", "server-config"),)), Step("java-config", ())),
+                         p.steps)
+
+    def test_parse_ns(self):
+        p = plan("./ns2:foo[@ns2:a='b']", {"ns2": "info:1"})
+        self.assertEqual((Step(".", ()), Step("{info:1}foo", (("{info:1}a", "b"),))), p.steps)
+
+    def test_cached(self):
+        self.assertIs(plan('a/b', {}), plan('a/b', {}))
+
+    def test_fallback(self):
+        for xpath in ('.//b', 'a/..', 'a[1]', 'a[b]', "a[@name='x']/b[.='t']", 'x:a', ''):
+            self.assertIsNone(plan(xpath, {}).steps, xpath)
+
+    def test_same_as_elementtree(self):
+        x = XmlManipulator(xml_1)
+        for xpath in ('a', 'a/b', './a[@name="x"]/b', 'a/b[@k]', 'a/b[@k="2"]', '*/b', '.', 'a[@name="z"]/b', './/b'):
+            self.assertEqual(x._root.findall(xpath), x._findall(xpath), xpath)
+
+
+class TestStepMemo(TestCase):
+
+    def test_memoized(self):
+        x = XmlManipulator(xml_1)
+        x._findall('a[@name="x"]/b')
+        step = Step("a", (("name", "x"),))
+        self.assertIn((x._root, step), x._tree.memo)
+        memo = x._tree.memo[(x._root, step)]
+        x._findall('a[@name="x"]/b')
+        self.assertIs(memo, x._tree.memo[(x._root, step)])
+
+    def test_invalidated_by_attr(self):
+        x = XmlManipulator(xml_1)
+        self.assertEqual(1, len(x._findall('a[@name="y"]')))
+        x.set_attr('a[@name="x"]', "name", "y")
+        self.assertEqual(2, len(x._findall('a[@name="y"]')))
+        x.remove_attr('a', "name")
+        self.assertEqual(0, len(x._findall('a[@name="y"]')))
+
+    def test_invalidated_by_structure(self):
+        x = XmlManipulator(xml_1)
+        self.assertEqual(3, len(x._findall('a/b')))
+        x.append_at('a[@name="y"]').element("b")
+        self.assertEqual(4, len(x._findall('a/b')))
+        x.remove('a[@name="x"]')
+        self.assertEqual(2, len(x._findall('a/b')))
+        x.append_at('a').clear()
+        self.assertEqual(0, len(x._findall('a/b')))
+
+    def test_bounded(self):
+        x = XmlManipulator(xml_1)
+        x._tree.MEMO_SIZE = 2
+        for xpath in ('a', 'a[@name="x"]', 'a[@name="y"]', 'a/b'):
+            x._findall(xpath)
+        self.assertEqual(2, len(x._tree.memo))
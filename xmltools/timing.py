@@ -0,0 +1,241 @@
+import functools
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from xmltools.files import AtomicFile
+
+# Active recorders, see add_recorder()
+_recorders = []
+
+
+class Recorder(object):
+    """
+    Receives timings from payara5-setup, override what is of interest
+
+    Register with add_recorder(), the stage() and count() calls are no-ops
+    while no recorder is registered.
+    """
+
+    def stage(self, phase: str, src: str, wall: float, cpu: float) -> None:
+        """
+        A phase of processing is done
+
+        :param phase: 'load', 'tokenize', 'apply', 'wait', 'save' ...
+        :param src: the config file it was done for (None if not for one file)
+        :param wall: elapsed seconds
+        :param cpu: cpu seconds (of this process)
+        :return: None
+        """
+        pass
+
+    def count(self, name: str, value: int) -> None:
+        """
+        A counter has been incremented
+
+        :param name: name of counter
+        :param value: increment
+        :return: None
+        """
+        pass
+
+    def loaded(self, domain_xml) -> None:
+        """
+        A domain.xml has been loaded
+
+        :param domain_xml: the DomainXml
+        :return: None
+        """
+        pass
+
+
+def add_recorder(recorder: Recorder) -> None:
+    _recorders.append(recorder)
+
+
+def remove_recorder(recorder: Recorder) -> None:
+    _recorders.remove(recorder)
+
+
+@contextmanager
+def stage(phase: str, src: str = None):
+    """
+    Time a block as a phase of processing
+
+        with timing.stage('apply', src):
+            plan.apply(domain_xml, host)
+
+    :param phase: name of phase
+    :param src: the config file the phase is for
+    """
+    if not _recorders:
+        yield
+        return
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        record(phase, src, time.perf_counter() - wall, time.process_time() - cpu)
+
+
+def record(phase: str, src: str, wall: float, cpu: float) -> None:
+    """
+    Report a phase timed elsewhere (ie. in a worker process)
+
+    :param phase: name of phase
+    :param src: the config file the phase is for
+    :param wall: elapsed seconds
+    :param cpu: cpu seconds
+    :return: None
+    """
+    for recorder in _recorders:
+        recorder.stage(phase, src, wall, cpu)
+
+
+def count(name: str, value: int = 1) -> None:
+    for recorder in _recorders:
+        recorder.count(name, value)
+
+
+def loaded(domain_xml) -> None:
+    for recorder in _recorders:
+        recorder.loaded(domain_xml)
+
+
+class Timings(Recorder):
+    """
+    Collects everything into a report
+
+    The public methods of a loaded DomainXml are wrapped, to count calls and
+    their (inclusive) duration. The xpath evaluations, parent map builds, child
+    index builds and node counts are read from the document bookkeeping.
+    """
+
+    def __init__(self):
+        self._started = (time.perf_counter(), time.process_time())
+        self.stages = []
+        self.counters = OrderedDict()
+        self.methods = OrderedDict()
+        self._domain_xml = None
+
+    def stage(self, phase: str, src: str, wall: float, cpu: float) -> None:
+        self.stages.append((phase, src, wall, cpu))
+
+    def count(self, name: str, value: int) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def loaded(self, domain_xml) -> None:
+        self._domain_xml = domain_xml
+        self.counters['nodes_before'] = self._nodes()
+        for name in dir(domain_xml):
+            if name.startswith('_') or name in ('xml', 'save'):
+                continue
+            method = getattr(domain_xml, name)
+            if callable(method):
+                setattr(domain_xml, name, self._timed(name, method))
+
+    def _timed(self, name: str, method):
+        stats = self.methods.setdefault(name, [0, 0.0])
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            before = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter() - before
+
+        return timed
+
+    def _nodes(self) -> int:
+        return sum(1 for _ in self._domain_xml.xml._tree.root.iter())
+
+    def report(self) -> dict:
+        """
+        Everything recorded until now
+
+        :return: json serializable report
+        """
+        counters = OrderedDict(self.counters)
+        if self._domain_xml is not None:
+            tree = self._domain_xml.xml._tree
+            counters['nodes_after'] = self._nodes()
+            counters['xpath_evaluations'] = tree.evaluations
+            counters['parent_map_builds'] = tree.builds
+            counters['index_builds'] = tree.index_builds
+            counters['sections_loaded'] = tree.loads
+            counters['rollbacks'] = tree.rollbacks
+        phases = OrderedDict()
+        files = OrderedDict()
+        for (phase, src, wall, cpu) in self.stages:
+            total = phases.setdefault(phase, {'count': 0, 'wall': 0.0, 'cpu': 0.0})
+            total['count'] += 1
+            total['wall'] += wall
+            total['cpu'] += cpu
+            if src is not None:
+                total = files.setdefault(os.path.basename(src), {'wall': 0.0, 'cpu': 0.0})
+                total['wall'] += wall
+                total['cpu'] += cpu
+        return {
+            'total': {
+                'wall': time.perf_counter() - self._started[0],
+                'cpu': time.process_time() - self._started[1]
+            },
+            'phases': phases,
+            'files': files,
+            'stages': [{'phase': phase, 'file': os.path.basename(src) if src else None, 'wall': wall, 'cpu': cpu}
+                       for (phase, src, wall, cpu) in self.stages],
+            'methods': OrderedDict((name, {'calls': calls, 'wall': wall})
+                                   for (name, (calls, wall)) in self.methods.items() if calls),
+            'counters': counters
+        }
+
+    def write_json(self, io) -> None:
+        json.dump(self.report(), io, indent=2)
+        io.write("\n")
+
+    def write_prometheus(self, location: str, prefix: str = "payara5_setup") -> None:
+        """
+        Write the report in the Prometheus text format (for node_exporter's textfile collector)
+
+        The file is replaced atomically, so the collector never reads half of it
+
+        :param location: file to write
+        :param prefix: prefix of metric names
+        :return: None
+        """
+        report = self.report()
+        lines = []
+
+        def metric(name: str, help: str, samples: list) -> None:
+            lines.append("# HELP %s_%s %s" % (prefix, name, help))
+            lines.append("# TYPE %s_%s gauge" % (prefix, name))
+            for (labels, value) in samples:
+                if labels:
+                    labels = "{" + ",".join('%s="%s"' % (k, _escape(v)) for (k, v) in labels) + "}"
+                lines.append("%s_%s%s %s" % (prefix, name, labels or "", repr(float(value))))
+
+        metric("seconds", "Wall time of the run", [((), report['total']['wall'])])
+        metric("cpu_seconds", "Cpu time of the run", [((), report['total']['cpu'])])
+        metric("phase_seconds", "Wall time per phase",
+               [((('phase', k),), v['wall']) for (k, v) in report['phases'].items()])
+        metric("phase_cpu_seconds", "Cpu time per phase",
+               [((('phase', k),), v['cpu']) for (k, v) in report['phases'].items()])
+        metric("file_seconds", "Wall time per config file",
+               [((('file', k),), v['wall']) for (k, v) in report['files'].items()])
+        metric("method_calls", "Calls of DomainXml methods",
+               [((('method', k),), v['calls']) for (k, v) in report['methods'].items()])
+        metric("method_seconds", "Wall time of DomainXml methods",
+               [((('method', k),), v['wall']) for (k, v) in report['methods'].items()])
+        for (name, value) in report['counters'].items():
+            metric(name, name.replace("_", " ").capitalize(), [((), value)])
+        with AtomicFile(location) as io:
+            io.write(("\n".join(lines) + "\n").encode("UTF-8"))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
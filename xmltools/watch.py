@@ -0,0 +1,344 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from xmltools.payara_domain_xml import DomainXml
+from xmltools.plan import Host, Plan, ResourceRef
+
+# inotify(7) events signalling that a file has new content, or is gone
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher(object):
+    """
+    Notices changed files by comparing size and modification time of the files in some directories
+    """
+
+    def __init__(self, directories: list, interval: float = 1.0):
+        """
+        :param directories: directories to watch
+        :param interval: seconds between scans
+        """
+        self._directories = directories
+        self._interval = interval
+        self._state = self._scan()
+
+    def _scan(self) -> dict:
+        state = {}
+        for directory in self._directories:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                location = os.path.join(directory, name)
+                try:
+                    st = os.stat(location)
+                except OSError:
+                    continue
+                state[location] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def wait(self, timeout: float = None) -> set:
+        """
+        Wait for files to change
+
+        :param timeout: seconds to wait at most (None: until something changes)
+        :return: full paths of changed, new or deleted files (empty on timeout)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self._scan()
+            changed = {location for location in state.keys() | self._state.keys()
+                       if state.get(location) != self._state.get(location)}
+            self._state = state
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self._interval if deadline is None else
+                       max(0.0, min(self._interval, deadline - time.monotonic())))
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Notices changed files through inotify(7) (linux)
+    """
+
+    def __init__(self, directories: list, settle: float = 0.05):
+        """
+        :param directories: directories to watch
+        :param settle: after an event, seconds to wait for more (an editor saving a file causes several)
+        :raises OSError: if inotify isn't available
+        """
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._settle = settle
+        self._directories = {}
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _IN_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                self.close()
+                raise OSError(errno, "Cannot watch %s" % directory)
+            self._directories[wd] = directory
+
+    def _read(self, changed: set) -> None:
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        at = 0
+        while at < len(data):
+            (wd, mask, cookie, size) = _EVENT.unpack_from(data, at)
+            at += _EVENT.size
+            name = data[at:at + size].rstrip(b"\0")
+            at += size
+            if wd in self._directories and name:
+                changed.add(os.path.join(self._directories[wd], os.fsdecode(name)))
+
+    def wait(self, timeout: float = None) -> set:
+        """
+        Wait for files to change
+
+        :param timeout: seconds to wait at most (None: until something changes)
+        :return: full paths of changed, new or deleted files (empty on timeout)
+        """
+        changed = set()
+        (readable, _, _) = select.select([self._fd], [], [], timeout)
+        while readable:
+            self._read(changed)
+            (readable, _, _) = select.select([self._fd], [], [], self._settle)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def watcher(directories: list, interval: float = 1.0):
+    """
+    A watcher using inotify, or polling if inotify can't be used
+
+    :param directories: directories to watch
+    :param interval: seconds between scans, when polling
+    :return: InotifyWatcher or PollingWatcher
+    """
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except OSError as e:
+            print("Cannot use inotify, polling:", e, file=sys.stderr)
+    return PollingWatcher(directories, interval)
+
+
+class Incremental(object):
+    """
+    A domain.xml kept in memory, with the operations of each config file
+
+    When config files change only they are parsed again. If the difference to
+    their previous operations is upserts (of keyed resources, that no later
+    file touches) the difference is applied to the tree. Otherwise every
+    operation is replayed (coalesced) on the domain.xml as it was at start,
+    and only the side effects of the changed files are repeated.
+    """
+
+    def __init__(self, location: str, parse: Callable[[str], Plan], host: Host = None,
+                 preserve: bool = False, fsync: bool = False):
+        """
+        :param location: domain.xml (its current content is the starting point)
+        :param parse: function giving the operations of a config file
+        :param host: side effects outside domain.xml
+        :param preserve: copy unmodified parts of domain.xml verbatim
+        :param fsync: flush domain.xml to disk, when saving
+        """
+        self._location = location
+        self._parse = parse
+        self._host = host if host is not None else Host()
+        self._preserve = preserve
+        self._fsync = fsync
+        with open(location, "rb") as io:
+            self._pristine = io.read()
+        self._domain_xml = None
+        self.operations = OrderedDict()
+        self.replays = 0
+        self.increments = 0
+
+    def start(self, files: list) -> None:
+        """
+        Apply every config file, and save
+
+        :param files: config files in processing order
+        :return: None
+        """
+        for src in files:
+            print("Setting up from:", os.path.basename(src))
+            self.operations[src] = list(self._parse(src))
+        self._replay(set(files))
+        self._save()
+
+    def update(self, files: list, changed: set) -> str:
+        """
+        Bring domain.xml up to date with the config files
+
+        :param files: the current config files in processing order
+        :param changed: files that (may) have changed, other files are ignored
+        :return: how domain.xml was updated ('incremental' or 'replayed'), None if it wasn't
+        :raises Exception: if a config file can't be parsed (nothing has been changed)
+        """
+        changed = {src for src in changed | (self.operations.keys() ^ set(files))
+                   if src in files or src in self.operations}
+        if not changed:
+            return None
+        parsed = OrderedDict()
+        for src in files:
+            if src in changed:
+                print("Setting up from:", os.path.basename(src))
+                parsed[src] = list(self._parse(src))
+        previous = self.operations
+        self.operations = OrderedDict((src, parsed[src] if src in parsed else previous[src]) for src in files)
+        try:
+            delta = self._delta(previous, changed)
+            if delta is None:
+                self._replay(changed)
+                how = 'replayed'
+            elif delta:
+                plan = Plan()
+                plan.extend(delta)
+                mark = self._host.mark()
+                self._domain_xml.checkpoint()
+                try:
+                    reports = plan.apply(self._domain_xml, self._host)
+                except BaseException:
+                    self._domain_xml.rollback()
+                    self._host.drop(mark)
+                    raise
+                self._domain_xml.commit()
+                self._print_reports(reports)
+                self._host.wait()
+                self.increments += 1
+                how = 'incremental'
+            else:
+                return None
+        except BaseException:
+            # The tree is as the previous operations left it
+            self.operations = previous
+            raise
+        self._save()
+        return how
+
+    def _delta(self, previous: OrderedDict, changed: set) -> list:
+        # The operations to apply to the current tree, None if it has to be replayed
+        if list(previous) != list(self.operations):
+            return None
+        files = list(self.operations)
+        delta = []
+        for src in changed:
+            old = previous[src]
+            new = self.operations[src]
+            added = [operation for operation in new if operation not in old]
+            if any(operation.key is None and operation.target != 'host' and not isinstance(operation, ResourceRef)
+                   for operation in added):
+                return None
+            keys = {operation.key for operation in added if operation.key is not None}
+            if any(operation.key not in keys for operation in old if operation not in new):
+                return None
+            for later in files[files.index(src) + 1:]:
+                if any(operation.barrier or operation.key in keys for operation in self.operations[later]):
+                    return None
+            delta.extend(added)
+        return delta
+
+    def _replay(self, changed: set) -> None:
+        domain_xml = DomainXml(self._location, preserve=self._preserve, content=self._pristine)
+        plan = Plan()
+        for (src, operations) in self.operations.items():
+            plan.extend(operations if src in changed else
+                        [operation for operation in operations if operation.target != 'host'])
+        mark = self._host.mark()
+        try:
+            reports = plan.apply(domain_xml, self._host, coalesce=True)
+        except BaseException:
+            self._host.drop(mark)
+            raise
+        self._print_reports(reports)
+        self._domain_xml = domain_xml
+        self._host.wait()
+        self.replays += 1
+
+    @staticmethod
+    def _print_reports(reports: list) -> None:
+        for report in reports:
+            for line in report.lines():
+                print(line)
+
+    def _save(self) -> None:
+        self._domain_xml.save(fsync=self._fsync)
+
+
+def _mtimes(files: set) -> list:
+    # Modification times of the files that still exist
+    result = []
+    for src in files:
+        try:
+            result.append(os.stat(src).st_mtime)
+        except FileNotFoundError:
+            pass
+    return result
+
+
+def run(incremental: Incremental, expand: Callable[[], list], directories: list, interval: float = 1.0,
+        iterations: int = None) -> None:
+    """
+    Apply the config files, then keep domain.xml up to date until interrupted
+
+    :param incremental: the domain.xml
+    :param expand: function listing the config files in processing order
+    :param directories: where the config files are
+    :param interval: seconds between scans, when inotify isn't available
+    :param iterations: stop after this many updates (None: run until interrupted)
+    :return: None
+    """
+    incremental.start(expand())
+    w = watcher(directories, interval)
+    print("Watching:", ", ".join(directories))
+    try:
+        while iterations is None or iterations > 0:
+            changed = w.wait()
+            detected = time.time()
+            edited = max(_mtimes(changed), default=detected)
+            started = time.perf_counter()
+            try:
+                how = incremental.update(expand(), changed)
+            except Exception as e:
+                print("Not updated:", e, file=sys.stderr)
+                continue
+            if how is not None:
+                print("Updated domain.xml (%s) in %.3fs, %.3fs after the edit" %
+                      (how, time.perf_counter() - started, time.time() - edited))
+            if iterations is not None:
+                iterations -= 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        w.close()
@@ -0,0 +1,124 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+from xml.etree.ElementTree import Element
+
+# A location step: tag is '.', '*' or a {uri}local name, predicates is a tuple of
+# (attribute, value) where value is None for an existence test
+Step = namedtuple('Step', ['tag', 'predicates'])
+
+_NAME = r'(?:[A-Za-z_][\w.-]*:)?[A-Za-z_][\w.-]*'
+_STEP = re.compile(r'^(\.|\*|\{[^}]*\}[A-Za-z_][\w.-]*|' + _NAME + r')((?:\[[^\]]*\])*)$')
+_PREDICATE = re.compile(r'\[@(' + _NAME + r')(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'))?\]')
+
+
+class XPathPlan(object):
+    """
+    A parsed xpath expression
+
+    Only child steps with attribute predicates are evaluated here, anything else
+    (//, .., positions, text tests ...) is handed to the xml backend as is.
+    """
+
+    def __init__(self, xpath: str, steps: tuple):
+        self.xpath = xpath
+        self.steps = steps
+
+    def select(self, tree, context: Element, namespaces: dict) -> list:
+        """
+        Evaluate the expression
+
+        :param tree: document bookkeeping (parent map, index and step memo)
+        :param context: node to evaluate from
+        :param namespaces: prefix to uri map (used for the backend fallback)
+        :return: list of matching nodes in document order
+        """
+        tree.evaluations += 1
+        if self.steps is None:
+            tree.load_all()
+            return tree.backend.findall(context, self.xpath, namespaces)
+        nodes = [context]
+        for step in self.steps:
+            if step.tag == '.' and not step.predicates:
+                continue
+            result = []
+            for node in nodes:
+                result.extend(tree.step(node, step))
+            nodes = result
+            if not nodes:
+                break
+        return nodes
+
+
+def plan(xpath: str, namespaces: dict) -> XPathPlan:
+    """
+    Get the (cached) plan for an xpath expression
+
+    :param xpath: expression
+    :param namespaces: prefix to uri map
+    :return: plan
+    """
+    return _plan(xpath, tuple(sorted(namespaces.items())) if namespaces else ())
+
+
+@lru_cache(maxsize=512)
+def _plan(xpath: str, namespaces: tuple) -> XPathPlan:
+    return XPathPlan(xpath, _parse(xpath, dict(namespaces)))
+
+
+def _parse(xpath: str, namespaces: dict) -> tuple:
+    if not xpath or xpath.startswith('/') or '//' in xpath:
+        return None
+    steps = []
+    for part in _split(xpath):
+        m = _STEP.match(part)
+        if m is None:
+            return None
+        tag = _qualify(m.group(1), namespaces, True)
+        if tag is None:
+            return None
+        predicates = []
+        rest = m.group(2)
+        for p in _PREDICATE.finditer(rest):
+            attr = _qualify(p.group(1), namespaces, False)
+            if attr is None:
+                return None
+            value = p.group(2) if p.group(2) is not None else p.group(3)
+            predicates.append((attr, value))
+            rest = rest.replace(p.group(0), '', 1)
+        if rest:
+            return None
+        steps.append(Step(tag, tuple(predicates)))
+    return tuple(steps)
+
+
+def _split(xpath: str) -> list:
+    parts = []
+    current = ''
+    quote = None
+    for c in xpath:
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c == '/':
+            parts.append(current)
+            current = ''
+            continue
+        current += c
+    parts.append(current)
+    return parts
+
+
+def _qualify(name: str, namespaces: dict, is_tag: bool) -> str:
+    if name in ('.', '*') or name.startswith('{'):
+        return name
+    if ':' in name:
+        prefix, local = name.split(':', 1)
+        if prefix not in namespaces:
+            return None
+        return '{' + namespaces[prefix] + '}' + local
+    if is_tag and namespaces.get(''):
+        return '{' + namespaces[''] + '}' + name
+    return name